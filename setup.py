@@ -10,6 +10,7 @@ setup(name='splinefit',
       packages=['splinefit'],
       scripts=['splinefit/bin/tsurfmsh', 
                'splinefit/bin/mshvtk', 
+               'splinefit/bin/sfvtm',
                'splinefit/bin/sfbbox',
                'splinefit/bin/sfbnd',
                'splinefit/bin/sfproj',
@@ -18,11 +19,15 @@ setup(name='splinefit',
                'splinefit/bin/sffbnd',
                'splinefit/bin/sffsrf',
                'splinefit/bin/sfiges',
+               'splinefit/bin/sfrun',
                'splinefit/bin/sfgeo',
                'splinefit/bin/sfbuild',
                ],
+    # pyIGES is not available in the PyPi index and is only needed by
+    # `splinefit.iges_pyiges` (see README.md)
     install_requires=[
     'numpy',
+    'scipy',
     'matplotlib'
     ],
       zip_safe=False)
@@ -1,11 +1,26 @@
-from . import vtk
-from . import triangulation
-from . import fitting
-from . import bspline
-from . import msh
-from . import transfinite
-from . import options
-from . import plot
-from . import iges
-from . import utils
-from . import tsurf
+"""
+Fit BSpline surfaces to triangular surface meshes.
+
+The submodules are imported when they are first accessed, e.g.,
+`splinefit.pipeline`, so that command line tools only pay for the modules that
+they use. Heavy dependencies (matplotlib, scipy, pyIGES) are only imported by
+the functions that need them.
+
+"""
+__version__ = '3.0b'
+
+_submodules = ['vtk', 'triangulation', 'orientation', 'fitting', 'bspline',
+               'msh', 'transfinite', 'options', 'plot', 'iges', 'utils',
+               'tsurf', 'pipeline', 'cache', 'state']
+
+
+def __getattr__(name):
+    if name in _submodules:
+        import importlib
+        return importlib.import_module('.' + name, __name__)
+    raise AttributeError("module '%s' has no attribute '%s'" % (__name__,
+                                                                 name))
+
+
+def __dir__():
+    return sorted(list(globals()) + _submodules)
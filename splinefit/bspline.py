@@ -782,7 +782,7 @@ class Curve(object):
 
 
     def iges(self, rw=1):
-        from splinefit.iges import IGESBSplineCurve
+        from splinefit.iges_pyiges import IGESBSplineCurve
         if rw:
              return IGESBSplineCurve(self.rwPx, self.rwPy, self.rwPz,
                      self.U.tolist(),
@@ -856,6 +856,24 @@ class Surface(object):
                        'pu' : self.pu,
                        'pv' : self.pv}, out, indent=4)
 
+    def tsurf(self, filename, nu=100, nv=100, rw=1, precision=None):
+        """
+        Evaluate the surface on a grid of `nu` x `nv` points, triangulate
+        the grid, and write it to a GOCAD Tsurf file.
+
+        """
+        from . import tsurf
+        self.eval(nu=nu, nv=nv, rw=rw)
+        ni, nj = self.X.shape
+        points = np.vstack((self.X.ravel(), self.Y.ravel(),
+                            self.Z.ravel())).T
+        # Split each grid cell into two triangles
+        k = (np.arange(ni - 1)[:,None] * nj + np.arange(nj - 1)).ravel()
+        tris = np.vstack((np.vstack((k, k + 1, k + nj + 1)).T,
+                          np.vstack((k, k + nj + 1, k + nj)).T))
+        tsurf.write(filename, points, tris, name=self.label,
+                    precision=precision)
+
     def __str__(self):
         out = []
         out += ["BSpline Surface: %s " % self.label]
@@ -970,7 +988,7 @@ class Surface(object):
         Send Bspline surface to IGES data representation
 
         """
-        from splinefit.iges import IGESBSplineSurface
+        from splinefit.iges_pyiges import IGESBSplineSurface
         if rw:
             return IGESBSplineSurface(self.rwPx, self.rwPy, self.rwPz, 
                                  self.U.tolist(), self.V.tolist(), self.pu, self.pv)
@@ -0,0 +1,190 @@
+"""
+Module for caching the results of the stages of the fitting pipeline on disk.
+
+Each result is stored in a directory named after a key, which is a hash of
+everything the result depends on: the input of the stage, its options, and the
+version of splinefit (see `key`). A stage whose key is found in the cache does
+not need to run again. The least recently used results are removed when the
+total size of the cache exceeds its limit.
+
+"""
+import os
+
+
+def key(*parts):
+    """
+    Compute a cache key by hashing a sequence of values. The values must have a
+    reproducible `repr` (strings, numbers, and lists, tuples and dictionaries of
+    them). Dictionaries are hashed in sorted order.
+
+    Arguments:
+        parts : Values to hash.
+
+    Returns:
+        Hexadecimal string.
+
+    """
+    import hashlib
+    h = hashlib.sha256()
+    for part in parts:
+        if isinstance(part, dict):
+            part = sorted(part.items())
+        h.update(repr(part).encode())
+        h.update(b'\0')
+    return h.hexdigest()
+
+
+def file_hash(filename, chunk_size=2**20):
+    """
+    Hash the content of a file.
+
+    Returns:
+        Hexadecimal string.
+
+    """
+    import hashlib
+    h = hashlib.sha256()
+    with open(filename, 'rb') as fh:
+        for chunk in iter(lambda: fh.read(chunk_size), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class Cache:
+    """
+    Cache of stage results in a directory. Each result is a stored state (see
+    `splinefit.state`) that may refer to the arrays of other results in the
+    cache. The cache can safely be shared by several processes.
+
+    Arguments:
+        path : Cache directory. Created if it does not exist.
+        max_size(optional) : Size limit of the cache in bytes.
+
+    """
+
+    def __init__(self, path, max_size=2**30):
+        self.path = os.path.abspath(path)
+        self.max_size = max_size
+        os.makedirs(self.path, exist_ok=True)
+
+    def filename(self, key):
+        return os.path.join(self.path, key)
+
+    def lookup(self, key):
+        """
+        Look up a key and mark it, and the results that it refers to, as
+        recently used.
+
+        Returns:
+            The directory of the result, or `None` if the key is not in the
+            cache.
+
+        """
+        from . import state
+        filename = self.filename(key)
+        if not state.is_valid(filename):
+            return None
+        try:
+            for path in [filename] + list(state.references(filename)):
+                os.utime(os.path.join(path, state.manifest_name))
+        except OSError:
+            return None
+        return filename
+
+    def get(self, key):
+        """
+        Read the result stored under a key.
+
+        Returns:
+            The result, or `None` if the key is not in the cache.
+
+        """
+        from . import state
+        filename = self.lookup(key)
+        if not filename:
+            return None
+        try:
+            return state.read(filename)
+        except (OSError, ValueError):
+            # Removed by another process
+            return None
+
+    def put(self, key, data, links=None):
+        """
+        Store a result under a key and remove the least recently used results
+        if the cache is full. Arrays that are already in the cache are not
+        stored again.
+
+        Arguments:
+            key : Key of the result.
+            data : Result (a state).
+            links(optional) : Dictionary that maps the directory of a state
+                to the directory of the result in the cache that has the same
+                content (see `splinefit.state.write`).
+
+        """
+        from . import state
+        if self.lookup(key):
+            return
+        try:
+            state.write(self.filename(key), data, links=links, root=self.path)
+        except OSError:
+            # Written by another process
+            pass
+        self.evict()
+
+    def size(self):
+        """
+        Total size of the cache in bytes.
+
+        """
+        return sum([size for _, _, size in self._entries()])
+
+    def evict(self, max_size=None):
+        """
+        Remove the least recently used results until the size of the cache is
+        at most `max_size` (defaults to the limit of the cache).
+
+        Returns:
+            Number of removed results.
+
+        """
+        import shutil
+        if max_size is None:
+            max_size = self.max_size
+        entries = sorted(self._entries())
+        total = sum([size for _, _, size in entries])
+        removed = 0
+        for _, path, size in entries:
+            if total <= max_size:
+                break
+            shutil.rmtree(path, ignore_errors=True)
+            removed += 1
+            total -= size
+        return removed
+
+    def clear(self):
+        """
+        Remove all results.
+
+        """
+        return self.evict(0)
+
+    def _entries(self):
+        """
+        List of (last use, directory, size) of all results in the cache.
+
+        """
+        from . import state
+        entries = []
+        for name in os.listdir(self.path):
+            path = os.path.join(self.path, name)
+            try:
+                last_use = os.stat(os.path.join(path,
+                                                state.manifest_name)).st_mtime
+                size = sum([os.path.getsize(os.path.join(path, f))
+                            for f in os.listdir(path)])
+            except OSError:
+                continue
+            entries.append((last_use, path, size))
+        return entries
@@ -1,197 +1,764 @@
-from math import pi
-from pyiges.IGESCore import IGESItemData, IGEStorage
+"""
+Module for reading and writing BSpline curves and surfaces in the IGES file
+format.
 
-class IGESWriter(IGEStorage):
-    def save(self, filename = 'IGESFile.igs'):
-        try:
-            myFile = open(filename, 'w')
-            #myFile.write(str(self))
-            myFile.write(str(self.StartSection))
-            myFile.write(str(self.GlobalSection))
-            myFile.write(str(self.DirectorySection))
-            myFile.write(str(self.ParameterSection))
-            myFile.write(str("\n"))
-            myFile.write(str(self.IGESTerminate()))
-            myFile.close()
-        except:
-            print("Failed to write: %s" % filename)
-
-
-def standard_iges_setup(system, filename):
-    system.StartSection.Prolog = " "
-    
-    system.GlobalSection.IntegerBits = int(32)
-    system.GlobalSection.SPMagnitude = int(38)
-    system.GlobalSection.SPSignificance = int(6)
-    system.GlobalSection.DPMagnitude = int(38)
-    system.GlobalSection.DPSignificance = int(15)
-    
-    system.GlobalSection.MaxNumberLineWeightGrads = int(8)
-    system.GlobalSection.WidthMaxLineWeightUnits = float(0.016)
-    system.GlobalSection.MaxCoordValue = float(71)
-
-    index_dot = filename.index('.')
-    system.GlobalSection.ProductIdentificationFromSender = filename[:index_dot]
-    system.GlobalSection.FileName = filename
-    
-    system.GlobalSection.ProductIdentificationForReceiver = \
-      system.GlobalSection.ProductIdentificationFromSender
-      
-    system.GlobalSection.AuthorOrg = "USC"
-    system.GlobalSection.NameOfAuthor = "Ossian O'Reilly"
-
-class IGESBSplineSurface(IGESItemData):
-    def __init__(self, Px, Py, Pz, U, V, pu, pv):
-        IGESItemData.__init__(self)
-        self.LineFontPattern.setSolid()
-        self.LineWeightNum = 1
-        self.FormNumber = 0
-
-        self.EntityType.setRBSplineSurface() # 128
-
-        K1 = len(Px[0]) - 1
-        K2 = len(Px) - 1
-        M1 = pu # Degree of first set of basis functions
-        M2 = pv # Degree of second set of basis functions
-        prop1 = 0 # PROP1 Not closed
-        prop2 = 0 # PROP2 Not closed
-        prop3 = 1 # PROP3 Polynomial
-        prop4 = 0 # PROP4 Non-periodic in first parametric variable direction
-        prop5 = 0 # PROP5 Non-periodic in second parametric variable direction
-
-        Px = [item for sublist in Px for item in sublist]
-        Py = [item for sublist in Py for item in sublist]
-        Pz = [item for sublist in Pz for item in sublist]
-        W  = [1 for Pi in Px]
-
-        nodes = []
-        for Pi, Pj, Pk in zip(Px, Py, Pz):
-            nodes.append([Pi, Pj, Pk])
-
-        nodes = [item for sublist in nodes for item in sublist]
-
-        ls = [K1, K2, M1, M2, prop1, prop2, prop3, prop4, prop5] \
-              + U +  V + W + nodes + [0, 1, 0, 1]
-        self.AddParameters(ls)
-
-
-class IGESBSplineCurve(IGESItemData):
-    def __init__(self, Px, Py, Pz, U, pu):
-        IGESItemData.__init__(self)
-        self.LineFontPattern.setSolid()
-        self.LineWeightNum = 1
-        self.FormNumber = 0
-        self.sense = 0
-
-        self.EntityType.setRBSplineCurve() # 126
- 
-        K = len(Px) - 1
-        M = pu # Degree of basis functions
-        prop1 = 0 # PROP1 Not closed
-        prop2 = 0 # PROP2 Not closed
-        prop3 = 1 # PROP3 Polynomial
-        prop4 = 0 # PROP4 Non-periodic
-
-        W  = [1.0 for Pi in Px]
-
-        N = 1+K-M
-
-        nodes = []
-        for Pi, Pj, Pk in zip(Px, Py, Pz):
-            nodes.append([Pi, Pj, Pk])
-
-        nodes = [item for sublist in nodes for item in sublist]
-
-        ls = [K, M, prop1, prop2, prop3, prop4] + U + W + nodes + [0, 1]
-        self.nodes_start = 6 + len(U) + len(W)
-        self.AddParameters(ls)
-
-class IGESBoundary(IGESItemData):
-    def __init__(self, surface, boundary_curves):
-        IGESItemData.__init__(self)
-        self.EntityType.setBoundary() # 141
-
-        boundary_type = 1 
-        preference = 2
-        self.N1 = len(boundary_curves)
-        ls = [boundary_type, preference, 
-              surface.DirectoryDataPointer.data,
-              self.N1]
-        for curve in boundary_curves:
-            ls += [curve.DirectoryDataPointer.data, curve.sense, 1,
-                    curve.ParameterDataPointer.data]
-        self.AddParameters(ls)
-
-
-class IGESBoundedSurface(IGESItemData):
-    def __init__(self, bounded_surface, boundaries):
-        IGESItemData.__init__(self)
-        self.EntityType.setBoundedSurface()
-
-        self.N1 = len(boundaries)
+The entities needed to describe trimmed BSpline surfaces are supported:
+
+    126 : Rational BSpline curve
+    128 : Rational BSpline surface
+    141 : Boundary
+    143 : Bounded surface
+
+Parameter data records are formatted directly from numpy arrays and streamed to
+a temporary file while the (small) directory entries are kept in memory. The
+start, global, directory, parameter and terminate sections are assembled when
+the writer is closed. When reading, the parameter data of all entities is
+converted to numbers in a single pass.
+
+The classes built on top of pyIGES are available in `splinefit.iges_pyiges`
+and can still be accessed from this module.
+
+"""
+import numpy as np
+
+_pyiges_names = ['IGESWriter', 'standard_iges_setup', 'IGESBSplineSurface',
+                 'IGESBSplineCurve', 'IGESBoundary', 'IGESBoundedSurface',
+                 'load_curves', 'load_surface', 'build_bounded_surface']
+
+# Model space units flags
+unit_flags = {'IN' : 1, 'MM' : 2, 'FT' : 4, 'MI' : 5, 'M' : 6, 'KM' : 7,
+              'MIL' : 8, 'UM' : 9, 'CM' : 10, 'UIN' : 11}
+
+# Status numbers of independent and physically dependent entities
+_independent = '00000000'
+_dependent = '00010000'
+
+
+def __getattr__(name):
+    if name in _pyiges_names:
+        from . import iges_pyiges
+        return getattr(iges_pyiges, name)
+    raise AttributeError("module '%s' has no attribute '%s'" % (__name__,
+                                                                 name))
+
+
+class Writer(object):
+    """
+    Write entities to an IGES file.
+
+    Each method that adds an entity returns its directory entry pointer, which
+    is used to reference the entity from other entities. The file is written
+    when the writer is closed. If an exception is raised inside a `with` block,
+    no file is written.
+
+    Example:
+        with Writer('out.igs') as igs:
+            s = igs.surface(Px, Py, Pz, U, V, pu, pv)
+            c = igs.curve(Cx, Cy, Cz, Uc, p)
+            igs.bounded_surface(s, [igs.boundary(s, [c])])
+
+    Arguments:
+        filename : IGES file to write.
+        units(optional) : Name of the model space units, see `unit_flags`.
+        author(optional) : Name of the author.
+        organization(optional) : Name of the author's organization.
+
+    """
+
+    def __init__(self, filename, units='MM', author='', organization=''):
+        import tempfile
+        if units not in unit_flags:
+            raise ValueError('Unknown units: %s' % units)
+        self.filename = filename
+        self.units = units
+        self.author = author
+        self.organization = organization
+        self.directory = []
+        self.num_param_lines = 0
+        self.max_coord = 0.0
+        self._param = tempfile.TemporaryFile(mode='w+')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self._param.close()
+
+    def curve(self, Px, Py, Pz, U, p, level=0, label=''):
+        """
+        Add a non-rational BSpline curve (entity 126).
+
+        Arguments:
+            Px, Py, Pz : Control point coordinates (size: n).
+            U : Knot vector (size: n + p + 1).
+            p : Degree.
+            level(optional) : Level number.
+            label(optional) : Entity label (at most 8 characters).
+
+        Returns:
+            Directory entry pointer of the curve.
+
+        """
+        P = _points(Px, Py, Pz)
+        U = np.asarray(U, dtype=np.float64).ravel()
+        n = P.shape[0]
+        self._extent(P)
+        if U.shape[0] != n + p + 1:
+            raise ValueError('Expected %d knots, got %d' % (n + p + 1,
+                                                            U.shape[0]))
+        params = ','.join(['126', _ints([n - 1, p, 0, 0, 1, 0]), _reals(U),
+                           _ones(n), _reals(P), _reals([U[0], U[-1]])]) + ';'
+        return self._add(126, params, level=level, label=label)
+
+    def surface(self, Px, Py, Pz, U, V, pu, pv, level=0, label=''):
+        """
+        Add a non-rational BSpline surface (entity 128).
+
+        Arguments:
+            Px, Py, Pz : Control point coordinates (size: nv x nu).
+            U, V : Knot vectors (size: nu + pu + 1 and nv + pv + 1).
+            pu, pv : Degrees in the u and v directions.
+            level(optional) : Level number.
+            label(optional) : Entity label (at most 8 characters).
+
+        Returns:
+            Directory entry pointer of the surface.
+
+        """
+        Px = np.asarray(Px, dtype=np.float64)
+        if Px.ndim != 2:
+            raise ValueError('Expected a 2D array of control points')
+        nv, nu = Px.shape
+        P = _points(Px, Py, Pz)
+        self._extent(P)
+        U = np.asarray(U, dtype=np.float64).ravel()
+        V = np.asarray(V, dtype=np.float64).ravel()
+        if U.shape[0] != nu + pu + 1 or V.shape[0] != nv + pv + 1:
+            raise ValueError('Expected %d x %d knots, got %d x %d' %
+                             (nu + pu + 1, nv + pv + 1, U.shape[0],
+                              V.shape[0]))
+        params = ','.join(['128',
+                           _ints([nu - 1, nv - 1, pu, pv, 0, 0, 1, 0, 0]),
+                           _reals(U), _reals(V), _ones(nu * nv), _reals(P),
+                           _reals([U[0], U[-1], V[0], V[-1]])]) + ';'
+        return self._add(128, params, level=level, label=label)
+
+    def boundary(self, surface, curves, level=0):
+        """
+        Add a boundary (entity 141) that is made up of model space curves
+        lying on a surface. The surface and the curves become physically
+        dependent on the boundary.
+
+        Arguments:
+            surface : Directory entry pointer of the surface.
+            curves : List of directory entry pointers of the curves, in the
+                order that they are traversed.
+            level(optional) : Level number.
+
+        Returns:
+            Directory entry pointer of the boundary.
+
+        """
+        curves = list(curves)
+        self._depend([surface] + curves)
+        refs = [[c, 1, 0] for c in curves]
+        params = ','.join(['141', _ints([0, 1, surface, len(curves)])] +
+                          [_ints(r) for r in refs]) + ';'
+        return self._add(141, params, level=level)
+
+    def bounded_surface(self, surface, boundaries, level=0, label=''):
+        """
+        Add a bounded surface (entity 143).
+
+        Arguments:
+            surface : Directory entry pointer of the surface.
+            boundaries : List of directory entry pointers of the boundaries.
+            level(optional) : Level number.
+            label(optional) : Entity label (at most 8 characters).
+
+        Returns:
+            Directory entry pointer of the bounded surface.
+
+        """
+        boundaries = list(boundaries)
+        self._depend([surface] + boundaries)
+        params = '143,' + _ints([0, surface, len(boundaries)] +
+                                boundaries) + ';'
+        return self._add(143, params, level=level, label=label)
+
+    def close(self):
+        """
+        Write the IGES file.
+
+        """
+        import shutil
+        import time
+
+        stamp = time.strftime('%Y%m%d.%H%M%S')
+        name = _hollerith(self.filename.split('/')[-1])
+        glob = ['1H,', '1H;', name, name, '9Hsplinefit', '9Hsplinefit',
+                '32', '38', '6', '308', '15', name, '1.0',
+                str(unit_flags[self.units]), _hollerith(self.units), '8',
+                '0.016', _hollerith(stamp), '1.0E-06',
+                _reals([self.max_coord]),
+                _hollerith(self.author), _hollerith(self.organization),
+                '11', '0', _hollerith(stamp)]
+
+        start = ['splinefit IGES export']
+        glob = _wrap_tokens(glob, 72)
+        directory = self._directory_lines()
 
         try:
-            outer_boundary_surface = outer_boundary_surface.DirectoryDataPointer.data
-        except:
-            pass
+            with open(self.filename, 'w') as fh:
+                fh.write(''.join(['%-72sS%7d\n' % (line, i + 1)
+                                  for i, line in enumerate(start)]))
+                fh.write(''.join(['%-72sG%7d\n' % (line, i + 1)
+                                  for i, line in enumerate(glob)]))
+                fh.write(directory)
+                self._param.seek(0)
+                shutil.copyfileobj(self._param, fh)
+                fh.write('S%7dG%7dD%7dP%7d%40sT%7d\n' %
+                         (len(start), len(glob), 2 * len(self.directory),
+                          self.num_param_lines, '', 1))
+        finally:
+            self._param.close()
+
+    def add_part(self, part):
+        """
+        Add the entities of a part (see `Part`).
+
+        Arguments:
+            part : Instance of `Part`.
+
+        Returns:
+            Offset to add to the directory entry pointers of the part to get
+            their pointers in this file.
+
+        """
+        offset = 2 * len(self.directory)
+        for entity, data, level, form, label in part.records:
+            if entity == 141:
+                self.boundary(data[0] + offset, [c + offset for c in data[1]],
+                              level=level)
+            elif entity == 143:
+                self.bounded_surface(data[0] + offset,
+                                     [b + offset for b in data[1]],
+                                     level=level, label=label)
+            else:
+                self._append(entity, data, level, form, label)
+        self.max_coord = max(self.max_coord, part.max_coord)
+        return offset
+
+    def _add(self, entity, params, level=0, form=0, label=''):
+        if len(label) > 8:
+            raise ValueError('Entity label is longer than 8 characters: %s' %
+                             label)
+        return self._append(entity, _wrap(params, 64), level, form, label)
+
+    def _append(self, entity, lines, level, form, label):
+        pointer = 2 * len(self.directory) + 1
+        seq = np.arange(self.num_param_lines + 1,
+                        self.num_param_lines + len(lines) + 1)
+        rows = np.empty((len(lines), 3), dtype=object)
+        rows[:,0] = lines
+        rows[:,1] = pointer
+        rows[:,2] = seq
+        self._param.write(('%-64s%8dP%7d\n' * len(lines)) %
+                          tuple(rows.ravel()))
+        self.directory.append([entity, self.num_param_lines + 1, level,
+                               _independent, len(lines), form, label])
+        self.num_param_lines += len(lines)
+        return pointer
+
+    def _extent(self, P):
+        if P.shape[0] > 0:
+            self.max_coord = max(self.max_coord, float(np.max(np.abs(P))))
+
+    def _depend(self, pointers):
+        _check_pointers(pointers, len(self.directory))
+        for pointer in pointers:
+            self.directory[(pointer - 1) // 2][3] = _dependent
+
+    def _directory_lines(self):
+        out = []
+        for i, (entity, param, level, status, count, form, label) in \
+            enumerate(self.directory):
+            out.append('%8d%8d%8d%8d%8d%8d%8d%8d%8sD%7d\n' %
+                       (entity, param, 0, 1, level, 0, 0, 0, status,
+                        2 * i + 1))
+            out.append('%8d%8d%8d%8d%8d%8s%8s%8s%8dD%7d\n' %
+                       (entity, 1, 0, count, form, '', '', label, 0,
+                        2 * i + 2))
+        return ''.join(out)
+
+
+class Part(Writer):
+    """
+    Entities of one part of an assembly, such as a fault, that are formatted
+    independently of the file they are written to. A part has the same
+    interface as `Writer`, but keeps the entities in memory and numbers them
+    as if they were the first entities in the file. This makes it possible to
+    format parts in parallel and add them to a writer with
+    `Writer.add_part`.
+
+    """
+
+    def __init__(self):
+        self.directory = []
+        self.records = []
+        self.max_coord = 0.0
+
+    def boundary(self, surface, curves, level=0):
+        curves = list(curves)
+        self._depend([surface] + curves)
+        return self._append(141, (surface, curves), level, 0, '')
+
+    def bounded_surface(self, surface, boundaries, level=0, label=''):
+        boundaries = list(boundaries)
+        self._depend([surface] + boundaries)
+        if len(label) > 8:
+            raise ValueError('Entity label is longer than 8 characters: %s' %
+                             label)
+        return self._append(143, (surface, boundaries), level, 0, label)
+
+    def close(self):
+        pass
+
+    def _append(self, entity, data, level, form, label):
+        self.records.append((entity, data, level, form, label))
+        self.directory.append(entity)
+        return 2 * len(self.directory) - 1
+
+    def _depend(self, pointers):
+        _check_pointers(pointers, len(self.directory))
+
+
+def write_assembly(filename, parts, levels=None, labels=None, rw=1,
+                   processes=1, units='MM'):
+    """
+    Write the BSpline surfaces and boundary curves of many parts, e.g., all
+    faults of a fault network, to a single IGES file. The parts are formatted
+    in parallel and streamed to the file in order.
+
+    Arguments:
+        filename : IGES file to write.
+        parts : List of parts. Each part is either the state written by
+            `sffsrf` (see `splinefit.state`), or a dict with the fields
+            `bspline_surface` and `bspline_curves` (see `write_surface`).
+            Pickle files written by earlier versions of `sffsrf` are also
+            accepted.
+        levels(optional) : Level number of each part. Defaults to 0.
+        labels(optional) : Label of each part (at most 8 characters).
+            Defaults to the labels of the surfaces.
+        rw(optional) : Use real world coordinates.
+        processes(optional) : Number of worker processes used to format the
+            parts. Pass `None` to use all available CPUs.
+        units(optional) : Name of the model space units, see `unit_flags`.
+
+    Returns:
+        List of the directory entry pointers of the parts (see
+        `write_surface`).
+
+    """
+    n = len(parts)
+    if levels is None:
+        levels = [0] * n
+    if labels is None:
+        labels = [None] * n
+    if len(levels) != n or len(labels) != n:
+        raise ValueError('Expected %d levels and labels' % n)
+    jobs = list(zip(parts, levels, labels, [rw] * n))
+
+    out = []
+    with Writer(filename, units=units) as igs:
+        if processes == 1 or n < 2:
+            for part, pointer in map(_format_part, jobs):
+                out.append(igs.add_part(part) + pointer)
+            return out
+
+        from concurrent.futures import ProcessPoolExecutor
+        with ProcessPoolExecutor(max_workers=processes) as pool:
+            for part, pointer in pool.map(_format_part, jobs):
+                out.append(igs.add_part(part) + pointer)
+    return out
 
-        self.AddParameters([1, 
-                            bounded_surface.DirectoryDataPointer.data,
-                            self.N1]
-                           )
 
-        for boundary in boundaries:
-            self.AddParameters([boundary.DirectoryDataPointer.data])
+def _format_part(job):
+    """
+    Format the entities of a single part of an assembly.
+
+    """
+    import os
+    import pickle
+    from . import state
+    data, level, label, rw = job
+    if isinstance(data, str) and os.path.isdir(data):
+        data = state.read(data, fields=['bspline_surface', 'bspline_curves'])
+    elif isinstance(data, str):
+        with open(data, 'rb') as fh:
+            data = pickle.load(fh)
+    part = Part()
+    pointer = write_surface(part, _field(data, 'bspline_surface'),
+                            _field(data, 'bspline_curves'), rw=rw,
+                            level=level, label=label)
+    return part, pointer
+
+
+def _field(data, name):
+    """
+    Get a field that is either stored as an item or as an attribute (the
+    attributes of an unpickled `splinefit.utils.Struct` are not items).
+
+    """
+    if name in data:
+        return data[name]
+    return getattr(data, name)
+
+
+def write_surface(writer, surface, boundaries=None, rw=1, level=0,
+                  label=None):
+    """
+    Add a BSpline surface, optionally trimmed by BSpline boundary curves, to an
+    IGES file.
+
+    Arguments:
+        writer : Instance of `Writer` or `Part`.
+        surface : BSpline surface (`splinefit.bspline.Surface`).
+        boundaries(optional) : List of BSpline curves
+            (`splinefit.bspline.Curve`) that form a closed boundary on the
+            surface. If not given, the untrimmed surface is written.
+        rw(optional) : Use real world coordinates.
+        level(optional) : Level number of all entities that are written.
+        label(optional) : Label of the surface. Defaults to the label of
+            `surface`, truncated to 8 characters.
+
+    Returns:
+        Directory entry pointer of the bounded surface, or of the surface if
+        there are no boundaries.
+
+    """
+    if rw:
+        P = (surface.rwPx, surface.rwPy, surface.rwPz)
+    else:
+        P = (surface.Px, surface.Py, surface.Pz)
+    if label is None:
+        label = str(surface.label)[:8]
+    srf = writer.surface(*P, surface.U, surface.V, surface.pu, surface.pv,
+                         level=level, label=label)
+    if not boundaries:
+        return srf
 
-def load_curves(path, files, real_world=False, system=None):
-    import json
     curves = []
-    for filei in files:
-        with open(path + filei) as json_file:
-             data = json.load(json_file)
-             if real_world:
-                 Px = data['real_world_Px']
-                 Py = data['real_world_Py']
-                 Pz = data['real_world_Pz']
-             else:
-                 Px = data['Px']
-                 Py = data['Py']
-                 Pz = data['Pz']
-             U = data['U']
-             pu = data['p']
-             curve = IGESBSplineCurve(Px, Py, Pz, U, pu)
-             curves.append(curve)
-             if system:
-                system.Commit(curve)
-    return curves
-
-def load_surface(path, filename, real_world=False, system=None):
-    import json
-    with open(path + filename) as json_file:
-        data = json.load(json_file)
-        if real_world:
-            Px = data['real_world_Px']
-            Py = data['real_world_Py']
-            Pz = data['real_world_Pz']
+    for curve in boundaries:
+        if rw:
+            P = (curve.rwPx, curve.rwPy, curve.rwPz)
         else:
-            Px = data['Px']
-            Py = data['Py']
-            Pz = data['Pz']
-        U = data['U']
-        V = data['V']
-        pu = data['pu']
-        pv = data['pv']
-        surface = IGESBSplineSurface(Px, Py, Pz, U, V, pu, pv)
-        if system:
-            system.Commit(surface)
-
-    return surface
-
-def build_bounded_surface(surface, curves, system=None):
-    boundary = IGESBoundary(surface, curves)
-    if system:
-        system.Commit(boundary)
-    bounded_surface = IGESBoundedSurface(surface, [boundary])
-    if system:
-        system.Commit(bounded_surface)
-    return boundary, bounded_surface
+            P = (curve.Px, curve.Py, curve.Pz)
+        curves.append(writer.curve(*P, curve.U, curve.p, level=level))
+    bnd = writer.boundary(srf, curves, level=level)
+    return writer.bounded_surface(srf, [bnd], level=level, label=label)
+
+
+def _check_pointers(pointers, num_entities):
+    for pointer in pointers:
+        if pointer < 1 or pointer > 2 * num_entities or pointer % 2 == 0:
+            raise ValueError('Invalid directory entry pointer: %s' % pointer)
+
+
+def _points(Px, Py, Pz):
+    P = np.vstack((np.ravel(Px), np.ravel(Py), np.ravel(Pz))).T
+    return np.asarray(P, dtype=np.float64)
+
+
+def _ints(values):
+    return ','.join(map(str, values))
+
+
+def _ones(n):
+    return ','.join(['1.0'] * n)
+
+
+def _reals(values):
+    """
+    Format reals using the shortest representation that round trips.
+
+    """
+    values = np.asarray(values, dtype=np.float64).ravel()
+    if not np.all(np.isfinite(values)):
+        raise ValueError('Cannot write non-finite values to IGES')
+    return ','.join(map(repr, values.tolist())).upper()
+
+
+def _hollerith(text):
+    if not text:
+        return ''
+    return '%dH%s' % (len(text), text)
+
+
+def _wrap(params, width):
+    """
+    Split a parameter string into lines of at most `width` characters. Lines
+    are only broken after a delimiter.
+
+    """
+    import bisect
+    data = np.frombuffer(params.encode(), dtype=np.uint8)
+    ends = (np.flatnonzero((data == ord(',')) | (data == ord(';'))) +
+            1).tolist()
+    lines = []
+    start = 0
+    while start < len(params):
+        k = bisect.bisect_right(ends, start + width) - 1
+        if k < 0 or ends[k] <= start:
+            raise ValueError('Parameter does not fit on a line: %s' %
+                             params[start:start + width])
+        lines.append(params[start:ends[k]])
+        start = ends[k]
+    return lines
+
+
+def _wrap_tokens(tokens, width):
+    """
+    Join global section parameters into lines of at most `width` characters.
+
+    """
+    lines = []
+    line = ''
+    for i, token in enumerate(tokens):
+        token += ';' if i == len(tokens) - 1 else ','
+        if len(line) + len(token) > width:
+            lines.append(line)
+            line = ''
+        while len(token) > width:
+            lines.append(token[:width])
+            token = token[width:]
+        line += token
+    lines.append(line)
+    return lines
+
+
+def read(filename):
+    """
+    Read the BSpline surfaces in an IGES file, together with the curves that
+    trim them.
+
+    Each bounded surface (entity 143) yields its BSpline surface (entity 128)
+    and the curves (entity 126) of all of its boundaries (entity 141).
+    Surfaces that are not referenced by any bounded surface are returned
+    without curves.
+
+    Arguments:
+        filename : IGES file to read.
+
+    Returns:
+        List of `splinefit.utils.Struct` with the fields `bspline_surface`,
+        `bspline_curves`, `label` and `level`.
+
+    """
+    from .utils import Struct
+
+    ents = entities(filename, types=(126, 128, 141, 143))
+    objects = {}
+
+    def get(pointer, etype):
+        if pointer not in ents or ents[pointer].type != etype:
+            raise Exception('%s: Expected entity %d at directory entry %d' %
+                            (filename, etype, pointer))
+        if pointer not in objects:
+            ent = ents[pointer]
+            build = _curve if etype == 126 else _surface
+            objects[pointer] = build(ent.params, ent.label or 'untitled')
+        return objects[pointer]
+
+    out = []
+    trimmed = set()
+    for pointer, ent in ents.items():
+        if ent.type != 143:
+            continue
+        v = ent.params
+        surface = get(int(v[1]), 128)
+        trimmed.add(int(v[1]))
+        curves = []
+        for bnd in v[3:3 + int(v[2])].astype(np.int64):
+            if bnd not in ents or ents[bnd].type != 141:
+                raise Exception('%s: Expected entity 141 at directory entry '
+                                '%d' % (filename, bnd))
+            for curve, sense in _boundary_curves(ents[bnd].params):
+                curve = get(curve, 126)
+                curves.append(_reverse(curve) if sense == 2 else curve)
+        out.append(Struct({'bspline_surface' : surface,
+                           'bspline_curves' : curves,
+                           'label' : ent.label or surface.label,
+                           'level' : ent.level}))
+
+    for pointer, ent in ents.items():
+        if ent.type == 128 and pointer not in trimmed:
+            surface = get(pointer, 128)
+            out.append(Struct({'bspline_surface' : surface,
+                               'bspline_curves' : [],
+                               'label' : surface.label,
+                               'level' : ent.level}))
+    return out
+
+
+def entities(filename, types=None, params=True):
+    """
+    Read the directory entries and parameter data of the entities in an IGES
+    file. The parameter data of all entities is parsed in a single pass and
+    must be numeric, i.e., entities with string parameters are not supported.
+
+    Arguments:
+        filename : IGES file to read.
+        types(optional) : Entity types to read. Reads all entities if not
+            given.
+        params(optional) : Set to `False` to only read the directory
+            entries.
+
+    Returns:
+        Dictionary that maps the directory entry pointer of each entity to a
+        `splinefit.utils.Struct` with the fields `type`, `form`, `level`,
+        `status`, `label` and `params` (if requested). The parameters
+        exclude the entity type.
+
+    """
+    from .utils import Struct
+
+    lines = open(filename).read().splitlines()
+    sections = {'G' : [], 'D' : [], 'P' : []}
+    for line in lines:
+        code = line[72:73]
+        if code == 'C':
+            raise Exception('%s: Compressed IGES files are not supported' %
+                            filename)
+        if code in sections:
+            sections[code].append(line)
+    directory = sections['D']
+    if len(directory) % 2 != 0:
+        raise Exception('%s: Invalid directory section' % filename)
+
+    delim, term = _delimiters(''.join([line[:72] for line in sections['G']]))
+    param = [line[:64] for line in sections['P']]
+
+    ents = {}
+    texts = []
+    for i in range(0, len(directory), 2):
+        d1 = directory[i]
+        d2 = directory[i + 1]
+        etype = int(d1[0:8])
+        if types is not None and etype not in types:
+            continue
+        ents[i + 1] = Struct({'type' : etype,
+                              'form' : int(d2[32:40] or 0),
+                              'level' : int(d1[32:40] or 0),
+                              'status' : d1[64:72].replace(' ', '0'),
+                              'label' : d2[56:64].strip()})
+        if params:
+            start = int(d1[8:16])
+            count = int(d2[24:32])
+            text = ''.join(param[start - 1:start - 1 + count])
+            texts.append(text.split(term, 1)[0].partition(delim)[2])
+    if not params:
+        return ents
+
+    counts = [text.count(delim) + 1 if text.strip() else 0
+              for text in texts]
+    text = ' '.join([_fill(text, delim) for text in texts])
+    text = text.replace(delim, ' ').replace('D', 'E').replace('d', 'e')
+    values = np.fromstring(text, sep=' ')
+    if values.shape[0] != sum(counts):
+        raise Exception('%s: Failed to parse the parameter data' % filename)
+
+    values = np.split(values, np.cumsum(counts)[:-1]) if counts else []
+    for ent, v in zip(ents.values(), values):
+        ent.params = v
+    return ents
+
+
+def _delimiters(glob):
+    """
+    Get the parameter and record delimiters from the global section.
+
+    """
+    delim = ','
+    term = ';'
+    if glob.startswith('1H'):
+        delim = glob[2]
+        rest = glob[4:]
+    else:
+        rest = glob[1:]
+    if rest.startswith('1H'):
+        term = rest[2]
+    return delim, term
+
+
+def _fill(text, delim):
+    """
+    Replace empty (defaulted) parameters by zero.
+
+    """
+    if not text.strip():
+        return ''
+    fields = text.split(delim)
+    if all([field.strip() for field in fields]):
+        return text
+    return delim.join([field if field.strip() else '0' for field in fields])
+
+
+def _curve(v, label):
+    from .bspline import Curve
+    K, M = int(v[0]), int(v[1])
+    n = K + 1
+    k = 6
+    U = v[k:k + n + M + 1]
+    k += n + M + 1
+    _check_weights(v[k:k + n], label)
+    P = v[k + n:k + 4 * n].reshape(n, 3)
+    return Curve(U.copy(), M, P[:,0].copy(), P[:,1].copy(), P[:,2].copy(),
+                 label=label)
+
+
+def _surface(v, label):
+    from .bspline import Surface
+    K1, K2, M1, M2 = [int(x) for x in v[0:4]]
+    nu = K1 + 1
+    nv = K2 + 1
+    k = 9
+    U = v[k:k + nu + M1 + 1]
+    k += nu + M1 + 1
+    V = v[k:k + nv + M2 + 1]
+    k += nv + M2 + 1
+    _check_weights(v[k:k + nu * nv], label)
+    k += nu * nv
+    P = v[k:k + 3 * nu * nv].reshape(nv, nu, 3)
+    return Surface(U.copy(), V.copy(), M1, M2, P[:,:,0].copy(),
+                   P[:,:,1].copy(), P[:,:,2].copy(), label=label)
+
+
+def _check_weights(W, label):
+    import warnings
+    if W.shape[0] > 0 and np.any(W != W[0]):
+        warnings.warn('%s: Ignoring the weights of a rational BSpline' % label)
+
+
+def _boundary_curves(v):
+    """
+    Get the model space curves and their sense from the parameters of a
+    boundary entity.
+
+    """
+    out = []
+    k = 4
+    for i in range(int(v[3])):
+        out.append((int(v[k]), int(v[k + 1])))
+        k += 3 + int(v[k + 2])
+    return out
+
+
+def _reverse(curve):
+    from .bspline import Curve
+    U = curve.U[0] + curve.U[-1] - curve.U[::-1]
+    return Curve(U, curve.p, curve.Px[::-1].copy(), curve.Py[::-1].copy(),
+                 curve.Pz[::-1].copy(), label=curve.label)
@@ -3,19 +3,138 @@ Parser for the gmsh file format
 
 """
 import numpy as np
-_nodes = '\$Nodes\n(\d+)\n([\w\W]+)\n\$EndNodes'
-_elements = '\$Elements\n(\d+)\n([\w\W]+)\n\$EndElements'
 _meshformat = '$MeshFormat\n2.2 0 8\n$EndMeshFormat\n'
+# Number of nodes for each gmsh element type
+_num_nodes = {1: 2, 2: 3, 3: 4, 4: 4, 5: 8, 6: 6, 7: 5, 8: 3, 9: 6, 10: 9,
+              11: 10, 15: 1}
+# First-order element types: line, triangle, quadrangle, tetrahedron,
+# hexahedron, prism, pyramid and point
+_first_order = [1, 2, 3, 4, 5, 6, 7, 15]
+
+class Elements(dict):
+    """
+    Elements of a gmsh mesh grouped by element type.
+
+    Maps each gmsh element type to a contiguous integer array of node ids
+    (size: num elements x num nodes per element). The element ids and tags
+    of each type are kept in the parallel dictionaries `ids` (size: num
+    elements) and `tags` (size: num elements x num tags).
+
+    """
+    def __init__(self):
+        dict.__init__(self)
+        self.ids = {}
+        self.tags = {}
+
+    def add(self, etype, ids, tags, nodes):
+        """
+        Add elements of the same type. Each argument can also be a list of
+        arrays that are concatenated.
+
+        """
+        cat = lambda x: np.concatenate(x) if isinstance(x, list) else x
+        etype = int(etype)
+        ids = np.asarray(cat(ids), dtype=np.int64)
+        tags = np.asarray(cat(tags), dtype=np.int64).reshape(ids.shape[0], -1)
+        nodes = np.ascontiguousarray(cat(nodes), dtype=np.int64)
+        if etype in self:
+            if tags.shape[1] != self.tags[etype].shape[1]:
+                raise Exception('Inconsistent number of tags for element '
+                                'type %d' % etype)
+            ids = np.concatenate((self.ids[etype], ids))
+            tags = np.vstack((self.tags[etype], tags))
+            nodes = np.vstack((self[etype], nodes))
+        self[etype] = nodes
+        self.ids[etype] = ids
+        self.tags[etype] = tags
+
+    def num_elements(self):
+        """
+        Return the total number of elements.
+
+        """
+        return sum(nodes.shape[0] for nodes in self.values())
+
+    def rows(self, etype):
+        """
+        Return the elements of a type as rows of the form
+        `[id, type, number of tags, tags..., node ids...]`.
+
+        """
+        ids = self.ids[etype]
+        tags = self.tags[etype]
+        info = np.tile([etype, tags.shape[1]], (ids.shape[0], 1))
+        return np.hstack((ids[:,None], info, tags, self[etype]))
+
+    @staticmethod
+    def from_rows(rows):
+        """
+        Group element rows of the form
+        `[id, type, number of tags, tags..., node ids...]` by element type.
+
+        """
+        out = Elements()
+        if isinstance(rows, np.ndarray) and rows.ndim == 2:
+            rows = rows.astype(np.int64)
+            for etype in np.unique(rows[:,1]):
+                block = rows[rows[:,1] == etype]
+                num_tags = block[0,2]
+                out.add(etype, block[:,0], block[:,3:3+num_tags],
+                        block[:,3+num_tags:])
+            return out
+
+        blocks = {}
+        for row in rows:
+            blocks.setdefault(int(row[1]), []).append(row)
+        for etype, block in blocks.items():
+            if len(set(len(row) for row in block)) > 1:
+                raise Exception('Inconsistent number of tags for element '
+                                'type %d' % etype)
+            block = Elements.from_rows(np.array(block))
+            out.add(etype, block.ids[etype], block.tags[etype], block[etype])
+        return out
 
 def read(filename):
-    txt = open(filename, 'r').read()
+    """
+    Read the nodes and elements of a gmsh file (format 2.2 or 4.1, ASCII or
+    binary).
+
+    Returns:
+        n : Array of nodes (columns: node id, x, y, z).
+        e : Elements (see `elements`).
 
-    n = nodes(txt)
-    e = elements(txt)
+    """
+    with open(filename, 'rb') as fh:
+        buf = fh.read()
 
+    ver, binary, endian = _binary_format(buf)
+    if not binary:
+        txt = buf.decode()
+        return nodes(txt), elements(txt)
+
+    n = _binary_nodes(buf, ver, endian)
+    e = _binary_elements(buf, ver, endian)
     return n, e
 
-def write(filename, n, e):
+def write(filename, n, e, binary=False, precision=None):
+    """
+    Write nodes and elements to a gmsh file (format 2.2).
+
+    Arguments:
+        filename : Gmsh file to write.
+        n : Array of nodes (columns: node id, x, y, z).
+        e : Elements (see `Elements`), or an array or list of element rows
+            (see `Elements.rows`).
+        binary(optional) : Write the binary instead of the ASCII format.
+        precision(optional) : Number of significant digits of the coordinates
+            in the ASCII format. Defaults to full precision.
+
+    """
+    if binary:
+        return _write_binary(filename, n, e)
+
+    from .utils import write_table, float_format
+
     f = open(filename, 'w')
 
     f.write(_meshformat)
@@ -23,75 +142,383 @@ def write(filename, n, e):
     # Nodes
     f.write('$Nodes\n')
     f.write('%d\n'%n.shape[0])
-    for i in range(n.shape[0]):
-        f.write('%d %f %f %f\n'%(n[i,0], n[i,1], n[i,2], n[i,3]))
+    write_table(f, n[:,0:4], ['%d'] + [float_format(precision)] * 3)
     f.write('$EndNodes\n')
     
     # Elements
+    if not isinstance(e, Elements):
+        e = Elements.from_rows(e)
     f.write('$Elements\n')
-    f.write('%d\n'%e.shape[0])
-    for i in range(e.shape[0]):
-        fmt = ' '.join(['%d']*len(e[i])) + '\n'
-        f.write(fmt % tuple(e[i]) )
+    f.write('%d\n'%e.num_elements())
+    for etype in e:
+        write_table(f, e.rows(etype), '%d')
     f.write('$EndElements\n')
     f.close()
 
-def nodes(txt):
-    import re
-    import numpy as np
+def _write_binary(filename, n, e):
+    """
+    Write nodes and elements to a binary gmsh file (format 2.2). The
+    elements are written in one block per element type.
 
-    p = re.compile(_nodes, re.M)
-    matches = p.findall(txt)
+    """
+    node_type = np.dtype([('id', '<i4'), ('xyz', '<f8', (3,))])
+    nodes = np.empty((n.shape[0],), dtype=node_type)
+    nodes['id'] = n[:,0]
+    nodes['xyz'] = n[:,1:4]
+    if not isinstance(e, Elements):
+        e = Elements.from_rows(e)
 
-    if not matches:
-        raise Exception('No nodes found')
+    with open(filename, 'wb') as fh:
+        fh.write(b'$MeshFormat\n2.2 1 8\n')
+        fh.write(np.array([1], dtype='<i4').tobytes())
+        fh.write(b'\n$EndMeshFormat\n')
+
+        fh.write(b'$Nodes\n%d\n' % n.shape[0])
+        nodes.tofile(fh)
+        fh.write(b'\n$EndNodes\n')
+
+        fh.write(b'$Elements\n%d\n' % e.num_elements())
+        for etype in e:
+            header = [etype, e[etype].shape[0], e.tags[etype].shape[1]]
+            fh.write(np.array(header, dtype='<i4').tobytes())
+            fields = np.hstack((e.ids[etype][:,None], e.tags[etype], e[etype]))
+            fields.astype('<i4').tofile(fh)
+        fh.write(b'\n$EndElements\n')
+
+def _binary_format(buf):
+    """
+    Parse the `$MeshFormat` section of the raw contents of a gmsh file.
+
+    Returns:
+        ver : Version of the file format.
+        binary : `True` if the file is binary.
+        endian : Byte order of the binary data (`'<'` or `'>'`).
+
+    """
+    start = buf.find(b'$MeshFormat')
+    if start < 0:
+        return '2.2', False, '<'
+    start = buf.find(b'\n', start) + 1
+    end = buf.find(b'\n', start)
+    fmt = buf[start:end].split()
+    if fmt[1] == b'0':
+        return fmt[0].decode(), False, '<'
+
+    if fmt[2] != b'8':
+        raise Exception('Unsupported data size: %s' % fmt[2].decode())
+    one = np.frombuffer(buf, dtype='<i4', count=1, offset=end + 1)[0]
+    ver = fmt[0].decode()
+    if ver not in ('2.2', '4.1'):
+        raise Exception('Unsupported gmsh file format: %s' % ver)
+    return ver, True, '<' if one == 1 else '>'
+
+def _binary_section(buf, name):
+    """
+    Return the offset of the first byte after the header line of a section
+    in a binary gmsh file.
+
+    """
+    start = buf.find(b'$%s\n' % name)
+    if start < 0:
+        raise Exception('Section $%s not found' % name.decode())
+    return start + len(name) + 2
+
+def _binary_nodes(buf, ver, endian):
+    """
+    Parse the nodes of a binary gmsh file (see `nodes`).
 
-    numnodes = matches[0][0]
-    nodes = matches[0][1].split('\n')
+    """
+    pos = _binary_section(buf, b'Nodes')
+    if ver == '2.2':
+        end = buf.find(b'\n', pos)
+        num_nodes = int(buf[pos:end])
+        node_type = np.dtype([('id', endian + 'i4'),
+                              ('xyz', endian + 'f8', (3,))])
+        nodes = np.frombuffer(buf, dtype=node_type, count=num_nodes,
+                              offset=end + 1)
+        return np.hstack((nodes['id'][:,None], nodes['xyz']))
+
+    size_t = endian + 'u8'
+    num_blocks = np.frombuffer(buf, dtype=size_t, count=4, offset=pos)[0]
+    pos += 32
     out = []
-    for line in nodes:
-        data = line.split(' ')
-        out.append([int(data[0])] + [float(x) for x in data[1:]])
+    for i in range(num_blocks):
+        dim, _, parametric = np.frombuffer(buf, dtype=endian + 'i4', count=3,
+                                           offset=pos)
+        num = int(np.frombuffer(buf, dtype=size_t, count=1,
+                                offset=pos + 12)[0])
+        pos += 20
+        tags = np.frombuffer(buf, dtype=size_t, count=num, offset=pos)
+        pos += 8 * num
+        num_coords = 3 + (dim if parametric else 0)
+        xyz = np.frombuffer(buf, dtype=endian + 'f8', count=num * num_coords,
+                            offset=pos).reshape(num, num_coords)[:,0:3]
+        pos += 8 * num * num_coords
+        out.append(np.hstack((tags[:,None], xyz)))
 
-    return np.array(out)
+    if not out:
+        return np.zeros((0, 4))
+    return np.vstack(out)
 
-def elements(txt):
+def _binary_elements(buf, ver, endian):
+    """
+    Parse the elements of a binary gmsh file (see `elements`).
+
+    """
+    pos = _binary_section(buf, b'Elements')
+    int_t = endian + 'i4'
+    blocks = {}
+    if ver == '2.2':
+        end = buf.find(b'\n', pos)
+        remaining = int(buf[pos:end])
+        pos = end + 1
+        while remaining > 0:
+            etype, num, num_tags = np.frombuffer(buf, dtype=int_t, count=3,
+                                                 offset=pos)
+            pos += 12
+            if etype not in _num_nodes:
+                raise Exception('Unsupported element type: %d' % etype)
+            num_fields = 1 + num_tags + _num_nodes[etype]
+            rows = np.frombuffer(buf, dtype=int_t, count=num * num_fields,
+                                 offset=pos).reshape(num, num_fields)
+            pos += 4 * num * num_fields
+            blocks.setdefault(int(etype), []).append(rows)
+            remaining -= num
+        out = Elements()
+        for etype, block in blocks.items():
+            block = np.vstack(block)
+            num_tags = block.shape[1] - 1 - _num_nodes[etype]
+            out.add(etype, block[:,0], block[:,1:1+num_tags],
+                    block[:,1+num_tags:])
+        return out
+
+    size_t = endian + 'u8'
+    num_blocks = np.frombuffer(buf, dtype=size_t, count=4, offset=pos)[0]
+    pos += 32
+    for i in range(num_blocks):
+        _, entity, etype = np.frombuffer(buf, dtype=int_t, count=3,
+                                         offset=pos)
+        num = int(np.frombuffer(buf, dtype=size_t, count=1,
+                                offset=pos + 12)[0])
+        pos += 20
+        if etype not in _num_nodes:
+            raise Exception('Unsupported element type: %d' % etype)
+        num_fields = 1 + _num_nodes[etype]
+        rows = np.frombuffer(buf, dtype=size_t, count=num * num_fields,
+                             offset=pos).reshape(num, num_fields)
+        pos += 8 * num * num_fields
+        blocks.setdefault(int(etype), []).append((rows, entity))
+    return _entity_elements(blocks)
+
+def _entity_elements(blocks):
+    """
+    Combine the element blocks of a format 4.1 file. Each element is
+    assigned the tags `[0, entity tag]`.
+
+    """
+    out = Elements()
+    for etype, block in blocks.items():
+        out.add(etype, [rows[:,0] for rows, _ in block],
+                [np.tile([0, entity], (rows.shape[0], 1))
+                 for rows, entity in block],
+                [rows[:,1:] for rows, _ in block])
+    return out
+
+def version(txt):
+    """
+    Return the version of the gmsh file format, e.g., `'2.2'`. Defaults to
+    `'2.2'` if the `$MeshFormat` section is missing.
+
+    """
+    try:
+        fmt = section(txt, 'MeshFormat').split()
+    except Exception:
+        return '2.2'
+    if len(fmt) > 1 and fmt[1] != '0':
+        raise Exception('Only ASCII gmsh files are supported')
+    return fmt[0]
+
+def section(txt, name):
+    """
+    Return the contents of the section `$<name>` ... `$End<name>`, without
+    the section markers.
+
+    """
     import re
-    import numpy as np
+    match = re.search(r'^\$%s[ \t\r]*$' % name, txt, re.M)
+    if not match:
+        raise Exception('Section $%s not found' % name)
+    start = match.end() + 1
+    end = txt.find('$End%s' % name, start)
+    if end < 0:
+        raise Exception('Section $%s is not terminated' % name)
+    return txt[start:end]
+
+def nodes(txt):
+    """
+    Parse the nodes of a gmsh file. The node table is converted in bulk.
 
-    p = re.compile(_elements, re.M)
-    matches = p.findall(txt)
+    Returns:
+        out : Array of nodes (columns: node id, x, y, z).
 
-    if not matches:
+    """
+    try:
+        body = section(txt, 'Nodes')
+    except Exception:
         raise Exception('No nodes found')
 
-    numnodes = matches[0][0]
-    elem = matches[0][1].split('\n')
+    data = np.fromstring(body, dtype=np.float64, sep=' ')
+    if _major(txt) < 4:
+        num_nodes = int(data[0])
+        return data[1:1 + 4 * num_nodes].reshape(num_nodes, 4)
+
+    # Format 4.1: Nodes are grouped in entity blocks that list the node
+    # tags first, followed by the coordinates (and parametric coordinates)
+    num_blocks = int(data[0])
+    pos = 4
     out = []
-    for line in elem:
-        data = line.split(' ')
-        out.append([np.int(x) for x in data])
+    for i in range(num_blocks):
+        dim, _, parametric, num = data[pos:pos+4].astype(np.int64)
+        pos += 4
+        tags = data[pos:pos+num]
+        pos += num
+        num_coords = 3 + (dim if parametric else 0)
+        xyz = data[pos:pos+num*num_coords].reshape(num, num_coords)[:,0:3]
+        pos += num * num_coords
+        out.append(np.hstack((tags[:,None], xyz)))
+
+    if not out:
+        return np.zeros((0, 4))
+    return np.vstack(out)
+
+def elements(txt):
+    """
+    Parse the elements of a gmsh file. Each element type is converted in
+    bulk. Elements of format 4.1 files are assigned the tags
+    `[0, entity tag]`.
+
+    Returns:
+        out : Elements grouped by type (see `Elements`).
+
+    """
+    try:
+        body = section(txt, 'Elements')
+    except Exception:
+        raise Exception('No elements found')
+
+    if _major(txt) < 4:
+        return _elements22(body)
+    else:
+        return _elements41(body)
 
-    out = np.array(out)
+def _major(txt):
+    ver = version(txt)
+    major = int(ver.split('.')[0])
+    if major >= 4 and ver != '4.1':
+        raise Exception('Unsupported gmsh file format: %s' % ver)
+    return major
+
+def _elements22(body):
+    """
+    Parse the elements of a format 2.2 file. The number of fields in each
+    line is found from the positions of the whitespace in the text, so
+    that all fields can be converted in bulk.
+
+    """
+    tokens = np.fromstring(body, dtype=np.int64, sep=' ')
+    chars = np.frombuffer(body.encode(), dtype=np.uint8)
+    space = np.zeros((256,), dtype=bool)
+    space[list(b' \t\r\n')] = True
+    space = space[chars]
+    first = ~space
+    first[1:] &= space[:-1]
+    line = np.cumsum(chars == ord('\n'))[first]
+    if line.shape[0] != tokens.shape[0]:
+        raise Exception('Failed to parse elements')
+
+    # The first line contains the number of elements
+    count = np.bincount(line)
+    count = count[count > 0][1:]
+    offset = 1 + np.cumsum(count) - count
+    types = tokens[offset + 1]
+
+    out = Elements()
+    for etype in np.unique(types):
+        rows = np.nonzero(types == etype)[0]
+        if np.any(count[rows] != count[rows[0]]):
+            raise Exception('Inconsistent number of tags for element type %d'
+                            % etype)
+        num_tags = tokens[offset[rows[0]] + 2]
+        first = offset[rows,None]
+        out.add(etype, tokens[offset[rows]],
+                tokens[first + 3 + np.arange(num_tags)],
+                tokens[first + 3 + num_tags +
+                       np.arange(count[rows[0]] - 3 - num_tags)])
     return out
 
-def get_data(elem, num_members=2, index=0):
+def _elements41(body):
+    """
+    Parse the elements of a format 4.1 file, which are grouped in entity
+    blocks of a single element type.
+
+    """
+    tokens = np.fromstring(body, dtype=np.int64, sep=' ')
+    num_blocks = tokens[0]
+    pos = 4
+    blocks = {}
+    for i in range(num_blocks):
+        _, entity, etype, num = tokens[pos:pos+4]
+        pos += 4
+        if etype not in _num_nodes:
+            raise Exception('Unsupported element type: %d' % etype)
+        num_fields = 1 + _num_nodes[etype]
+        rows = tokens[pos:pos+num*num_fields].reshape(num, num_fields)
+        pos += num * num_fields
+        blocks.setdefault(int(etype), []).append((rows, entity))
+    return _entity_elements(blocks)
+
+def get_data(elem, num_members=2, index=0, etype=None):
     """
     Return the data from a gmsh data structure
 
     Arguments:
-        elem : Gmsh data structure.
+        elem : Gmsh data structure (see `Elements`). Arrays or lists of
+            element rows are also accepted.
         num_members (optional) : Number of data members to extract. Defaults to
             `2` (edge).
         index (optional) : Convert to zero indexing. Enabled by default.
+        etype (optional) : Element type, or list of element types, to return
+            from an `Elements` structure. Defaults to the first-order element
+            types with `num_members` nodes, e.g., triangles (type 2), but not
+            second-order lines (type 8), for `num_members=3`.
+
+    Returns:
+        data : Array of node ids (num elements x num members). For a single
+            matching element type and `index=1`, this is the array stored in
+            `elem` (no copy is made).
 
     """
 
-    data = []
-    for ei in elem:
-        num_fields = len(ei)
-        data.append(ei[num_fields-num_members:])
-    data = np.array(data)
+    if isinstance(elem, Elements):
+        if etype is None:
+            etype = [t for t in _first_order
+                     if _num_nodes[t] == num_members]
+        types = [t for t in sorted(elem) if t in np.atleast_1d(etype)
+                 and elem[t].shape[1] == num_members]
+        if not types:
+            data = np.zeros((0, num_members), dtype=np.int64)
+        elif len(types) == 1:
+            data = elem[types[0]]
+        else:
+            data = np.vstack([elem[t] for t in types])
+    elif isinstance(elem, np.ndarray) and elem.ndim == 2:
+        data = elem[:,elem.shape[1]-num_members:]
+    else:
+        data = []
+        for ei in elem:
+            num_fields = len(ei)
+            data.append(ei[num_fields-num_members:])
+        data = np.array(data)
 
     if index == 0:
         data = data - 1
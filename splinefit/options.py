@@ -15,7 +15,7 @@ def check_options(args, options):
     args = get_options(args[1:])
     for arg in args:
         if "-" in arg:
-            _arg = arg[1:]
+            _arg = arg.lstrip("-")
         elif "args" in arg:
             continue
         else:
@@ -0,0 +1,190 @@
+"""
+Module for enforcing a consistent orientation of the triangles in a
+triangulation
+
+"""
+import numpy as np
+
+def signed_areas(tris, points):
+    """
+    Compute the signed area of each triangle in the (x, y)-plane. The area is
+    positive if the nodes of the triangle are ordered counter-clockwise.
+
+    Arguments:
+        tris : Triangulation in the form of a m x 3 array.
+        points : Array of coordinates (size: num points x 2 or 3).
+
+    """
+    p0 = points[tris[:,0],0:2]
+    e1 = points[tris[:,1],0:2] - p0
+    e2 = points[tris[:,2],0:2] - p0
+    return 0.5 * (e1[:,0] * e2[:,1] - e1[:,1] * e2[:,0])
+
+def adjacency(tris):
+    """
+    Find all pairs of triangles that share an edge.
+
+    Arguments:
+        tris : Triangulation in the form of a m x 3 array.
+
+    Returns:
+        pairs : Array of triangle indices (num shared edges x 2).
+        same : Boolean array that is `True` if the shared edge is traversed in
+            the same direction by both triangles. In this case, the two
+            triangles have opposite orientation.
+        non_manifold : Array of edges (num edges x 2) that are shared by more
+            than two triangles. These edges are not part of `pairs`.
+
+    """
+    tris = np.asarray(tris, dtype=np.int64)
+    num_tris = tris.shape[0]
+    half_edges = tris[:, [0, 1, 1, 2, 2, 0]].reshape(-1, 2)
+    tri_ids = np.repeat(np.arange(num_tris), 3)
+    lo = np.min(half_edges, axis=1)
+    hi = np.max(half_edges, axis=1)
+    keys = lo * (np.max(tris) + 1) + hi if num_tris else lo
+
+    order = np.argsort(keys, kind='stable')
+    keys = keys[order]
+    _, start, count = np.unique(keys, return_index=True, return_counts=True)
+
+    shared = start[count == 2]
+    first = order[shared]
+    second = order[shared + 1]
+    pairs = np.vstack((tri_ids[first], tri_ids[second])).T
+    same = half_edges[first,0] == half_edges[second,0]
+
+    non_manifold = np.vstack((lo[order[start[count > 2]]],
+                              hi[order[start[count > 2]]])).T
+    return pairs, same, non_manifold
+
+def propagate(tris, pairs=None, same=None):
+    """
+    Determine which triangles to flip to obtain a consistent orientation. The
+    orientation of the first triangle of each connected component is kept and
+    propagated to its neighbors, one level at a time.
+
+    Arguments:
+        tris : Triangulation in the form of a m x 3 array.
+        pairs, same(optional) : Output of `adjacency`.
+
+    Returns:
+        flip : Boolean array that is `True` for each triangle to flip.
+        component : Connected component of each triangle.
+        non_orientable : Array of components that cannot be consistently
+            oriented.
+
+    """
+    from scipy.sparse import coo_matrix
+    from scipy.sparse.csgraph import connected_components
+
+    num_tris = tris.shape[0]
+    if pairs is None or same is None:
+        pairs, same, _ = adjacency(tris)
+
+    # Symmetric adjacency in compressed form
+    src = np.concatenate((pairs[:,0], pairs[:,1]))
+    dst = np.concatenate((pairs[:,1], pairs[:,0]))
+    rel = np.concatenate((same, same))
+    order = np.argsort(src, kind='stable')
+    dst = dst[order]
+    rel = rel[order]
+    start = np.concatenate(([0], np.cumsum(np.bincount(src,
+                                                       minlength=num_tris))))
+
+    graph = coo_matrix((np.ones(pairs.shape[0]), (pairs[:,0], pairs[:,1])),
+                       shape=(num_tris, num_tris))
+    num_components, component = connected_components(graph, directed=False)
+    _, seeds = np.unique(component, return_index=True)
+
+    flip = np.zeros((num_tris,)).astype(bool)
+    visited = np.zeros((num_tris,)).astype(bool)
+    visited[seeds] = True
+    frontier = seeds
+    while frontier.shape[0] > 0:
+        count = start[frontier + 1] - start[frontier]
+        parent = np.repeat(frontier, count)
+        local = np.arange(parent.shape[0]) - np.repeat(np.cumsum(count) -
+                                                       count, count)
+        idx = np.repeat(start[frontier], count) + local
+        child = dst[idx]
+        new = ~visited[child]
+        child, first = np.unique(child[new], return_index=True)
+        flip[child] = flip[parent[new][first]] ^ rel[idx[new][first]]
+        visited[child] = True
+        frontier = child
+
+    conflict = (flip[pairs[:,0]] ^ flip[pairs[:,1]]) != same
+    non_orientable = np.unique(component[pairs[conflict,0]])
+    return flip, component, non_orientable
+
+def orient(tris, points=None, pairs=None, same=None):
+    """
+    Enforce a consistent orientation of all triangles in a triangulation. The
+    rows of `tris` are flipped in place.
+
+    If `points` is given, each connected component is oriented so that its
+    total signed area in the (x, y)-plane is positive (counter-clockwise).
+    Otherwise, the orientation of the first triangle in each component is
+    kept.
+
+    Arguments:
+        tris : Triangulation in the form of a m x 3 array.
+        points(optional) : Array of coordinates, typically in the coordinate
+            system of the best fitting plane.
+        pairs, same(optional) : Output of `adjacency`. Computed if not given.
+
+    Returns:
+        tris : The reoriented triangulation.
+        non_orientable : Array of components that cannot be consistently
+            oriented. The triangles in these components are only partially
+            reoriented. A warning is issued if this array is not empty.
+
+    """
+    import warnings
+
+    flip, component, non_orientable = propagate(tris, pairs, same)
+
+    if points is not None:
+        areas = signed_areas(tris, points)
+        areas[flip] = -areas[flip]
+        total = np.bincount(component, weights=areas)
+        flip = flip ^ (total[component] < 0)
+
+    tris[flip,:] = tris[flip,::-1]
+
+    if non_orientable.shape[0] > 0:
+        warnings.warn('Found %d non-orientable component(s): %s' %
+                      (non_orientable.shape[0], str(non_orientable)))
+
+    return tris, non_orientable
+
+def boundary_orientation(tris, bnd_edges):
+    """
+    Determine if a list of boundary edges has the same orientation as the
+    triangles that they belong to. The triangles must be consistently oriented
+    (see `orient`).
+
+    Arguments:
+        tris : Triangulation in the form of a m x 3 array.
+        bnd_edges : Array of boundary edges (num edges x 2).
+
+    Returns:
+        out : `1` if most of the boundary edges are traversed in the same
+            direction as in their triangles, and `-1` otherwise.
+
+    """
+    tris = np.asarray(tris, dtype=np.int64)
+    bnd_edges = np.asarray(bnd_edges, dtype=np.int64)
+    half_edges = tris[:, [0, 1, 1, 2, 2, 0]].reshape(-1, 2)
+    n = max(np.max(tris), np.max(bnd_edges)) + 1
+    keys = np.sort(half_edges[:,0] * n + half_edges[:,1])
+
+    def found(a, b):
+        query = a * n + b
+        idx = np.minimum(np.searchsorted(keys, query), keys.shape[0] - 1)
+        return keys[idx] == query
+
+    forward = np.count_nonzero(found(bnd_edges[:,0], bnd_edges[:,1]))
+    backward = np.count_nonzero(found(bnd_edges[:,1], bnd_edges[:,0]))
+    return 1 if forward >= backward else -1
@@ -0,0 +1,1299 @@
+"""
+Module for running the stages of the surface fitting pipeline in a single
+process.
+
+Each stage is a function that takes the state of a part (a
+`splinefit.utils.Struct`, see `load`) and returns it after adding its results.
+The stages, in order, are:
+
+    boundary      Extract the boundary of a triangular surface mesh (sfbnd)
+    projection    Project the boundary onto the best fitting plane (sfproj)
+    rotation      Rotate the projected boundary to minimize its bounding box
+                  (sfrot)
+    segmentation  Split the boundary into four segments (sfseg)
+    boundary_fit  Fit BSpline curves to the boundary segments (sffbnd)
+    surface_fit   Fit a BSpline surface (sffsrf)
+    export_iges   Export the BSpline surface to IGES (sfiges)
+
+The first stage takes the name of a gmsh mesh file instead of a state. Use
+`run` to execute a range of stages, optionally saving the state after each
+stage to the same directories that the command line scripts use (see
+`splinefit.state`).
+
+"""
+import numpy as np
+from . import bspline
+from . import fitting
+from . import msh
+from . import triangulation
+from . import utils
+
+stages = ['boundary', 'projection', 'rotation', 'segmentation',
+          'boundary_fit', 'surface_fit', 'export_iges']
+
+
+class Skip(Exception):
+    """
+    Raised by a stage when a part cannot be processed. The remaining stages of
+    the part are skipped.
+
+    """
+    pass
+
+
+def run(config, data=None):
+    """
+    Run a range of stages of the pipeline.
+
+    Arguments:
+        config : Dictionary with the fields:
+            input : Gmsh mesh file to read (required if the first stage is
+                `boundary`).
+            start, stop(optional) : Names of the first and last stage to run.
+                Default to the first and last stage.
+            checkpoint(optional) : Directory name with a `%s` that is
+                replaced by the name of each stage, e.g.,
+                `pydata/%s_1`. The state is saved after each stage (except
+                `export_iges`). If the run does not begin with the first stage,
+                the state is loaded from the checkpoint of the previous stage.
+            <stage>(optional) : Dictionary of keyword arguments for each stage
+                (see the stage functions).
+            cache(optional) : Cache directory (see `splinefit.cache`). A stage
+                is skipped if its result is found in the cache, i.e., if
+                neither its input nor its options have changed. Figures are
+                not redrawn for skipped stages.
+            cache_size(optional) : Size limit of the cache in bytes.
+        data(optional) : State to start from. Overrides loading the state from
+            a checkpoint.
+
+    Returns:
+        The state after the last stage, or `None` if the part was skipped
+        (see `Skip`).
+
+    """
+    start = stages.index(config.get('start', stages[0]))
+    stop = stages.index(config.get('stop', stages[-1]))
+    checkpoint = config.get('checkpoint', '')
+
+    if data is None and start > 0:
+        if not checkpoint:
+            raise ValueError('A checkpoint is required to start at stage: %s' %
+                             stages[start])
+        data = load(checkpoint % stages[start - 1])
+
+    if config.get('cache', ''):
+        from . import cache
+        from . import state
+        store = cache.Cache(config['cache'],
+                            config.get('cache_size', 2**30))
+        if start == 0:
+            key = cache.file_hash(config['input'])
+        else:
+            key = state.digest(data)
+    else:
+        store = None
+
+    # Checkpoints that hold the same state as a result in the cache
+    links = {}
+    # Checkpoint of the state, if it has not been read yet
+    pending = ''
+
+    for name in stages[start:stop + 1]:
+        stage = globals()[name]
+        options = config.get(name, {})
+        cached = store is not None and name != 'export_iges'
+        if checkpoint and name != 'export_iges':
+            target = checkpoint % name
+        else:
+            target = ''
+
+        if cached:
+            key = stage_key(key, name, options)
+            result = _restore(store, key, options, target, links)
+            if result is not None:
+                print("Using cached result of stage: %s" % name)
+                if target:
+                    pending = target
+                else:
+                    data = result
+                continue
+
+        if pending:
+            data = load(pending)
+            pending = ''
+        try:
+            if name == 'boundary':
+                data = stage(config['input'], **options)
+            else:
+                data = stage(data, **options)
+        except Skip as e:
+            print(e)
+            return None
+
+        # Continue with the stored state so that the next stage only stores
+        # the arrays that it adds
+        if target:
+            save(target, data)
+            data = load(target)
+        if cached:
+            store.put(key, data, links)
+            if target:
+                links[target] = store.filename(key)
+            else:
+                data = store.get(key) or data
+
+    if pending:
+        data = load(pending)
+    return data
+
+
+def stage_key(key, name, options):
+    """
+    Cache key of the result of a stage.
+
+    Arguments:
+        key : Key of the input of the stage, i.e., the key of the previous
+            stage or a hash of the input file.
+        name : Name of the stage.
+        options : Keyword arguments of the stage. Options that only control
+            figures are ignored.
+
+    """
+    from . import __version__
+    from . import cache
+    options = {k : v for k, v in options.items()
+               if k not in ['savefig', 'showfig']}
+    return cache.key(__version__, key, name, options)
+
+
+def _restore(store, key, options, checkpoint='', links=None):
+    """
+    Restore the result of a stage from the cache. The result is written to the
+    checkpoint, if given, and read otherwise.
+
+    Arguments:
+        store : The cache.
+        key : Key of the result.
+        options : Keyword arguments of the stage.
+        checkpoint(optional) : Checkpoint of the stage.
+        links(optional) : Dictionary that maps the checkpoints of the previous
+            stages to their results in the cache. The checkpoint is added to
+            it.
+
+    Returns:
+        The result (`True` if it was written to the checkpoint), or `None` if it
+        is not in the cache or if a file that the stage writes (`vtk`, `tsurf`)
+        is missing.
+
+    """
+    import os
+    from . import state
+    for option in ['vtk', 'tsurf']:
+        if options.get(option, '') and not os.path.exists(options[option]):
+            return None
+    data = store.get(key)
+    if data is None or not checkpoint:
+        return data
+    if links is None:
+        links = {}
+    state.write(checkpoint, data,
+                links={v : k for k, v in links.items()},
+                root=os.path.dirname(os.path.abspath(checkpoint)))
+    print(" - Wrote: ", checkpoint)
+    links[checkpoint] = store.filename(key)
+    return True
+
+
+def layout(filename, output, part, savefig=True, vtk=False, log=False):
+    """
+    Configuration for `run` that uses the directory layout of `sfbuild`:
+
+        <output>/pydata/<stage>_<part>       State after each stage
+        <output>/figures/                    Figures
+        <output>/vtk/surface_fit_<part>.vts  Fitted surface (if `vtk`)
+        <output>/logs/part_<part>.log        Output of the run (if `log`)
+
+    Arguments:
+        filename : Gmsh mesh file of the part.
+        output : Output directory.
+        part : Part number.
+        savefig(optional) : Save figures.
+        vtk(optional) : Write the fitted surface to VTK.
+        log(optional) : Write the output of the run to a log file (see
+            `run_many`).
+
+    Returns:
+        Dictionary that can be updated with further stage options before it is
+        passed to `run`.
+
+    """
+    config = {'input' : filename,
+              'checkpoint' : '%s/pydata/%%s_%s' % (output, part),
+              'stop' : 'surface_fit'}
+    for name in stages:
+        config[name] = {}
+    if savefig:
+        figures = '%s/figures/' % output
+        config['boundary']['savefig'] = figures + 'boundary_%s.png' % part
+        config['projection']['savefig'] = figures + 'projection_%s.png' % part
+        config['rotation']['savefig'] = figures + 'rotation_%s.png' % part
+        config['segmentation']['savefig'] = (figures +
+                                             'segmentation_%s.png' % part)
+        config['boundary_fit']['savefig'] = figures + 'boundary_fit_%s' % part
+        config['surface_fit']['savefig'] = figures + 'part_%s_fit' % part
+    if vtk:
+        config['surface_fit']['vtk'] = '%s/vtk/surface_fit_%s.vts' % (output,
+                                                                      part)
+    if log:
+        config['log'] = '%s/logs/part_%s.log' % (output, part)
+    return config
+
+
+def run_many(configs, processes=None):
+    """
+    Run the pipeline for many independent parts, e.g., all parts of all faults,
+    using a pool of worker processes. The largest parts are started first to
+    keep the workers busy. The size of a part is estimated by the size of its
+    input file (the mesh, or the checkpoint that the run starts from).
+
+    A part that fails does not stop the other parts. The output of a part is
+    written to the file `config['log']`, if given.
+
+    Arguments:
+        configs : List of configurations (see `run`).
+        processes(optional) : Number of worker processes. Pass `None` to use
+            all available CPUs.
+
+    Returns:
+        List with one `splinefit.utils.Struct` per configuration, with the
+        fields `status` ('done', 'skipped', or 'failed'), `error` (traceback
+        of a failed part), and `time` (seconds).
+
+    """
+    order = sorted(range(len(configs)), key=lambda i: -_input_size(configs[i]))
+    results = [None] * len(configs)
+
+    def report(i):
+        print(" - [%d/%d] %s: %s (%.1f s)" %
+              (len([r for r in results if r is not None]), len(configs),
+               _name(configs[i]), results[i].status, results[i].time))
+
+    if processes == 1 or len(configs) < 2:
+        for i in order:
+            results[i] = _run_job(configs[i])
+            report(i)
+        return results
+
+    from concurrent.futures import ProcessPoolExecutor, as_completed
+    with ProcessPoolExecutor(max_workers=processes) as pool:
+        futures = {pool.submit(_run_job, configs[i]) : i for i in order}
+        for future in as_completed(futures):
+            i = futures[future]
+            try:
+                results[i] = future.result()
+            except Exception as e:
+                # The worker process died
+                results[i] = utils.Struct({'status' : 'failed',
+                                           'error' : repr(e), 'time' : 0.0})
+            report(i)
+    return results
+
+
+def _run_job(config):
+    """
+    Run the pipeline for a single part and catch any error.
+
+    """
+    import contextlib
+    import os
+    import sys
+    import time
+    import traceback
+
+    log = config.get('log', '')
+    if log:
+        if os.path.dirname(log):
+            os.makedirs(os.path.dirname(log), exist_ok=True)
+        fh = open(log, 'w')
+    else:
+        fh = None
+
+    start = time.time()
+    error = ''
+    with contextlib.ExitStack() as stack:
+        if fh:
+            stack.enter_context(fh)
+            stack.enter_context(contextlib.redirect_stdout(fh))
+            stack.enter_context(contextlib.redirect_stderr(fh))
+        try:
+            data = run(config)
+            status = 'skipped' if data is None else 'done'
+        except Exception:
+            error = traceback.format_exc()
+            status = 'failed'
+            print(error)
+        finally:
+            if 'matplotlib.pyplot' in sys.modules:
+                sys.modules['matplotlib.pyplot'].close('all')
+
+    return utils.Struct({'status' : status, 'error' : error,
+                         'time' : time.time() - start})
+
+
+def _input_size(config):
+    import os
+    start = config.get('start', stages[0])
+    if start == stages[0]:
+        filename = config.get('input', '')
+    elif config.get('checkpoint', ''):
+        filename = config['checkpoint'] % stages[stages.index(start) - 1]
+    else:
+        return 0
+    from . import state
+    try:
+        if os.path.isdir(filename):
+            return state.size(filename)
+        return os.path.getsize(filename)
+    except (OSError, ValueError):
+        return 0
+
+
+def _name(config):
+    return config.get('log', '') or config.get('input', '') or \
+           config.get('checkpoint', '')
+
+
+def load(filename):
+    """
+    Load the state of a part (see `splinefit.state`). The arrays of the state
+    are memory mapped and read-only.
+
+    Pickle files written by earlier versions can also be loaded. Fields that
+    are stored as attributes of an unpickled `splinefit.utils.Struct` are also
+    made available as items (and vice versa).
+
+    """
+    import os
+    import pickle
+    from . import state
+    if os.path.isdir(filename):
+        return state.read(filename)
+    with open(filename, 'rb') as fh:
+        data = pickle.load(fh)
+    return utils.Struct(dict(data, **vars(data)))
+
+
+def save(filename, data):
+    """
+    Save the state of a part to a directory (see `splinefit.state`). Arrays
+    that have been loaded from another state, and not replaced, are not
+    written again.
+
+    """
+    from . import state
+    state.write(filename, data)
+    print(" - Wrote: ", filename)
+
+
+def boundary(filename, weld=None, savefig='', showfig=0):
+    """
+    Extract the boundary of a triangular surface mesh.
+
+    Arguments:
+        filename : Gmsh mesh file to read.
+        weld(optional) : Tolerance for welding coincident nodes. Use `0` to
+            only weld nodes with identical coordinates. Nodes are not welded
+            by default. If welding makes the mesh non-manifold, e.g., by
+            closing a slit, the unwelded mesh is used instead.
+        savefig(optional) : Save figure to this file.
+        showfig(optional) : Show figure (pauses application).
+
+    Returns:
+        The state of the part.
+
+    """
+    coords, tris = msh.read(filename)
+    tris = msh.get_data(tris, num_members=3, index=1)
+    coords, tris, node_map = compact(coords, tris, weld)
+    mesh = triangulation.Mesh(coords[:,1:], tris)
+    active_nodes = mesh.active_nodes
+    check_num_tris(tris)
+    print("Extracting boundary segments")
+
+    bnd_edges, loops = get_boundary(mesh)
+    plot_boundary(coords, tris, bnd_edges, savefig, showfig)
+
+    data = utils.Struct()
+    data.active_nodes = active_nodes
+    data.coords = coords
+    data.tris = tris
+    data.node_map = node_map
+    data.mesh = mesh
+    data.bnd_edges = bnd_edges
+    data.loops = loops
+    return data
+
+
+def projection(data, savefig='', showfig=0):
+    """
+    Project the boundary onto its best fitting plane.
+
+    """
+    print("Projecting boundary onto best fitting plane")
+
+    pcl_xyz = data.coords[:,1:]
+    pcl_xyz, mu, std = fitting.normalize(pcl_xyz)
+
+    # Do not normalize data
+    pcl_xyz = pcl_xyz * std
+    std = std * 0 + 1.0
+
+    edges = data.bnd_edges
+
+    bnd_xyz = pcl_xyz[edges[:,0],:]
+
+    basis = fitting.pca(bnd_xyz, num_components=3)
+    proj_basis = fitting.pca(bnd_xyz, num_components=2)
+    bnd_xy = fitting.projection(bnd_xyz, proj_basis)
+    pcl_xy = fitting.projection(pcl_xyz, proj_basis)
+
+    data.mu = mu
+    data.std = std
+    data.basis = basis
+    data.proj_basis = proj_basis
+    data.edges = edges
+    data.bnd_xyz = bnd_xyz
+    data.bnd_xy = bnd_xy
+    data.pcl_xyz = pcl_xyz
+    data.pcl_xy = pcl_xy
+    data.bnd_proj_xyz = data.basis.T.dot(data.bnd_xyz.T).T
+    data.pcl_proj_xyz = data.basis.T.dot(data.pcl_xyz.T).T
+
+    plot_projection(bnd_xyz, bnd_xy, basis, savefig=savefig, showfig=showfig)
+    return data
+
+
+def rotation(data, savefig='', showfig=0):
+    """
+    Rotate the projected boundary to minimize its bounding box.
+
+    """
+    import scipy.optimize
+
+    print("Rotating projected boundary by minimizing its bounding box")
+
+    # Rotate data into new coordinate system
+    T = data.proj_basis
+    bnd_xy = T.T.dot(data.bnd_xyz.T).T
+
+    center = fitting.mean(bnd_xy)
+    center = np.tile(center, (bnd_xy.shape[0],1))
+
+    obj = lambda theta : rotation_objective(bnd_xy, center, theta)
+
+    var = scipy.optimize.minimize(obj, (0.0,), method='Nelder-Mead')['x']
+    data.theta = var[0]
+    data.center = center
+    rxy = fitting.rotate2(bnd_xy, center, data.theta)
+    data.bnd_rxy = rxy
+    data.proj_xy = bnd_xy
+    data.bnd_rz = data.bnd_proj_xyz[:,2]
+
+    plot_rotation(bnd_xy, rxy, savefig=savefig, showfig=showfig)
+    return data
+
+
+def segmentation(data, savefig='', showfig=0):
+    """
+    Split the boundary into left, bottom, right, and top segments. The corner
+    points are selected using the L1 distance to the corners of the bounding
+    box.
+
+    """
+    print("Segmenting boundary")
+    pts = np.vstack((data.bnd_rxy[:,0], data.bnd_rxy[:,1], data.bnd_rz)).T
+    pts = fix_orientation(pts)
+    data.bnd_rxy = pts[:,0:2]
+    data.bnd_rz = pts[:,2]
+    bbox = fitting.bbox2(data.bnd_rxy)
+    data.bbox = bbox
+    corner_ids = get_corners(data.bnd_rxy, bbox)
+    points = np.vstack((data.bnd_rxy[:,0], data.bnd_rxy[:,1], data.bnd_rz)).T
+    boundaries = segments(points, corner_ids)
+    data.corners = data.bnd_rxy[corner_ids]
+    data.corner_ids = corner_ids
+    data.boundaries = boundaries
+
+    plot_segments(data.corners, pts, boundaries, savefig=savefig,
+                  showfig=showfig)
+    return data
+
+
+def boundary_fit(data, deg=2, reg=1.0, num_knots=10, est_knots=1, savefig='',
+                 showfig=0):
+    """
+    Fit BSpline curves to the boundary segments.
+
+    Arguments:
+        data : State of the part.
+        deg(optional) : Degree of BSpline basis functions.
+        reg(optional) : Strength of regularization term.
+        num_knots(optional) : Number of knots to use if `est_knots` is false.
+        est_knots(optional) : Automatically determine the number of knots.
+        savefig(optional) : Save figures using this prefix.
+        showfig(optional) : Show figures (pauses application).
+
+    """
+    bspline_curves = []
+    print("Fitting BSpline curve to boundary segments")
+
+    for num, bnd in enumerate(data.boundaries):
+        min_degree = bspline.min_degree(len(bnd.x), deg)
+        if len(bnd.x) == 1:
+            continue
+        if est_knots:
+            m = estimate_knots(bnd.x, bnd.y, bnd.z)
+        else:
+            m = num_knots
+        print(" - Processing curve %d: degree = %d knots = %d " %
+               (num + 1, min_degree, m))
+        curve, res = fit_curve(bnd.x, bnd.y, bnd.z, min_degree, m, a=reg)
+
+        bsc = bspline.Curve(curve.U, curve.p, curve.Px, curve.Py, curve.Pz)
+
+        bsc.rwPx, bsc.rwPy, bsc.rwPz = fitting.restore(curve.Px, curve.Py,
+                curve.Pz, data.basis, data.mu, data.std, data.center,
+                data.theta)
+        print("     Residual: %g " % res)
+        bspline_curves.append(bsc)
+
+        if savefig:
+            figure = "%s%d.png" % (savefig, num)
+        else:
+            figure = ""
+
+        plot_curve(bspline_curves[-1], savefig=figure, showfig=showfig)
+
+    data['bspline_curves'] = bspline_curves
+    return data
+
+
+def surface_fit(data, deg_u=2, deg_v=2, num_u=10, num_v=10, est_uv=1,
+                pad=0.1, scale=0.0, proj='delaunay', decimate=1.0,
+                dec_error=0.0, fit=False, reg=1e-1, vtk='', tsurf='',
+                eval_nu=10, eval_nv=10, savefig='', showfig=0):
+    """
+    Project a grid of control points onto the point cloud and optionally fit
+    the BSpline surface to it.
+
+    Arguments:
+        data : State of the part.
+        deg_u, deg_v(optional) : Degree of BSpline basis functions in the u
+            and v-directions.
+        num_u, num_v(optional) : Number of control points in the u and
+            v-directions, used if `est_uv` is false.
+        est_uv(optional) : Automatically determine the number of control
+            points.
+        pad(optional) : Padding of the bounding box.
+        scale(optional) : Scaling of the average element size used to
+            estimate the number of control points.
+        proj(optional) : Method used to project the grid onto the point cloud:
+            'delaunay' re-triangulates the point cloud, 'mesh' projects onto
+            the input triangulation.
+        decimate(optional) : Fraction of the nodes to keep after decimating
+            the mesh.
+        dec_error(optional) : Largest error allowed when decimating the mesh.
+        fit(optional) : Enable least squares fitting.
+        reg(optional) : Strength of regularization term.
+        vtk(optional) : Write the fitted surface to a VTK legacy file (.vtk)
+            or VTK XML file (.vts).
+        tsurf(optional) : Write the triangulated fitted surface to a GOCAD
+            Tsurf file (.ts).
+        eval_nu, eval_nv(optional) : Number of evaluation points of the
+            surface in each direction.
+        savefig(optional) : Save figures using this prefix.
+        showfig(optional) : Show figures (pauses application).
+
+    """
+    if proj not in ['delaunay', 'mesh']:
+        raise ValueError("Unknown projection method: %s" % proj)
+
+    print("Fitting BSpline surface")
+
+    tris = data.tris
+
+    xyz_all = rotate(data.pcl_xyz, data.basis, data.proj_basis, data.theta,
+                     data.center)
+    xyz = xyz_all[data.active_nodes==1,:]
+    if 'mesh' in data:
+        mesh = data.mesh.with_coords(xyz_all)
+    else:
+        mesh = triangulation.Mesh(xyz_all, tris)
+
+    bounding_box = fitting.bbox2_expand(fitting.bbox2(xyz), pad)
+
+    bnd_edges = orient_boundary(mesh, data.bnd_edges)
+    bnd_geom = normals(mesh, bnd_edges, showfig=showfig, savefig=savefig)
+    bbox_points = intersect(bnd_geom['normals'], bnd_geom['points'],
+                            bounding_box, showfig=showfig, savefig=savefig)
+    corner_points = set_z_nearest_corners(bbox_points, bounding_box)
+
+    if est_uv:
+        nu, nv = estimate_uv(mesh, bounding_box, scale)
+    else:
+        nu = num_u
+        nv = num_v
+
+    print(" - Grid dimensions: %d x %d" % (nu, nv))
+
+    if decimate < 1.0 or dec_error > 0:
+        mesh = decimate_mesh(mesh, decimate, dec_error)
+        xyz = xyz_all[mesh.active_nodes==1,:]
+
+    xyz_augmented = np.vstack((xyz, bbox_points, corner_points))
+
+    pu = deg_u
+    pv = deg_v
+
+    # Construct uv-grid
+    int_knot_u = bspline.numknots(nu, pu, interior=1)
+    int_knot_v = bspline.numknots(nv, pv, interior=1)
+    U = bspline.uniformknots(int_knot_u, pu)
+    V = bspline.uniformknots(int_knot_v, pv)
+
+    # Construct control points
+    # Find vertical component of the control points by projecting onto the
+    # triangulation
+    X, Y = fitting.bbox2_grid(bounding_box, nu, nv)
+    queries = np.vstack((X.flatten() , Y.flatten(), 0*X.flatten())).T
+    if proj == 'mesh':
+        points = project_mesh(mesh, queries,
+                              np.vstack((bnd_geom['points'], bbox_points,
+                                         corner_points)))
+    else:
+        dela, points = triangulation.project(xyz_augmented, queries)
+    Z = np.reshape(points[:,2], (X.shape[0], Y.shape[1]))
+    points[:,2] = Z.flatten()
+
+    S = bspline.Surface(U, V, pu, pv, X, Y, Z, label='grid')
+
+    if fit:
+        print(" - Applying surface fitting")
+        res = fit_surface(S, points, regularization=reg)
+        print(" - Residual: %g " % res)
+
+    # Transform fitted surface to the original coordinate system
+    S.rwPx, S.rwPy, S.rwPz = fitting.restore(S.Px, S.Py, S.Pz,
+        data.basis, data.mu, data.std, data.center, data.theta)
+
+    if savefig or showfig:
+        import matplotlib.pyplot as plt
+        from mpl_toolkits.mplot3d import Axes3D
+        from . import plot
+        S.eval(nu=eval_nu, nv=eval_nv)
+        fig = plt.figure()
+        ax = fig.add_subplot(111, projection='3d', proj_type='ortho')
+        ax = plot.grid(S.Px, S.Py, S.Pz, ax=ax)
+        ax = plot.points3(xyz_augmented, 'ko', ax=ax)
+        ax.view_init(70, 70)
+
+        if savefig:
+            plt.savefig(savefig + "_bspline_surface.png", dpi=300)
+
+        if showfig:
+            plt.show()
+        plt.close(fig)
+
+    if vtk:
+        from . import vtk as vtkio
+        S.eval(nu=eval_nu, nv=eval_nv, rw=1)
+        if vtk.endswith('.vts'):
+            vtkio.write_vts(vtk, S.X, S.Y, S.Z, compress=True)
+        else:
+            vtkio.write_surface(vtk, S.X, S.Y, S.Z)
+        print(" - Wrote vtk file: %s" % vtk)
+
+    if tsurf:
+        S.tsurf(tsurf, nu=eval_nu, nv=eval_nv)
+        print(" - Wrote tsurf file: %s" % tsurf)
+
+    data.bspline_surface = S
+    return data
+
+
+def export_iges(data, filename, rw=1):
+    """
+    Export the BSpline surface, trimmed by the boundary curves, to IGES.
+
+    Arguments:
+        data : State of the part.
+        filename : IGES file to write.
+        rw(optional) : Use real world coordinates.
+
+    """
+    from . import iges
+    print("Exporting BSpline Surface to IGES")
+    with iges.Writer(filename) as igs:
+        iges.write_surface(igs, data['bspline_surface'],
+                           data['bspline_curves'], rw=rw)
+    print(" - Wrote: %s" % filename)
+    return data
+
+
+def compact(coords, tris, tol=None):
+    """
+    Remove unused nodes and optionally weld coincident nodes (see
+    `triangulation.compact`). The first column of `coords` (node ID) is
+    renumbered.
+
+    Welding is skipped, with a warning, if it makes the mesh non-manifold.
+
+    """
+    import warnings
+    from . import orientation
+    xyz, new_tris, node_map = triangulation.compact(coords[:,1:], tris,
+                                                    tol=tol)
+    if tol is not None and orientation.adjacency(new_tris)[2].shape[0] > 0:
+        warnings.warn('Welding nodes makes the mesh non-manifold. The nodes '
+                      'are not welded.')
+        xyz, new_tris, node_map = triangulation.compact(coords[:,1:], tris)
+    num_unused = np.count_nonzero(node_map == -1)
+    num_welded = coords.shape[0] - num_unused - xyz.shape[0]
+    print(" - Removed %d unused node(s) and welded %d node(s)" % (num_unused,
+          num_welded))
+    coords = np.hstack((np.arange(xyz.shape[0])[:,None], xyz))
+    return coords, new_tris, node_map
+
+
+def check_num_tris(tris, min_elem=16):
+    """
+    Make sure that there are a sufficient number of elements to treat.
+
+    """
+    if tris.shape[0] <= min_elem:
+        raise Skip("Not enough elements! Boundary extraction aborted.")
+
+
+def get_boundary(mesh):
+    """
+    Return the edges for the boundary with largest circumference, and a list of
+    all boundaries found.
+
+    """
+    print(" - Total number of boundary edges:", mesh.boundary_edges.shape[0])
+
+    # Order boundary edges so that boundary can be easily traversed
+    bnd_edges, lengths = mesh.boundary_loops
+    num_loops = len(lengths)
+    circ = triangulation.loop_circumferences(bnd_edges, mesh.coords)
+    print(" - Number of boundary loops:", num_loops)
+    # Loops are sorted by loop ID and traversal ID
+    loop_edges = np.split(bnd_edges[:,0:2], np.cumsum(lengths)[:-1])
+    loops = []
+    for loop_id in range(1, num_loops+1):
+        print(" - Loop ID: %d, Number of boundary edges: %d Circumference: %g "\
+               %(
+                loop_id,
+                lengths[loop_id - 1],
+                circ[loop_id - 1]))
+        loops.append({"outer": 0,
+                      "loop": loop_edges[loop_id - 1]})
+    c_idx = np.argmax(circ)
+    bnd_edges = loops[c_idx]["loop"]
+    loops[c_idx]["outer"] = 1
+    return bnd_edges, loops
+
+
+def rotation_objective(xy, mu, theta):
+    try:
+        theta = theta[0]
+    except:
+        pass
+    rxy = fitting.rotate2(xy, mu, theta)
+    bbox = fitting.bbox2(rxy)
+    return fitting.bbox2_vol(bbox)
+
+
+def get_corners(points, bbox, norm=1):
+    """
+    Select boundary corners using the norm `norm`. Defaults to `1` (L1 norm).
+
+    """
+    nearest = []
+    for i in range(4):
+        nearest.append(fitting.argnearest(points, bbox[i,:], ord=norm))
+    return nearest
+
+
+def get_segment(points, id1, id2):
+    if id2 < id1:
+        ids = list(range(id1, points.shape[0])) + list(range(id2+1))
+        return np.vstack((points[id1:,:],points[:id2+1,:])),ids
+    else:
+        ids = list(range(id1, id2+1))
+        return points[id1:id2+1,:], ids
+
+
+def fix_orientation(points):
+    """
+    Make sure boundary is ordered counter clockwise
+    """
+    normals = triangulation.normals2(points)
+    is_ccw = triangulation.orientation2(points, normals)
+    if is_ccw < 0:
+        points = points[::-1,:]
+    return points
+
+
+def segments(points, corner_ids):
+    corners = list(corner_ids) + [corner_ids[0]]
+    boundaries = []
+    for i, ci in enumerate(corners[:-1]):
+        data, ids = get_segment(points, corners[i], corners[i+1])
+        boundary = utils.Struct(
+                      {'points': data,
+                           'x' : data[:,0],
+                           'y' : data[:,1],
+                           'z' : data[:,2],
+                           'ids' : ids})
+        boundaries.append(boundary)
+    return boundaries
+
+
+def estimate_knots(x, y, z):
+    """
+    Estimate the number of knots by calculating the length of the piecewise
+    linear segment and the average spacing between segments.
+    """
+
+    t = bspline.chords(x, y, z)
+
+    diff = t[1:] - t[0:-1]
+
+    return int(1 / np.mean(diff))
+
+
+def fit_curve(x, y, z, p, m, a=0.5, tol=1e-6):
+    """
+    Fit BSpline curve using linear least square approximation with second
+    derivative regularization.
+    """
+
+    xm = np.mean(x)
+    ym = np.mean(y)
+    zm = np.mean(z)
+    t = bspline.chords(x-xm, y-ym)
+    U = bspline.uniformknots(m, p)
+    l = np.zeros((len(U) - p - 1,))
+    wx = 1.0 + 0 * l
+    wy = 1.0 + 0 * l
+    wz = 1.0 + 0 * l
+    Px, rx = bspline.lsq(t, x - xm, U, p, tol=tol, s=0, a=a, w=wx)
+    Py, ry = bspline.lsq(t, y - ym, U, p, tol=tol, s=0, a=a, w=wy)
+    Pz, rz = bspline.lsq(t, z - zm, U, p, tol=tol, s=0, a=a, w=wz)
+
+    curve = utils.Struct()
+    curve.x = x
+    curve.y = y
+    curve.z = z
+    curve.Px = Px + xm
+    curve.Py = Py + ym
+    curve.Pz = Pz + zm
+    curve.U = U
+    curve.p = p
+    curve.u = t
+    curve.px = curve.Px[:-p]
+    curve.py = curve.Py[:-p]
+    curve.int_knot = m
+
+
+    res = rx + ry + rz
+    return curve, res
+
+
+def evalcurve3(curve, num):
+    u = np.linspace(curve.U[0], curve.U[-1], num)
+    cx = bspline.evalcurve(curve.p, curve.U, curve.Px, u)
+    cy = bspline.evalcurve(curve.p, curve.U, curve.Py, u)
+    cz = bspline.evalcurve(curve.p, curve.U, curve.Pz, u)
+    return cx, cy, cz
+
+
+def rotate(coords, basis, projection_basis, rotation_angle, center):
+    """
+    Rotate point cloud using the basis vectors of the best fitting plane, and
+    bounding box.
+    """
+    # Rotate point cloud
+    xy = projection_basis.T.dot(coords.T).T
+    xyz = basis.T.dot(coords.T).T
+    center_tiled = np.tile(center[0,:], (xy.shape[0],1))
+    rxy = fitting.rotate2(xy, center_tiled, rotation_angle)
+    xyz[:, 0:2] = rxy
+    return xyz
+
+
+def estimate_uv(mesh, bbox, cell_scaling):
+    """
+    Estimate the number of u, v, points to use by determining the average
+    element size in the triangulation.
+
+    """
+    areas = mesh.areas
+
+    dist = np.mean(np.sqrt(areas))
+    scaled_dist = dist * (1.0 + cell_scaling)
+    Lx, Ly = fitting.bbox2_dimensions(bbox)
+    print(" - Bounding box dimensions: %d x %d" % (Lx, Ly))
+    print(" - Average distance between points: %g" % dist)
+    print(" - Scaled distance between points: %g" % scaled_dist)
+
+    num_u = round(Lx / scaled_dist ) + 1
+    num_v = round(Ly / scaled_dist ) + 1
+    return num_u, num_v
+
+
+def project_mesh(mesh, queries, outer_points):
+    """
+    Project query points onto the input triangulation. Query points that fall
+    outside the triangulation are projected onto the Delaunay triangulation of
+    the points `outer_points` that surround the input triangulation (boundary
+    points and bounding box points).
+
+    """
+    projector = triangulation.MeshProjector(mesh.coords, mesh.tris)
+    located, bary = projector.locate(queries)
+    points = projector(queries, skip_nan=False)
+    outside = located == -1
+    if np.any(outside):
+        dela, outer = triangulation.project(outer_points, queries[outside,:],
+                                            skip_nan=False)
+        points[outside,:] = outer
+    return points
+
+
+def decimate_mesh(mesh, fraction=1.0, max_error=0.0):
+    """
+    Reduce the number of nodes in the mesh while keeping its boundary.
+
+    Args:
+        mesh: Triangular mesh (`sf.triangulation.Mesh`)
+        fraction: Fraction of the nodes to keep.
+        max_error: Largest error allowed. Disabled if `max_error = 0`.
+
+    Returns:
+        The decimated mesh.
+
+    """
+    num_nodes = np.count_nonzero(mesh.active_nodes)
+    target = int(fraction * num_nodes) if fraction < 1.0 else None
+    tris, error = triangulation.decimate(mesh.coords, mesh.tris,
+                                         target=target,
+                                         max_error=max_error or None)
+    mesh = triangulation.Mesh(mesh.coords, tris)
+    print(" - Decimated mesh: %d -> %d nodes, error: %g" %
+            (num_nodes, np.count_nonzero(mesh.active_nodes), error))
+    return mesh
+
+
+def fit_surface(S, points, surf_smooth=0, regularization=0.0):
+    x = points[:,0]
+    y = points[:,1]
+    z = points[:,2]
+    u = bspline.xmap(x)
+    v = bspline.xmap(y)
+
+    S.Pz, res = bspline.lsq2surf(u, v, z, S.U, S.V, S.pu, S.pv,
+                                 s=surf_smooth, a=regularization)
+    return res
+
+
+def orient_boundary(mesh, bnd_edges):
+    """
+    Enforce counter-clockwise boundary orientation
+
+    """
+    from . import orientation
+    pairs, same, non_manifold = mesh.tri_adjacency
+    tris, non_orientable = orientation.orient(np.copy(mesh.tris),
+                                              mesh.coords, pairs, same)
+
+    if orientation.boundary_orientation(tris, bnd_edges) < 0:
+        bnd_edges = bnd_edges[::-1,::-1]
+
+    return bnd_edges
+
+
+def normals(mesh, bnd_edges, showfig=False, savefig=False):
+    """
+    Find the normals with respect to the boundary triangles.
+    The surface normal is defined using the cross product of two edges of a
+    boundary triangle. Hence, this normal is orthogonal to the surface of the
+    triangle. The boundary normal is orthogonal to the surface normal and
+    tangent vector along the boundary.
+
+    Args:
+        mesh: Triangular mesh (`sf.triangulation.Mesh`)
+        bnd_edges: An array of the node indices defining the boundary edges.
+
+    Returns:
+        A dictionary containing the surface normals, normals, and boundary
+            triangles.
+
+    """
+    points = mesh.coords
+    tris = mesh.tris
+
+    bnd_tris = mesh.edge_triangles(bnd_edges)
+    n1 = bnd_edges[:,0]
+    n2 = bnd_edges[:,1]
+    n3 = np.sum(tris[bnd_tris,:], axis=1) - n1 - n2
+
+    tangent = points[n2,:] - points[n1,:]
+    other = points[n3,:] - points[n1,:]
+    surface_normals = np.cross(tangent, other)
+    normals = np.cross(tangent, surface_normals)
+    bnd_points = np.array(points[n1,:])
+    bnd_tris = np.reshape(bnd_tris, (-1, 1)).astype(np.float64)
+
+    if showfig or savefig:
+        import matplotlib.pyplot as plt
+        fig = plt.figure()
+
+        plt.plot(bnd_points[:,0], bnd_points[:,1],'k-')
+        plt.quiver(bnd_points[:,0], bnd_points[:,1],
+                   normals[:,0], normals[:,1])
+        if savefig:
+            plt.savefig(savefig + "_normals.png", dpi=300)
+
+        if showfig:
+            plt.show()
+        plt.close(fig)
+
+    return {'normals': normals,
+            'tris': bnd_tris,
+            'surface_normals': surface_normals,
+            'points': bnd_points}
+
+
+def intersect(normals, points, bbox, showfig=False, savefig=False):
+    """
+    Compute the intersection point between line defined by the normal, and
+    bounding box.
+    """
+
+    intersected_points = 0 * normals
+
+    # Bounding box indices
+    # 0: bottom left,
+    # 1: bottom right,
+    # 2: top right,
+    # 3: top left coordinate.
+
+    i = 0
+    for ni, pi in zip(normals, points):
+        # Upper right quadrant
+        xb = bbox[2][0]
+        yb = bbox[2][1]
+        # Check top
+        if ni[1] > 0:
+            t = (yb - pi[1]) / ni[1]
+            x0 = pi[0] + ni[0] * t
+            if (x0 <= xb and x0 >= 0):
+                z0 = pi[2] + ni[2] * t
+                intersected_points[i, :] = [x0, yb, z0]
+        # Check right
+        if ni[0] > 0:
+            t = (xb - pi[0]) / ni[0]
+            y0 = pi[1] + ni[1] * t
+            if (y0 <= yb and y0 >= 0):
+                z0 = pi[2] + ni[2] * t
+                intersected_points[i, :] = [xb, y0, z0]
+
+        # Upper left quadrant
+        xb = bbox[3][0]
+        yb = bbox[3][1]
+        # Check top
+        if ni[1] > 0:
+            t = (yb - pi[1]) / ni[1]
+            x0 = pi[0] + ni[0] * t
+            if (x0 >= xb and x0 <= 0):
+                z0 = pi[2] + ni[2] * t
+                intersected_points[i, :] = [x0, yb, z0]
+        # Check left
+        if ni[0] < 0:
+            t = (xb - pi[0]) / ni[0]
+            y0 = pi[1] + ni[1] * t
+            if (y0 <= yb and y0 >= 0):
+                z0 = pi[2] + ni[2] * t
+                intersected_points[i, :] = [xb, y0, z0]
+
+        # Bottom right quadrant
+        xb = bbox[1][0]
+        yb = bbox[1][1]
+        # Check bottom
+        if ni[1] < 0:
+            t = (yb - pi[1]) / ni[1]
+            x0 = pi[0] + ni[0] * t
+            if (x0 <= xb and x0 >= 0):
+                z0 = pi[2] + ni[2] * t
+                intersected_points[i, :] = [x0, yb, z0]
+        # Check right
+        if ni[0] > 0:
+            t = (xb - pi[0]) / ni[0]
+            y0 = pi[1] + ni[1] * t
+            if (y0 >= yb and y0 <= 0):
+                z0 = pi[2] + ni[2] * t
+                intersected_points[i, :] = [xb, y0, z0]
+
+        # Bottom left quadrant
+        xb = bbox[0][0]
+        yb = bbox[0][1]
+        # Check bottom
+        if ni[1] < 0:
+            t = (yb - pi[1]) / ni[1]
+            x0 = pi[0] + ni[0] * t
+            if (x0 >= xb and x0 <= 0):
+                z0 = pi[2] + ni[2] * t
+                intersected_points[i, :] = [x0, yb, z0]
+        # Check left
+        if ni[0] < 0:
+            t = (xb - pi[0]) / ni[0]
+            y0 = pi[1] + ni[1] * t
+            if (y0 >= yb and y0 <= 0):
+                z0 = pi[2] + ni[2] * t
+                intersected_points[i, :] = [xb, y0, z0]
+
+        i += 1
+
+    if showfig or savefig:
+        import matplotlib.pyplot as plt
+        fig = plt.figure()
+        plt.plot(intersected_points[:,0], intersected_points[:,1], 'o')
+        plt.plot(points[:,0], points[:,1], 'ko-')
+        plt.legend(['bounding box points', 'boundary points'])
+        if savefig:
+            plt.savefig(savefig + "_intersect.png", dpi=300)
+        if showfig:
+            plt.show()
+        plt.close(fig)
+    return intersected_points
+
+
+def set_z_nearest_corners(points, bounding_box):
+    """
+    Set the z-value to the points at the bounding box corners to the z-value of
+    the nearest points.
+
+    """
+    corner_points = np.zeros((4, 3))
+
+    for i in range(4):
+        x0 = bounding_box[i][0]
+        y0 = bounding_box[i][1]
+        dist_idx = np.argmin((points[:, 0] - x0)**2 + (points[:, 1] - y0)**2)
+        corner_points[i,:] = [x0, y0, points[dist_idx, 2]]
+
+    return corner_points
+
+
+def plot_boundary(coords, tris, bnd_edges, savefig='', showfig=False):
+    if not savefig and not showfig:
+        return
+    import matplotlib.pyplot as plt
+    from mpl_toolkits.mplot3d import Axes3D
+    from . import plot
+
+    xyz, mu, std = fitting.normalize(coords[:,1:])
+
+    pt_ids = bnd_edges[:,0]
+    bnd_coords = xyz[pt_ids,:]
+    bnd_coords = triangulation.close_boundary(bnd_coords)
+
+    fig = plt.figure()
+    ax = fig.add_subplot(111, projection='3d')
+    plot.mesh(xyz, tris, ax=ax)
+    plot.points(bnd_coords, ax=ax, style='k-')
+    if savefig:
+        plt.savefig(savefig)
+    if showfig:
+        plt.show()
+    plt.close(fig)
+
+
+def plot_projection(bnd_xyz, bnd_xy, basis, savefig='', showfig=False):
+    if not savefig and not showfig:
+        return
+    import matplotlib.pyplot as plt
+    from mpl_toolkits.mplot3d import Axes3D
+    from . import plot
+    fig = plt.figure()
+    ax = fig.add_subplot(111, projection='3d')
+    plot.points(bnd_xyz, ax)
+    plot.points(bnd_xyz, ax, 'k')
+    plot.points(bnd_xy, ax, 'b-')
+    plot.basis(basis, ax)
+    if savefig:
+        plt.savefig(savefig)
+    if showfig:
+        plt.show()
+    plt.close(fig)
+
+
+def plot_rotation(bnd_xy, rxy, savefig='', showfig=False):
+    if not savefig and not showfig:
+        return
+    import matplotlib.pyplot as plt
+    from . import plot
+    fig = plt.figure()
+    plt.plot(bnd_xy[:,0], bnd_xy[:,1], 'bo')
+    plt.plot(rxy[:,0], rxy[:,1], 'ro')
+    bbox = fitting.bbox2(bnd_xy)
+    plot.points2(triangulation.close_boundary(bbox),'b')
+    bbox = fitting.bbox2(rxy)
+    plot.points2(triangulation.close_boundary(bbox),'r')
+    plt.legend(['Before rotation', 'After rotation'])
+
+    if savefig:
+        plt.savefig(savefig)
+    if showfig:
+        plt.show()
+    plt.close(fig)
+
+
+def plot_segments(corners, points, boundaries, savefig='', showfig=False):
+    if not savefig or not showfig:
+        return
+
+    import matplotlib.pyplot as plt
+    from . import plot
+
+    fig = plt.figure()
+    plot.points2(corners,'ko')
+    for bnd in boundaries:
+        ids = bnd['ids']
+        plt.plot(points[ids, 0], points[ids, 1])
+
+    if savefig:
+        plt.savefig(savefig)
+    if showfig:
+        plt.show()
+    plt.close(fig)
+
+
+def plot_curve(curve, savefig="", showfig=0, npts=100, color=0):
+    if not savefig and not showfig:
+        return
+    import matplotlib.pyplot as plt
+    cx, cy, cz = evalcurve3(curve, npts)
+
+    fig = plt.figure()
+    plt.plot(cx,cy,'C%d-'%color)
+    plt.plot(curve.Px, curve.Py, 'C%do-'%color, alpha=0.3)
+
+    if savefig:
+        plt.savefig(savefig)
+
+    if showfig:
+        plt.show()
+    plt.close(fig)
@@ -60,6 +60,8 @@ def mesh(points, triangles, ax=None):
     if not ax:
         fig = plt.figure()
         ax = fig.gca(projection='3d')
+    else:
+        fig = ax.get_figure()
     
     ax.plot_trisurf(points[:,0], points[:,1], points[:,2], triangles=triangles,
                     shade=False)
@@ -0,0 +1,429 @@
+"""
+Module for storing the state of a part between the stages of the fitting
+pipeline.
+
+The state is stored in a directory that contains one `.npy` file per array and
+a JSON manifest (`manifest.json`) that describes how to rebuild the fields of
+the state (arrays, numbers, strings, lists, dictionaries, and BSpline curves,
+surfaces and meshes) from these files. Only the coordinates and triangles of a
+mesh are stored; its cached data is computed again when it is needed. Arrays are read using memory mapping, so
+that only the arrays that a stage accesses are read from disk, and they are
+read-only.
+
+An array that was read from another state and has not been replaced is not
+written again. Instead, the manifest refers to the file in the other state.
+Each stage therefore only writes the arrays that it adds. A state can no longer
+be read if a state that it refers to has been removed or overwritten.
+
+Example:
+
+    data = state.read('pydata/projection_1')
+    data.theta = 0.5
+    state.write('pydata/rotation_1', data)
+
+"""
+import abc
+import os
+import numpy as np
+
+manifest_name = 'manifest.json'
+format_name = 'splinefit-state'
+format_version = 1
+_mesh_fields = ['_coords', '_tris']
+
+
+def is_state(path):
+    """
+    Check if a path is a stored state.
+
+    """
+    return os.path.isfile(os.path.join(path, manifest_name))
+
+
+def write(path, data, links=None, root=None):
+    """
+    Write a state to a directory. An existing state at `path` is replaced.
+
+    Arguments:
+        path : Directory to write.
+        data : State (`splinefit.utils.Struct` or dict).
+        links(optional) : Dictionary that maps the directory of a state to the
+            directory of another state with the same content. References to
+            the arrays of the first state are replaced by references to the
+            second state.
+        root(optional) : Only refer to the arrays of states in this
+            directory. Other arrays are copied. Defaults to referring to any
+            state.
+
+    """
+    import json
+    import shutil
+    import uuid
+
+    path = os.path.abspath(path)
+    links = {os.path.abspath(k) : os.path.abspath(v)
+             for k, v in (links or {}).items()}
+    if root is not None:
+        root = os.path.abspath(root)
+
+    tmp = '%s.tmp-%d-%s' % (path, os.getpid(), uuid.uuid4().hex[:8])
+    os.makedirs(tmp)
+    try:
+        writer = _Writer(tmp, path, links, root)
+        fields = {name : writer.encode(value, name)
+                  for name, value in _items(data)}
+        manifest = {'format' : format_name,
+                    'version' : format_version,
+                    'id' : uuid.uuid4().hex,
+                    'fields' : fields,
+                    'references' : writer.references}
+        with open(os.path.join(tmp, manifest_name), 'w') as fh:
+            json.dump(manifest, fh)
+        _replace(tmp, path)
+    except BaseException:
+        shutil.rmtree(tmp, ignore_errors=True)
+        raise
+
+
+def read(path, fields=None, mmap_mode='r'):
+    """
+    Read a state from a directory.
+
+    Arguments:
+        path : Directory to read.
+        fields(optional) : List of the names of the fields to read. Defaults
+            to all fields.
+        mmap_mode(optional) : Memory mapping mode passed to `numpy.load`. Pass
+            `None` to read all arrays into memory.
+
+    Returns:
+        The state (`splinefit.utils.Struct`).
+
+    """
+    from . import utils
+    path = os.path.abspath(path)
+    manifest = _manifest(path)
+    _check_references(path, manifest)
+    items = manifest['fields'].items()
+    if fields is not None:
+        missing = [name for name in fields if name not in manifest['fields']]
+        if missing:
+            raise KeyError('Fields not found in %s: %s' % (path,
+                                                           ', '.join(missing)))
+        items = [(name, value) for name, value in items if name in fields]
+    return utils.Struct({name : _decode(value, path, mmap_mode)
+                         for name, value in items})
+
+
+def remove(path):
+    """
+    Remove a stored state.
+
+    """
+    import shutil
+    if not is_state(path):
+        raise ValueError('Not a stored state: %s' % path)
+    shutil.rmtree(path)
+
+
+def size(path):
+    """
+    Total size of the arrays of a state in bytes, including the arrays that it
+    refers to.
+
+    """
+    sizes = []
+    _arrays(_manifest(os.path.abspath(path))['fields'], sizes)
+    return sum([int(np.prod(shape)) * np.dtype(dtype).itemsize
+                for shape, dtype in sizes])
+
+
+def references(path):
+    """
+    Directories of the states that a state refers to.
+
+    Returns:
+        Dictionary that maps each directory to the ID of the state that is
+        expected to be found there.
+
+    """
+    path = os.path.abspath(path)
+    return {os.path.normpath(os.path.join(path, ref)) : ref_id
+            for ref, ref_id in _manifest(path)['references'].items()}
+
+
+def is_valid(path):
+    """
+    Check that a state exists and that all states that it refers to exist and
+    have not been overwritten.
+
+    """
+    try:
+        path = os.path.abspath(path)
+        _check_references(path, _manifest(path))
+    except (OSError, ValueError):
+        return False
+    return True
+
+
+def digest(data):
+    """
+    Hash the content of a state.
+
+    Returns:
+        Hexadecimal string.
+
+    """
+    import hashlib
+    import json
+    h = hashlib.sha256()
+    hasher = _Hasher(h)
+    fields = {name : hasher.encode(value, name) for name, value in _items(data)}
+    h.update(json.dumps(fields, sort_keys=True).encode())
+    return h.hexdigest()
+
+
+def _classes():
+    """
+    Classes of the objects that can be stored, by name.
+
+    """
+    from . import bspline
+    from . import triangulation
+    from . import utils
+    return {'Struct' : utils.Struct,
+            'Curve' : bspline.Curve,
+            'Surface' : bspline.Surface,
+            'Mesh' : triangulation.Mesh}
+
+
+def _items(data):
+    """
+    Fields of a state. The fields of an unpickled `splinefit.utils.Struct` are
+    stored both as items and as attributes.
+
+    """
+    if isinstance(data, dict):
+        return sorted(dict(data, **getattr(data, '__dict__', {})).items())
+    return sorted(vars(data).items())
+
+
+class _Encoder(abc.ABC):
+    """
+    Convert a state to a JSON compatible description. Arrays are handled by
+    `array`.
+
+    """
+
+    def __init__(self):
+        self.classes = {cls : name for name, cls in _classes().items()}
+
+    def encode(self, value, name):
+        if isinstance(value, np.ndarray):
+            if value.dtype.hasobject:
+                raise TypeError('Cannot store object array: %s' % name)
+            return self.array(value, name)
+        if isinstance(value, np.generic):
+            value = value.item()
+        if value is None or isinstance(value, (bool, int, float, str)):
+            return {'type' : 'value', 'value' : value}
+        if isinstance(value, (list, tuple)):
+            kind = 'tuple' if isinstance(value, tuple) else 'list'
+            items = [self.encode(item, '%s.%d' % (name, i))
+                     for i, item in enumerate(value)]
+            if all([item['type'] == 'value' for item in items]):
+                # Store a list of numbers or strings compactly
+                return {'type' : kind,
+                        'values' : [item['value'] for item in items]}
+            return {'type' : kind, 'items' : items}
+        if type(value) in self.classes or type(value) is dict:
+            cls = self.classes.get(type(value), 'dict')
+            items = _items(value)
+            if cls == 'Mesh':
+                # Leave out the cached data
+                items = [(k, v) for k, v in items if k in _mesh_fields]
+            return {'type' : cls,
+                    'fields' : {str(k) : self.encode(v, '%s.%s' % (name, k))
+                                for k, v in items}}
+        raise TypeError('Cannot store field %s of type: %s' %
+                        (name, type(value).__name__))
+
+    @abc.abstractmethod
+    def array(self, value, name):
+        """
+        Encode an array.
+
+        """
+
+
+class _Writer(_Encoder):
+
+    def __init__(self, tmp, path, links, root):
+        _Encoder.__init__(self)
+        self.tmp = tmp
+        self.path = path
+        self.links = links
+        self.root = root
+        self.references = {}
+        self.ids = {}
+
+    def array(self, value, name):
+        out = {'type' : 'array', 'shape' : list(value.shape),
+               'dtype' : value.dtype.str}
+        source = _source(value)
+        if source:
+            container, filename = os.path.split(source)
+            container = self.links.get(container, container)
+            if (container != self.path and self.allowed(container) and
+                os.path.isfile(os.path.join(container, filename))):
+                ref = os.path.relpath(container, self.path)
+                self.references[ref] = self.ids[container]
+                out.update({'container' : ref, 'file' : filename})
+                return out
+
+        filename = _filename(name)
+        np.save(os.path.join(self.tmp, filename), value, allow_pickle=False)
+        out['file'] = filename
+        return out
+
+    def allowed(self, container):
+        if self.root is not None and \
+           os.path.dirname(container) != self.root and \
+           not container.startswith(self.root + os.sep):
+            return False
+        if container not in self.ids:
+            try:
+                self.ids[container] = _manifest(container)['id']
+            except (OSError, ValueError):
+                self.ids[container] = None
+        return self.ids[container] is not None
+
+
+class _Hasher(_Encoder):
+
+    def __init__(self, h):
+        _Encoder.__init__(self)
+        self.h = h
+
+    def array(self, value, name):
+        self.h.update(np.ascontiguousarray(value).tobytes())
+        return {'type' : 'array', 'shape' : list(value.shape),
+                'dtype' : value.dtype.str}
+
+
+def _decode(value, path, mmap_mode):
+    kind = value['type']
+    if kind == 'value':
+        return value['value']
+    if kind == 'array':
+        filename = os.path.join(path, value.get('container', ''),
+                                value['file'])
+        return np.load(filename, mmap_mode=mmap_mode, allow_pickle=False)
+    if kind in ['list', 'tuple']:
+        if 'values' in value:
+            items = value['values']
+        else:
+            items = [_decode(item, path, mmap_mode) for item in value['items']]
+        return tuple(items) if kind == 'tuple' else items
+    fields = {k : _decode(v, path, mmap_mode)
+              for k, v in value['fields'].items()}
+    if kind == 'dict':
+        return fields
+    cls = _classes()[kind]
+    if kind == 'Struct':
+        return cls(fields)
+    # Restore the attributes without calling the constructor
+    obj = cls.__new__(cls)
+    obj.__dict__.update(fields)
+    if kind == 'Mesh':
+        obj.invalidate()
+    return obj
+
+
+def _arrays(value, out):
+    """
+    Collect the shape and data type of all arrays in an encoded field.
+
+    """
+    if isinstance(value, dict) and 'type' not in value:
+        for v in value.values():
+            _arrays(v, out)
+    elif value['type'] == 'array':
+        out.append((value['shape'], value['dtype']))
+    elif value['type'] in ['list', 'tuple']:
+        for item in value.get('items', []):
+            _arrays(item, out)
+    elif value['type'] != 'value':
+        _arrays(value['fields'], out)
+
+
+def _manifest(path):
+    import json
+    with open(os.path.join(path, manifest_name)) as fh:
+        manifest = json.load(fh)
+    if manifest.get('format', '') != format_name:
+        raise ValueError('Not a stored state: %s' % path)
+    if manifest['version'] > format_version:
+        raise ValueError('Unsupported state version %d: %s' %
+                         (manifest['version'], path))
+    return manifest
+
+
+def _check_references(path, manifest):
+    for ref, ref_id in manifest['references'].items():
+        container = os.path.normpath(os.path.join(path, ref))
+        try:
+            found = _manifest(container)['id']
+        except OSError:
+            raise ValueError('State %s refers to %s, which does not exist' %
+                             (path, container))
+        if found != ref_id:
+            raise ValueError('State %s refers to %s, which has been '
+                             'overwritten. Rerun the stages that follow it.' %
+                             (path, container))
+
+
+def _source(array):
+    """
+    Return the name of the `.npy` file that an array has been memory mapped
+    from, or an empty string if the array is not the entire content of such a
+    file.
+
+    """
+    base = array
+    while isinstance(base, np.ndarray):
+        if isinstance(base, np.memmap) and \
+           not isinstance(base.base, np.ndarray):
+            break
+        base = base.base
+    if not isinstance(base, np.memmap) or not base.filename or \
+       not base.filename.endswith('.npy'):
+        return ''
+    same = (array.shape == base.shape and array.dtype == base.dtype and
+            array.strides == base.strides and
+            array.__array_interface__['data'][0] ==
+            base.__array_interface__['data'][0])
+    return os.path.abspath(base.filename) if same else ''
+
+
+def _filename(name):
+    import re
+    return re.sub(r'[^A-Za-z0-9_.-]', '_', name) + '.npy'
+
+
+def _replace(tmp, path):
+    """
+    Move a directory into place, replacing an existing state.
+
+    """
+    import shutil
+    if os.path.exists(path):
+        if not is_state(path) and os.listdir(path):
+            raise ValueError('Cannot replace %s, which is not a stored state' %
+                             path)
+        trash = tmp + '.old'
+        os.rename(path, trash)
+        os.rename(tmp, path)
+        shutil.rmtree(trash, ignore_errors=True)
+    else:
+        os.rename(tmp, path)
@@ -179,3 +179,17 @@ def test_bspline_surface():
     plt.legend()
     
 
+
+def test_surface_tsurf(tmp_path):
+    from splinefit import tsurf
+    pu = 2
+    pv = 2
+    U = sf.bspline.uniformknots(1, pu)
+    V = sf.bspline.uniformknots(2, pv)
+    Px, Py = np.meshgrid(np.linspace(0, 1, 4), np.linspace(0, 1, 5))
+    S = sf.bspline.Surface(U, V, pu, pv, Px, Py, 0 * Px)
+    filename = str(tmp_path / 'surface.ts')
+    S.tsurf(filename, nu=5, nv=6)
+    p, t = tsurf.read(filename)
+    assert p[0].shape == (30, 4)
+    assert t[0].shape == (2 * 4 * 5, 3)
@@ -0,0 +1,48 @@
+import splinefit as sf
+import numpy as np
+import os
+
+
+def test_key():
+    assert sf.cache.key('a', {'x' : 1, 'y' : 2}) == \
+           sf.cache.key('a', {'y' : 2, 'x' : 1})
+    assert sf.cache.key('a', 'b') != sf.cache.key('ab')
+    assert sf.cache.key(1) != sf.cache.key('1')
+
+
+def test_cache(tmp_path):
+    cache = sf.cache.Cache(str(tmp_path / 'cache'), max_size=10**6)
+    assert cache.get('a') is None
+    cache.put('a', {'x' : 1, 'y' : np.arange(3)})
+    data = cache.get('a')
+    assert data.x == 1
+    assert np.array_equal(data.y, np.arange(3))
+    assert cache.lookup('a') == cache.filename('a')
+
+    # Arrays that are already in the cache are not stored again
+    data.z = np.ones(2)
+    cache.put('b', data)
+    assert sorted(os.listdir(cache.filename('b'))) == ['manifest.json',
+                                                       'z.npy']
+    assert np.array_equal(cache.get('b').y, np.arange(3))
+
+    # Results that refer to a removed result are invalid
+    cache.evict(cache.size() - 1)
+    assert cache.get('a') is None
+    assert cache.get('b') is None
+
+
+def test_evict(tmp_path):
+    cache = sf.cache.Cache(str(tmp_path), max_size=10**6)
+    for k, name in enumerate('abc'):
+        cache.put(name, {'x' : np.zeros(1000)})
+        os.utime(os.path.join(cache.filename(name), sf.state.manifest_name),
+                 (k, k))
+    # Using 'a' makes 'b' the least recently used result
+    cache.get('a')
+    size = cache.size() // 3
+    assert cache.evict(2 * size) == 1
+    assert [cache.lookup(name) is None for name in 'abc'] == \
+           [False, True, False]
+    assert cache.clear() == 2
+    assert cache.size() == 0
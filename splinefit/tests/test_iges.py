@@ -0,0 +1,182 @@
+import splinefit as sf
+import numpy as np
+import pytest
+
+
+def params(filename, pointer):
+    """
+    Read the parameter data of the entity at a directory entry pointer.
+
+    """
+    lines = open(filename).read().splitlines()
+    data = [line[:64] for line in lines
+            if line[72] == 'P' and int(line[64:72]) == pointer]
+    return ''.join(data).rstrip(' ;').split(',')
+
+
+def test_writer(tmp_path):
+    filename = str(tmp_path / 'test.igs')
+    pu = pv = 2
+    nu, nv = 5, 4
+    U = sf.bspline.uniformknots(nu - pu - 1, pu)
+    V = sf.bspline.uniformknots(nv - pv - 1, pv)
+    X, Y = np.meshgrid(np.linspace(0, 1, nu), np.linspace(0, 2, nv))
+    Z = 0.1 * X * Y + 1e-20
+    Cx = np.linspace(0, 1, 4)
+    Uc = sf.bspline.uniformknots(1, 2)
+
+    with sf.iges.Writer(filename) as igs:
+        s = igs.surface(X, Y, Z, U, V, pu, pv, label='fault')
+        c = igs.curve(Cx, 0 * Cx, 0 * Cx, Uc, 2)
+        b = igs.boundary(s, [c])
+        bs = igs.bounded_surface(s, [b])
+    assert (s, c, b, bs) == (1, 3, 5, 7)
+
+    lines = open(filename).read().splitlines()
+    assert all([len(line) == 80 for line in lines])
+    sections = [line[72] for line in lines]
+    assert ''.join(sections) == ''.join(sorted(sections, key='SGDPT'.index))
+    term = lines[-1]
+    assert int(term[1:8]) == sections.count('S')
+    assert int(term[17:24]) == sections.count('D') == 8
+    assert int(term[25:32]) == sections.count('P')
+
+    p = params(filename, s)
+    assert p[:10] == ['128', '4', '3', '2', '2', '0', '0', '1', '0', '0']
+    k = 10 + len(U) + len(V) + nu * nv
+    P = np.array(p[k:k + 3 * nu * nv], dtype=np.float64).reshape(-1, 3)
+    assert np.array_equal(P[:,0], X.ravel())
+    assert np.array_equal(P[:,2], Z.ravel())
+    assert params(filename, b) == ['141', '0', '1', '1', '1', '3', '1', '0']
+    assert params(filename, bs) == ['143', '0', '1', '1', '5']
+
+    # Only the bounded surface is independent
+    status = [line[64:72] for line in lines if line[72] == 'D'][::2]
+    assert status == ['00010000'] * 3 + ['00000000']
+
+
+def test_writer_errors(tmp_path):
+    filename = str(tmp_path / 'test.igs')
+    U = sf.bspline.uniformknots(1, 2)
+    with pytest.raises(ValueError):
+        with sf.iges.Writer(filename) as igs:
+            igs.curve(np.zeros(4), np.zeros(4), np.zeros(4), U[1:], 2)
+    with pytest.raises(ValueError):
+        with sf.iges.Writer(filename) as igs:
+            igs.boundary(1, [])
+    import os
+    assert not os.path.exists(filename)
+
+
+def test_wrap():
+    params = ','.join(['1.0000000000001'] * 20) + ';'
+    lines = sf.iges._wrap(params, 64)
+    assert ''.join(lines) == params
+    assert all([len(line) <= 64 for line in lines])
+    assert all([line[-1] in ',;' for line in lines])
+
+
+def test_read(tmp_path):
+    filename = str(tmp_path / 'test.igs')
+    pu, pv = 3, 2
+    nu, nv = 6, 4
+    U = sf.bspline.uniformknots(nu - pu - 1, pu)
+    V = sf.bspline.uniformknots(nv - pv - 1, pv)
+    X, Y = np.meshgrid(np.linspace(0, 1e5, nu), np.linspace(0, 2e4, nv))
+    Z = np.sin(X) / 3
+    S = sf.bspline.Surface(U, V, pu, pv, X, Y, Z, label='fault')
+    t = np.linspace(0, 1, 4)
+    Uc = sf.bspline.uniformknots(1, 2)
+    C = sf.bspline.Curve(Uc, 2, 1e5 * t, 0 * t, t / 7)
+
+    with sf.iges.Writer(filename) as igs:
+        sf.iges.write_surface(igs, S, [C])
+        igs.surface(X, Y, Z, U, V, pu, pv, level=3)
+
+    data = sf.iges.read(filename)
+    assert len(data) == 2
+    assert data[0].label == 'fault'
+    assert data[1].level == 3
+    assert data[1].bspline_curves == []
+    surface = data[0].bspline_surface
+    assert (surface.pu, surface.pv) == (pu, pv)
+    assert np.array_equal(surface.U, U)
+    assert np.array_equal(surface.V, V)
+    assert np.array_equal(surface.Px, X)
+    assert np.array_equal(surface.Pz, Z)
+    curve = data[0].bspline_curves[0]
+    assert curve.p == 2
+    assert np.array_equal(curve.U, Uc)
+    assert np.array_equal(curve.Pz, C.Pz)
+
+
+def test_entities(tmp_path):
+    filename = str(tmp_path / 'test.igs')
+    Uc = sf.bspline.uniformknots(1, 2)
+    with sf.iges.Writer(filename) as igs:
+        igs.curve(np.arange(4.0), np.zeros(4), np.zeros(4), Uc, 2)
+
+    # Double precision exponents and defaulted parameters
+    text = open(filename).read()
+    text = text.replace('126,3,2,0,0,1,0,', '126,3,2, ,0,1,0,')
+    text = text.replace(',3.0,0.0,0.0,', ',3D0,0.0,0.0,')
+    open(filename, 'w').write(text)
+
+    ents = sf.iges.entities(filename)
+    assert list(ents.keys()) == [1]
+    assert ents[1].type == 126
+    params = ents[1].params
+    assert params.shape[0] == 6 + 7 + 4 + 12 + 2
+    assert params[2] == 0
+    assert np.array_equal(params[17:29:3], np.arange(4.0))
+
+
+def test_read_sense(tmp_path):
+    filename = str(tmp_path / 'test.igs')
+    U = sf.bspline.uniformknots(0, 1)
+    X, Y = np.meshgrid(np.linspace(0, 1, 2), np.linspace(0, 1, 2))
+    Uc = np.array([0, 0, 0, 0.25, 1, 1, 1])
+    Cx = np.array([0, 0.1, 0.5, 1])
+    with sf.iges.Writer(filename) as igs:
+        s = igs.surface(X, Y, 0 * X, U, U, 1, 1)
+        c = igs.curve(Cx, 0 * Cx, 0 * Cx, Uc, 2)
+        b = igs.boundary(s, [c])
+        igs.bounded_surface(s, [b])
+
+    text = open(filename).read().replace('141,0,1,1,1,3,1,0;',
+                                         '141,0,1,1,1,3,2,0;')
+    open(filename, 'w').write(text)
+    curve = sf.iges.read(filename)[0].bspline_curves[0]
+    assert np.array_equal(curve.Px, Cx[::-1])
+    assert np.allclose(curve.U, [0, 0, 0, 0.75, 1, 1, 1])
+
+
+def test_write_assembly(tmp_path):
+    import pickle
+    filename = str(tmp_path / 'test.igs')
+    U = sf.bspline.uniformknots(1, 2)
+    X, Y = np.meshgrid(np.linspace(0, 1, 4), np.linspace(0, 1, 4))
+    t = np.linspace(0, 1, 4)
+    parts = []
+    for k in range(3):
+        S = sf.bspline.Surface(U, U, 2, 2, X, Y, k + 0 * X)
+        C = sf.bspline.Curve(U, 2, t, 0 * t, k + 0 * t)
+        parts.append(sf.utils.Struct({'bspline_surface' : S,
+                                      'bspline_curves' : [C, C]}))
+    pickle.dump(parts[2], open(str(tmp_path / 'part.p'), 'wb'))
+    parts[2] = str(tmp_path / 'part.p')
+
+    pointers = sf.iges.write_assembly(filename, parts, levels=[1, 2, 3],
+                                      labels=['a', 'b', 'c'], processes=2)
+    assert pointers == [9, 19, 29]
+
+    data = sf.iges.read(filename)
+    assert [d.label for d in data] == ['a', 'b', 'c']
+    assert [d.level for d in data] == [1, 2, 3]
+    for k, d in enumerate(data):
+        assert np.all(d.bspline_surface.Pz == k)
+        assert len(d.bspline_curves) == 2
+        assert np.all(d.bspline_curves[1].Pz == k)
+
+    with pytest.raises(ValueError):
+        sf.iges.write_assembly(filename, parts, levels=[1])
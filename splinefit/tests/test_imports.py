@@ -0,0 +1,47 @@
+import os
+import pytest
+import subprocess
+import sys
+
+heavy = ['numpy', 'scipy', 'matplotlib', 'pyiges']
+
+
+def loaded_after(code):
+    """
+    Run `code` in a new interpreter and return the heavy modules that have
+    been imported.
+
+    """
+    script = ('import sys\n'
+              '%s\n'
+              'print(" ".join([m for m in %r if m in sys.modules]))\n' %
+              (code, heavy))
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path))
+    out = subprocess.check_output([sys.executable, '-c', script], env=env,
+                                  universal_newlines=True).splitlines()
+    return out[-1].split()
+
+
+def test_import_budget():
+    modules = loaded_after('import splinefit')
+    assert modules == []
+
+    modules = loaded_after('import splinefit as sf\n'
+                           'sf.options.get_options(["sfproj"])\n'
+                           'sf.utils.Struct()')
+    assert modules == []
+
+
+def test_deferred_imports():
+    modules = loaded_after('import splinefit as sf\n'
+                           'sf.pipeline, sf.iges, sf.plot, sf.state, '
+                           'sf.cache, sf.bspline, sf.triangulation')
+    assert modules == ['numpy']
+
+
+def test_lazy_attributes():
+    import splinefit as sf
+    assert 'pipeline' in dir(sf)
+    assert sf.pipeline.stages[0] == 'boundary'
+    with pytest.raises(AttributeError):
+        sf.missing
@@ -28,22 +28,155 @@ def test_elements():
     elems = msh.elements(txt)
 
     # 1 15 2 0 5 1
-    assert elems[0][0] == 1
-    assert elems[0][1] == 15
-    assert elems[0][2] == 2
-    assert elems[0][3] == 0
-    assert elems[0][4] == 5
-    assert elems[0][5] == 1
+    assert elems.ids[15][0] == 1
+    assert elems.tags[15].shape[1] == 2
+    assert elems.tags[15][0][0] == 0
+    assert elems.tags[15][0][1] == 5
+    assert elems[15][0][0] == 1
 
 def test_get_data():
     txt = load()
     elems = msh.elements(txt)
+    # Last three fields of the first element row: 1 15 2 0 5 1
+    data = msh.get_data(elems.rows(15), num_members=3, index=1)
+    assert data.shape[1] == 3
+    assert data[0][0] == 0
+    assert data[0][1] == 5
+    assert data[0][2] == 1
+
     tris = msh.get_data(elems, num_members=3, index=1)
     assert tris.shape[1] == 3
-    assert tris[0][0] == 0
-    assert tris[0][1] == 5
-    assert tris[0][2] == 1
+    assert np.all(tris == msh.get_data(elems.rows(2), num_members=3, index=1))
+    assert np.shares_memory(tris, elems[2])
+
+
+
+
+
+_msh22 = """$MeshFormat
+2.2 0 8
+$EndMeshFormat
+$Nodes
+3
+1 0.0 0.0 0.0
+2 1.0 0.0 0.5
+3 0.0 1.0 0.25
+$EndNodes
+$Elements
+3
+1 1 2 0 1 1 2
+2 2 2 0 4 1 2 3
+3 15 2 0 1 3
+$EndElements
+"""
+
+_msh41 = """$MeshFormat
+4.1 0 8
+$EndMeshFormat
+$Nodes
+2 4 1 4
+2 1 0 3
+1
+2
+3
+0 0 0
+1 0 0
+1 1 0
+2 1 1 1
+4
+0 1 0 0.5 0.5
+$EndNodes
+$Elements
+2 3 1 3
+2 1 2 2
+1 1 2 3
+2 1 3 4
+1 1 1 1
+3 1 2
+$EndElements
+"""
+
+def test_elements_mixed():
+    elems = msh.elements(_msh22)
+    assert sorted(elems.keys()) == [1, 2, 15]
+    assert elems[2].dtype == np.int64
+    assert np.all(np.equal(elems[2], [[1, 2, 3]]))
+    assert np.all(np.equal(elems.ids[2], [2]))
+    assert np.all(np.equal(elems.tags[2], [[0, 4]]))
+    assert np.all(np.equal(elems.rows(15), [[3, 15, 2, 0, 1, 3]]))
+    assert elems.num_elements() == 3
+
+    nodes = msh.nodes(_msh22)
+    assert nodes.shape == (3, 4)
+    assert nodes[1][3] == 0.5
+
+    lines = msh.get_data(elems, num_members=2, index=1)
+    assert np.all(np.equal(lines, [[1, 2]]))
+    tris = msh.get_data(elems, num_members=3)
+    assert np.all(np.equal(tris, [[0, 1, 2]]))
+
+def test_get_data_type():
+    # A second-order line (type 8) also has three nodes
+    txt = _msh22.replace('$Elements\n3\n', '$Elements\n4\n')
+    txt = txt.replace('$EndElements', '4 8 2 0 1 1 3 2\n$EndElements')
+    elems = msh.elements(txt)
+    tris = msh.get_data(elems, num_members=3)
+    assert np.all(np.equal(tris, [[0, 1, 2]]))
+    lines = msh.get_data(elems, num_members=3, etype=8)
+    assert np.all(np.equal(lines, [[0, 2, 1]]))
+    data = msh.get_data(elems, num_members=3, etype=[2, 8])
+    assert data.shape == (2, 3)
+
+def test_read_41(tmp_path):
+    filename = str(tmp_path / 'test.msh')
+    with open(filename, 'w') as fh:
+        fh.write(_msh41)
 
+    n, e = msh.read(filename)
+    assert np.all(np.equal(n[:,0], [1, 2, 3, 4]))
+    assert np.all(np.equal(n[3,1:], [0, 1, 0]))
+    assert e.num_elements() == 3
+    assert np.all(np.equal(e.rows(2), [[1, 2, 2, 0, 1, 1, 2, 3],
+                                       [2, 2, 2, 0, 1, 1, 3, 4]]))
+    assert np.all(np.equal(e.rows(1), [[3, 1, 2, 0, 1, 1, 2]]))
 
+def test_write_binary(tmp_path):
+    n = np.array([[1, 0.1, 0.2, 0.3],
+                  [2, 1.0, 1.0 / 3, 0.0],
+                  [3, 0.0, 1.0, np.pi]])
+    e = [[1, 1, 2, 0, 1, 1, 2],
+         [2, 2, 2, 0, 4, 1, 2, 3],
+         [3, 2, 2, 0, 4, 3, 2, 1]]
+    for binary in [False, True]:
+        filename = str(tmp_path / ('test_%d.msh' % binary))
+        msh.write(filename, n, e, binary=binary)
+        n2, e2 = msh.read(filename)
+        assert np.all(np.equal(n2, n))
+        assert np.all(np.equal(e2.rows(1), [e[0]]))
+        assert np.all(np.equal(e2.rows(2), e[1:]))
 
+def test_read_binary_41(tmp_path):
+    # Binary version of `_msh41`
+    i4 = lambda *x: np.array(x, dtype='<i4').tobytes()
+    u8 = lambda *x: np.array(x, dtype='<u8').tobytes()
+    f8 = lambda *x: np.array(x, dtype='<f8').tobytes()
+    buf = b'$MeshFormat\n4.1 1 8\n' + i4(1) + b'\n$EndMeshFormat\n'
+    buf += b'$Nodes\n' + u8(2, 4, 1, 4)
+    buf += i4(2, 1, 0) + u8(3) + u8(1, 2, 3) + f8(0, 0, 0, 1, 0, 0, 1, 1, 0)
+    buf += i4(2, 1, 1) + u8(1) + u8(4) + f8(0, 1, 0, 0.5, 0.5)
+    buf += b'\n$EndNodes\n$Elements\n' + u8(2, 3, 1, 3)
+    buf += i4(2, 1, 2) + u8(2) + u8(1, 1, 2, 3, 2, 1, 3, 4)
+    buf += i4(1, 1, 1) + u8(1) + u8(3, 1, 2)
+    buf += b'\n$EndElements\n'
+    filename = str(tmp_path / 'binary.msh')
+    with open(filename, 'wb') as fh:
+        fh.write(buf)
+    ascii_filename = str(tmp_path / 'ascii.msh')
+    with open(ascii_filename, 'w') as fh:
+        fh.write(_msh41)
 
+    n, e = msh.read(filename)
+    n2, e2 = msh.read(ascii_filename)
+    assert np.all(np.equal(n, n2))
+    for etype in [1, 2]:
+        assert np.all(np.equal(e.rows(etype), e2.rows(etype)))
@@ -0,0 +1,68 @@
+import pytest
+import splinefit as sf
+import numpy as np
+
+def grid(n=4):
+    x, y = np.meshgrid(np.linspace(0, 1, n), np.linspace(0, 1, n))
+    points = np.vstack((x.flatten(), y.flatten(), 0*x.flatten())).T
+    tris = []
+    for j in range(n-1):
+        for i in range(n-1):
+            k = j*n + i
+            tris += [[k, k+1, k+n+1], [k, k+n+1, k+n]]
+    return points, np.array(tris).astype(np.int64)
+
+def test_signed_areas():
+    points, tris = grid(2)
+    areas = sf.orientation.signed_areas(tris, points)
+    assert np.all(np.isclose(areas, 0.5))
+    areas = sf.orientation.signed_areas(tris[:,::-1], points)
+    assert np.all(np.isclose(areas, -0.5))
+
+def test_adjacency():
+    points, tris = grid(2)
+    pairs, same, non_manifold = sf.orientation.adjacency(tris)
+    assert np.all(np.equal(pairs, [[0, 1]]))
+    assert not same[0]
+    assert non_manifold.shape[0] == 0
+
+    tris[1,:] = tris[1,::-1]
+    pairs, same, non_manifold = sf.orientation.adjacency(tris)
+    assert same[0]
+
+def test_orient():
+    points, tris = grid()
+    ans = np.copy(tris)
+    flipped = np.array([1, 4, 5, 12, 17])
+    tris[flipped,:] = tris[flipped,::-1]
+    tris, non_orientable = sf.orientation.orient(tris, points)
+    assert non_orientable.shape[0] == 0
+    assert np.all(sf.orientation.signed_areas(tris, points) > 0)
+    assert np.all(np.equal(np.sort(tris, axis=1), np.sort(ans, axis=1)))
+
+    # Clockwise orientation is reversed
+    tris, non_orientable = sf.orientation.orient(ans[:,::-1].copy(), points)
+    assert np.all(sf.orientation.signed_areas(tris, points) > 0)
+
+def test_orient_non_orientable():
+    # Mobius strip
+    n = 6
+    tris = []
+    for i in range(n):
+        a, b = 2*i, 2*i + 1
+        if i < n - 1:
+            c, d = 2*i + 2, 2*i + 3
+        else:
+            c, d = 1, 0
+        tris += [[a, b, d], [a, d, c]]
+    tris = np.array(tris)
+    with pytest.warns(UserWarning):
+        tris, non_orientable = sf.orientation.orient(tris)
+    assert np.all(np.equal(non_orientable, [0]))
+
+def test_boundary_orientation():
+    points, tris = grid(2)
+    bnd_edges = np.array([[0, 1], [1, 3], [3, 2], [2, 0]])
+    assert sf.orientation.boundary_orientation(tris, bnd_edges) == 1
+    assert sf.orientation.boundary_orientation(tris, bnd_edges[::-1,::-1]) \
+           == -1
@@ -0,0 +1,152 @@
+import splinefit as sf
+import numpy as np
+import os
+import pytest
+
+
+def write_mesh(filename, n):
+    x, y = np.meshgrid(np.linspace(0, 10, n), np.linspace(0, 5, n))
+    z = 0.3 * np.sin(x) + 0.2 * y
+    coords = np.vstack((np.arange(n * n), x.ravel(), y.ravel(), z.ravel())).T
+    a = (np.arange(n - 1)[:,None] * n + np.arange(n - 1)).ravel()
+    tris = np.vstack((np.vstack((a, a + 1, a + n + 1)).T,
+                      np.vstack((a, a + n + 1, a + n)).T))
+    elems = np.hstack((np.arange(1, tris.shape[0] + 1)[:,None],
+                       np.tile([2, 2, 0, 4], (tris.shape[0], 1)), tris))
+    sf.msh.write(filename, coords, elems)
+
+
+def test_run(tmp_path):
+    mesh = str(tmp_path / 'surface_1.msh')
+    write_mesh(mesh, 12)
+    config = {'input' : mesh,
+              'checkpoint' : str(tmp_path / '%s_1'),
+              'stop' : 'surface_fit',
+              'surface_fit' : {'fit' : 1}}
+    data = sf.pipeline.run(config)
+    S = data.bspline_surface
+    assert len(data.bspline_curves) == 4
+    for name in sf.pipeline.stages[:-1]:
+        assert (tmp_path / ('%s_1' % name)).exists()
+    # Each stage only stores the arrays that it adds
+    assert 'coords.npy' in os.listdir(str(tmp_path / 'boundary_1'))
+    assert 'coords.npy' not in os.listdir(str(tmp_path / 'rotation_1'))
+
+    # Resume from a checkpoint
+    config['start'] = 'boundary_fit'
+    config['stop'] = 'export_iges'
+    config['export_iges'] = {'filename' : str(tmp_path / 'surface_1.igs')}
+    data = sf.pipeline.run(config)
+    assert np.array_equal(data.bspline_surface.rwPz, S.rwPz)
+    out = sf.iges.read(str(tmp_path / 'surface_1.igs'))
+    assert np.array_equal(out[0].bspline_surface.Pz, S.rwPz)
+
+    with pytest.raises(ValueError):
+        sf.pipeline.run({'start' : 'rotation'})
+
+
+def test_run_skip(tmp_path):
+    mesh = str(tmp_path / 'surface_1.msh')
+    write_mesh(mesh, 3)
+    assert sf.pipeline.run({'input' : mesh}) is None
+
+
+def test_load(tmp_path):
+    import pickle
+    filename = str(tmp_path / 'data.p')
+    data = sf.utils.Struct()
+    data.a = 1
+    pickle.dump(data, open(filename, 'wb'))
+    data = pickle.load(open(filename, 'rb'))
+    data.b = 2
+    data['c'] = 3
+    pickle.dump(data, open(filename, 'wb'))
+
+    data = sf.pipeline.load(filename)
+    assert (data.a, data.b, data.c) == (1, 2, 3)
+    assert (data['a'], data['b'], data['c']) == (1, 2, 3)
+
+
+def test_run_many(tmp_path):
+    write_mesh(str(tmp_path / 'surface_1.msh'), 8)
+    write_mesh(str(tmp_path / 'surface_2.msh'), 3)
+    open(str(tmp_path / 'surface_3.msh'), 'w').write('garbage')
+    configs = [{'input' : str(tmp_path / ('surface_%d.msh' % i)),
+                'checkpoint' : str(tmp_path / ('%%s_%d' % i)),
+                'stop' : 'segmentation',
+                'log' : str(tmp_path / 'logs' / ('part_%d.log' % i))}
+               for i in range(1, 4)]
+    for processes in [1, 2]:
+        results = sf.pipeline.run_many(configs, processes=processes)
+        assert [r.status for r in results] == ['done', 'skipped', 'failed']
+        assert 'Traceback' in results[2].error
+        assert (tmp_path / 'segmentation_1').exists()
+        for i in range(1, 4):
+            assert (tmp_path / 'logs' / ('part_%d.log' % i)).exists()
+
+
+def test_run_cache(tmp_path, capsys):
+    mesh = str(tmp_path / 'surface_1.msh')
+    write_mesh(mesh, 8)
+    config = {'input' : mesh,
+              'checkpoint' : str(tmp_path / '%s_1'),
+              'stop' : 'surface_fit',
+              'cache' : str(tmp_path / 'cache')}
+    S = sf.pipeline.run(config).bspline_surface
+    assert 'Using cached' not in capsys.readouterr().out
+
+    # Only the surface fit depends on the changed option
+    config['surface_fit'] = {'fit' : 1}
+    data = sf.pipeline.run(config)
+    out = capsys.readouterr().out
+    for name in sf.pipeline.stages[:5]:
+        assert 'Using cached result of stage: %s' % name in out
+    assert 'stage: surface_fit' not in out
+    assert not np.array_equal(data.bspline_surface.Pz, S.Pz)
+
+    # Without checkpoints and from a given state
+    del config['checkpoint']
+    config['start'] = 'surface_fit'
+    for k in range(2):
+        state = sf.pipeline.load(str(tmp_path / 'boundary_fit_1'))
+        assert np.array_equal(sf.pipeline.run(config, state).bspline_surface.Pz,
+                              data.bspline_surface.Pz)
+    assert 'stage: surface_fit' in capsys.readouterr().out
+
+
+def test_compact():
+    # Two triangles that touch along a duplicated edge, and a third that is
+    # attached to the same edge
+    coords = np.array([[0, 0, 0, 0], [1, 1, 0, 0], [2, 0, 1, 0], [3, 0, 0, 0],
+                       [4, 1, 0, 0], [5, 1, 1, 0], [6, 0, 0, 0], [7, 1, 0, 0],
+                       [8, 0, -1, 0], [9, 5, 5, 5]], dtype=np.float64)
+    tris = np.array([[0, 1, 2], [3, 5, 4]])
+    out, new_tris, node_map = sf.pipeline.compact(coords, tris)
+    assert out.shape[0] == 6
+    assert node_map[9] == -1
+
+    out, new_tris, node_map = sf.pipeline.compact(coords, tris, 0.0)
+    assert out.shape[0] == 4
+    assert node_map[3] == node_map[0]
+
+    # Welding would attach three triangles to one edge
+    tris = np.array([[0, 1, 2], [3, 5, 4], [6, 7, 8]])
+    with pytest.warns(UserWarning):
+        out, new_tris, node_map = sf.pipeline.compact(coords, tris, 0.0)
+    assert out.shape[0] == 9
+
+
+def test_run_savefig(tmp_path):
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    mesh = str(tmp_path / 'surface_1.msh')
+    write_mesh(mesh, 12)
+    config = sf.pipeline.layout(mesh, str(tmp_path), 1)
+    config['stop'] = 'rotation'
+    os.makedirs(str(tmp_path / 'figures'))
+    sf.pipeline.run(config)
+    # Each stage draws on its own figure and closes it
+    assert plt.get_fignums() == []
+    for name in ['boundary', 'projection', 'rotation']:
+        assert (tmp_path / 'figures' / ('%s_1.png' % name)).exists()
@@ -0,0 +1,89 @@
+import splinefit as sf
+import numpy as np
+import os
+import pytest
+
+
+def make_state():
+    U = sf.bspline.uniformknots(1, 2)
+    X, Y = np.meshgrid(np.linspace(0, 1, 4), np.linspace(0, 1, 4))
+    data = sf.utils.Struct()
+    data.coords = np.random.rand(5, 3)
+    data.tris = np.array([[0, 1, 2], [1, 3, 2], [2, 3, 4]])
+    data.theta = np.float64(0.5)
+    data.ids = [1, 2, 3]
+    data.loops = [{'outer' : 1, 'loop' : np.arange(4)}]
+    data.pair = (np.zeros(2), 3)
+    data.curve = sf.bspline.Curve(U, 2, X[0], Y[0], X[0])
+    data.surface = sf.bspline.Surface(U, U, 2, 2, X, Y, X * Y, label='fault')
+    data.mesh = sf.triangulation.Mesh(data.coords, data.tris)
+    data.mesh.boundary_edges
+    data.label = None
+    return data
+
+
+def test_write_read(tmp_path):
+    path = str(tmp_path / 'state')
+    data = make_state()
+    sf.state.write(path, data)
+    assert sf.state.is_state(path)
+    out = sf.state.read(path)
+    assert sorted(out.keys()) == sorted(data.keys())
+    assert isinstance(out.coords, np.memmap)
+    assert not out.coords.flags.writeable
+    assert np.array_equal(out.coords, data.coords)
+    assert out.theta == 0.5
+    assert out.ids == [1, 2, 3]
+    assert out.loops[0]['outer'] == 1
+    assert isinstance(out.pair, tuple)
+    assert out.curve.p == 2
+    assert np.array_equal(out.curve.Px, data.curve.Px)
+    assert out.surface.label == 'fault'
+    assert np.array_equal(out.surface.Pz, data.surface.Pz)
+    assert np.array_equal(out.mesh.boundary_edges, data.mesh.boundary_edges)
+    assert out.label is None
+    assert sf.state.digest(out) == sf.state.digest(data)
+    # The cached data of a mesh is not stored
+    data.mesh.node_adjacency
+    sf.state.write(path, data)
+    assert sf.state.read(path).mesh._cache['topology'] == {}
+    assert sf.state.digest(data) == sf.state.digest(out)
+    assert sf.state.size(path) > data.coords.nbytes
+
+    out = sf.state.read(path, fields=['theta'])
+    assert list(out.keys()) == ['theta']
+    with pytest.raises(KeyError):
+        sf.state.read(path, fields=['missing'])
+    with pytest.raises(TypeError):
+        sf.state.write(path, {'a' : np.array([{}])})
+    with pytest.raises(TypeError):
+        sf.state.write(path, {'a' : object()})
+    assert sf.state.is_valid(path)
+
+
+def test_references(tmp_path):
+    first = str(tmp_path / 'first')
+    second = str(tmp_path / 'second')
+    sf.state.write(first, {'a' : np.arange(3), 'b' : np.ones(2)})
+    data = sf.state.read(first)
+    data.b = np.zeros(2)
+    data.c = data.a[1:]
+    sf.state.write(second, data)
+    assert sorted(os.listdir(second)) == ['b.npy', 'c.npy', 'manifest.json']
+    assert list(sf.state.references(second)) == [first]
+    data = sf.state.read(second)
+    assert np.array_equal(data.a, np.arange(3))
+    assert np.array_equal(data.b, np.zeros(2))
+
+    # Copy the arrays of states outside of root
+    third = str(tmp_path / 'sub' / 'third')
+    os.makedirs(str(tmp_path / 'sub'))
+    sf.state.write(third, data, root=str(tmp_path / 'sub'))
+    assert 'a.npy' in os.listdir(third)
+
+    # Overwriting a state invalidates the states that refer to it
+    sf.state.write(first, {'a' : np.arange(3)})
+    assert not sf.state.is_valid(second)
+    with pytest.raises(ValueError):
+        sf.state.read(second)
+    assert sf.state.is_valid(third)
@@ -158,3 +158,220 @@ def test_area():
 
 
 
+def test_boundary_edges():
+    tris = np.array([[0,1,2],[0,2,3]]).astype(np.int64)
+    bnd_edges = sf.triangulation.boundary_edges(tris)
+    bnd_edges_ans = np.array([[0,1], [1,2], [2,3], [3,0]])
+    assert np.all(np.equal(bnd_edges,bnd_edges_ans))
+
+def test_order_loops():
+    nodes = np.array([[2,6], [1,4], [6,4], [1,2], [3,7], [7,8],
+        [8,3]]).astype(np.int64)
+    loops_ans = np.array([[2,6,0,1], [6,4,1,1], [4,1,2,1], [1,2,3,1],
+        [3,7,0,2], [7,8,1,2], [8,3,2,2]])
+    loops, lengths = sf.triangulation.order_loops(nodes)
+    assert np.all(np.equal(loops,loops_ans))
+    assert np.all(np.equal(lengths, [4, 3]))
+    loop = sf.triangulation.get_loop(loops, 1)
+    loop_ans = np.array([[2,6], [6,4], [4,1],[1,2]])
+    assert np.all(np.equal(loop,loop_ans))
+
+    # Loops that meet at a node can only be traced using the triangulation
+    with pytest.raises(ValueError) : sf.triangulation.order_loops(
+            np.array([[0,1], [1,2], [2,0], [0,3], [3,4], [4,0]]))
+
+def test_order_loops_pinch():
+    # Two triangles that only share node 2
+    tris = np.array([[0,1,2], [2,3,4]])
+    mesh = sf.triangulation.Mesh(np.random.rand(5, 3), tris)
+    loops, lengths = mesh.boundary_loops
+    assert np.all(np.equal(lengths, [3, 3]))
+    assert np.all(np.equal(sf.triangulation.get_loop(loops, 1),
+                           [[0,1], [1,2], [2,0]]))
+    assert np.all(np.equal(sf.triangulation.get_loop(loops, 2),
+                           [[2,3], [3,4], [4,2]]))
+
+    # Two fans of two triangles that meet at node 0
+    tris = np.array([[0,1,2], [0,2,3], [0,4,5], [0,5,6]])
+    loops, lengths = sf.triangulation.extract_boundary(tris)
+    assert np.all(np.equal(lengths, [4, 4]))
+    for loop_id in [1, 2]:
+        loop = sf.triangulation.get_loop(loops, loop_id)
+        assert np.all(np.equal(loop[1:,0], loop[:-1,1]))
+        assert loop[-1,1] == loop[0,0]
+    assert np.all(np.equal(sf.triangulation.get_loop(loops, 1),
+                           [[0,1], [1,2], [2,3], [3,0]]))
+
+    # The triangles around a pinch node must be consistently oriented
+    with pytest.raises(ValueError):
+        sf.triangulation.extract_boundary(np.array([[0,1,2], [0,2,3],
+                                                    [0,4,5], [0,6,5]]))
+
+def test_extract_boundary():
+    # Square with a hole in the middle, triangles oriented counter-clockwise
+    coords = np.array([[0.0, 0.0], [3.0, 0.0], [3.0, 3.0], [0.0, 3.0],
+                       [1.0, 1.0], [2.0, 1.0], [2.0, 2.0], [1.0, 2.0]])
+    tris = np.array([[0,1,5], [0,5,4], [1,2,6], [1,6,5], [2,3,7], [2,7,6],
+                     [3,0,4], [3,4,7]])
+    loops, lengths, areas = sf.triangulation.extract_boundary(tris, coords)
+    assert np.all(np.equal(lengths, [4, 4]))
+    assert np.all(np.isclose(areas, [9.0, -1.0]))
+    circ = sf.triangulation.loop_circumferences(loops, coords)
+    assert np.all(np.isclose(circ, [12.0, 4.0]))
+    for loop_id in [1, 2]:
+        loop = sf.triangulation.get_loop(loops, loop_id)
+        assert np.all(np.equal(loop[1:,0], loop[:-1,1]))
+        assert loop[-1,1] == loop[0,0]
+
+def test_project():
+    # Points that lie in the plane z = 1 + 2x - y
+    x, y = np.meshgrid(np.linspace(0, 1, 5), np.linspace(0, 1, 5))
+    x = x.flatten()
+    y = y.flatten()
+    points = np.vstack((x, y, 1 + 2*x - y)).T
+    query_points = np.array([[0.3, 0.2, 0.0], [0.75, 0.5, 0.0],
+                             [2.0, 2.0, 0.0]])
+    tri, proj = sf.triangulation.project(points, query_points)
+    assert tri.shape[1] == 3
+    assert np.isclose(proj[0,2], 1.4)
+    assert np.isclose(proj[1,2], 2.0)
+    # Points outside the triangulation are left unchanged
+    assert np.all(np.equal(proj[2,:], query_points[2,:]))
+
+    projector = sf.triangulation.DelaunayProjector(points)
+    proj2 = projector(query_points[0:2,:])
+    assert np.all(np.isclose(proj2, proj[0:2,:]))
+
+def test_mesh_projector():
+    # Two layers that overlap in the (x, y)-plane, z = 0 and z = 1
+    points = np.array([[0.0, 0.0, 0.0], [1.0, 0.0, 0.0], [1.0, 1.0, 0.0],
+                       [0.0, 1.0, 0.0], [0.0, 0.0, 1.0], [1.0, 0.0, 1.0],
+                       [1.0, 1.0, 1.0], [0.0, 1.0, 1.0]])
+    tris = np.array([[0,1,2], [0,2,3], [4,5,6], [4,6,7]])
+    projector = sf.triangulation.MeshProjector(points, tris)
+    query_points = np.array([[0.75, 0.25, 0.0], [0.25, 0.75, 0.0],
+                             [2.0, 2.0, 5.0]])
+    located, bary = projector.locate(query_points)
+    assert np.all(np.equal(located, [0, 1, -1]))
+    assert np.all(np.isclose(np.sum(bary[0:2,:], axis=1), 1.0))
+    proj = projector(query_points)
+    assert np.all(np.isclose(proj[0:2,2], 0.0))
+    assert np.all(np.equal(proj[2,:], query_points[2,:]))
+
+    # Only the upper layer
+    projector = sf.triangulation.MeshProjector(points, tris[2:,:])
+    proj = projector(query_points)
+    assert np.all(np.isclose(proj[0:2,2], 1.0))
+
+def test_fix_orientation():
+    coords = np.array([[0.0, 0.0], [1.0, 0.0], [1.0, 1.0], [0.0, 1.0]])
+    tris = np.array([[0,1,2], [0,3,2]])
+    tris = sf.triangulation.fix_orientation(tris, coords)
+    assert np.all(np.equal(tris, [[0,1,2], [2,3,0]]))
+
+def test_mesh():
+    coords = np.array([[0.0, 0.0, 0.0], [1.0, 0.0, 0.0], [1.0, 1.0, 0.0],
+                       [0.0, 1.0, 0.0], [5.0, 5.0, 5.0]])
+    tris = np.array([[0,1,2], [0,2,3]])
+    mesh = sf.triangulation.Mesh(coords, tris)
+    assert np.all(np.equal(mesh.edges, [[0,1], [0,2], [0,3], [1,2], [2,3]]))
+    assert np.all(np.equal(mesh.edge_tri_count, [1, 2, 1, 1, 1]))
+    assert np.all(np.equal(mesh.active_nodes, [1, 1, 1, 1, 0]))
+    loops, lengths = mesh.boundary_loops
+    assert np.all(np.equal(lengths, [4]))
+    assert mesh.node_adjacency[0, 2] == 1
+    assert mesh.node_adjacency[1, 3] == 0
+    assert np.all(np.isclose(mesh.areas, 0.5))
+    assert np.all(np.isclose(mesh.normals, [[0, 0, 1], [0, 0, 1]]))
+    assert np.all(np.equal(mesh.edge_triangles([[1,0], [3,2]]), [0, 1]))
+    with pytest.raises(ValueError) : mesh.edge_triangles([[1,0], [1,3]])
+    with pytest.raises(ValueError) : mesh.edge_triangles([[1,0], [4,9]])
+
+    # Cached data is computed once
+    assert mesh.edges is mesh.edges
+
+    # Arrays cannot be modified in place
+    with pytest.raises(ValueError) : mesh.coords[0,0] = 1.0
+
+    # Assignment clears the cache
+    mesh.coords = 2 * coords
+    assert np.all(np.isclose(mesh.areas, 2.0))
+    mesh.tris = tris[0:1,:]
+    assert np.all(np.equal(mesh.boundary_loops[1], [3]))
+
+    # Topology is shared
+    other = mesh.with_coords(coords)
+    assert other.edges is mesh.edges
+    assert np.all(np.isclose(other.areas, 0.5))
+    assert other.active_nodes is mesh.active_nodes
+    other = mesh.with_coords(coords[:3])
+    assert np.all(np.equal(other.active_nodes, [1, 1, 1]))
+    assert np.all(np.equal(mesh.active_nodes, [1, 1, 1, 0, 0]))
+    mesh.coords = coords[:4]
+    assert np.all(np.equal(mesh.active_nodes, [1, 1, 1, 0]))
+
+def test_decimate():
+    n = 20
+    x, y = np.meshgrid(np.linspace(0, 1, n), np.linspace(0, 1, n))
+    x = x.flatten()
+    y = y.flatten()
+    coords = np.vstack((x, y, 0.1*np.sin(3*x)*np.cos(2*y))).T
+    tris = []
+    for j in range(n-1):
+        for i in range(n-1):
+            k = j*n + i
+            tris += [[k, k+1, k+n+1], [k, k+n+1, k+n]]
+    tris = np.array(tris)
+
+    new_tris, error = sf.triangulation.decimate(coords, tris, target=n*n//4)
+    assert len(np.unique(new_tris)) <= n*n//4
+    assert error > 0
+
+    # The boundary is preserved exactly
+    bnd = sf.triangulation.boundary_edges(tris)
+    new_bnd = sf.triangulation.boundary_edges(new_tris)
+    assert set(map(tuple, bnd)) == set(map(tuple, new_bnd))
+
+    # The mesh stays manifold and no triangles are flipped
+    mesh = sf.triangulation.Mesh(coords, new_tris)
+    assert np.max(mesh.edge_tri_count) == 2
+    assert np.all(sf.orientation.signed_areas(new_tris, coords) > 0)
+
+    # A plane can be reduced to its boundary without any error
+    coords[:,2] = 0.0
+    new_tris, error = sf.triangulation.decimate(coords, tris, max_error=1e-12)
+    assert len(np.unique(new_tris)) == bnd.shape[0]
+    assert error < 1e-12
+
+    with pytest.raises(ValueError) : sf.triangulation.decimate(coords, tris)
+
+def test_active_nodes():
+    coords = np.zeros((5, 3))
+    tris = np.array([[0,1,3], [1,3,4]])
+    nodes = sf.triangulation.active_nodes(coords, tris)
+    assert np.all(np.equal(nodes, [1, 1, 0, 1, 1]))
+
+def test_compact():
+    # Two triangles that share an edge through duplicated nodes, and an unused
+    # node
+    coords = np.array([[0.0, 0.0, 0.0], [1.0, 0.0, 0.0], [9.0, 9.0, 9.0],
+                       [1.0, 1.0, 0.0], [0.0, 0.0, 0.0], [1.0, 1.0, 1e-9],
+                       [0.0, 1.0, 0.0]])
+    tris = np.array([[0,1,3], [4,5,6]])
+    new_coords, new_tris, mapping = sf.triangulation.compact(coords, tris)
+    assert new_coords.shape[0] == 6
+    assert np.all(np.equal(mapping, [0, 1, -1, 2, 3, 4, 5]))
+    assert np.all(np.equal(new_tris, [[0,1,2], [3,4,5]]))
+
+    new_coords, new_tris, mapping = sf.triangulation.compact(coords, tris,
+                                                             tol=0)
+    assert new_coords.shape[0] == 5
+    assert np.all(np.equal(mapping, [0, 1, -1, 2, 0, 3, 4]))
+
+    new_coords, new_tris, mapping = sf.triangulation.compact(coords, tris,
+                                                             tol=1e-6)
+    assert new_coords.shape[0] == 4
+    assert np.all(np.equal(new_tris, [[0,1,2], [0,2,3]]))
+    assert np.all(np.equal(new_coords, coords[[0, 1, 3, 6],:]))
+    edges, lengths = sf.triangulation.extract_boundary(new_tris)
+    assert np.all(np.equal(lengths, [4]))
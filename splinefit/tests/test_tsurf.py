@@ -1,3 +1,4 @@
+import numpy as np
 from splinefit import tsurf
 
 def load(test='fault'):
@@ -56,3 +57,130 @@ def test_msh():
         ei = tsurf.msh(ti)
         msh.write('fixtures/%s_%d.msh'%(filename, i), pi, ei)
         i += 1
+
+_ts = """GOCAD TSurf 1
+HEADER {
+name:test
+}
+TFACE
+VRTX 10 0.0 0.0 -1.0
+VRTX 11 1.0 0.0 -1.5
+PVRTX 12 1.0 1.0 -2.0 7.0
+ATOM 13 10
+TRGL 10 11 12
+TRGL 12 13 11
+TFACE
+VRTX 20 5.0 5.0 0.0
+VRTX 21 6.0 5.0 0.0
+VRTX 22 6.0 6.0 0.0
+TRGL 20 21 22
+END
+"""
+
+def test_surfaces(tmp_path):
+    filename = str(tmp_path / 'test.ts')
+    with open(filename, 'w') as fh:
+        fh.write(_ts)
+
+    surfs = list(tsurf.surfaces(filename))
+    assert len(surfs) == 2
+    p, t = surfs[0]
+    assert p.shape == (4, 4)
+    assert np.all(np.equal(p[:,0], [0, 1, 2, 3]))
+    assert np.all(np.equal(p[2,1:], [1.0, 1.0, -2.0]))
+    # ATOM 13 is placed at vertex 10
+    assert np.all(np.equal(p[3,1:], p[0,1:]))
+    assert np.all(np.equal(t, [[0, 1, 2], [2, 3, 1]]))
+
+    surfs = list(tsurf.surfaces(filename, min_elems=2))
+    assert len(surfs) == 1
+
+    p, t = tsurf.read(filename)
+    assert len(p) == 2
+    assert np.all(np.equal(t[1], [[0, 1, 2]]))
+
+def test_swap():
+    import pytest
+    p = np.array([[7, 0.0, 0.0, 0.0],
+                  [3, 1.0, 0.0, 0.0],
+                  [5, 0.0, 1.0, 0.0]])
+    t = np.array([[7, 3, 5], [5, 3, 7]])
+    new_p, new_t = tsurf.swap(p, t)
+    assert np.all(np.equal(new_p[:,0], [0, 1, 2]))
+    assert np.all(np.equal(new_p[:,1:], p[:,1:]))
+    assert np.all(np.equal(new_t, [[0, 1, 2], [2, 1, 0]]))
+
+    with pytest.raises(Exception):
+        tsurf.swap(p, np.array([[7, 3, 4]]))
+
+def test_index(tmp_path):
+    filename = str(tmp_path / 'test.ts')
+    with open(filename, 'w') as fh:
+        fh.write(_ts)
+
+    idx = tsurf.index(filename)
+    assert idx.shape == (2, 4)
+    assert np.all(np.equal(idx[:,2:], [[4, 2], [3, 1]]))
+    assert _ts[idx[1,0]:idx[1,1]].startswith('TFACE')
+    assert _ts[idx[1,1]:].startswith('END')
+
+    idx = tsurf.index(filename, persist=True)
+    assert np.all(np.equal(tsurf.index(filename, persist=True), idx))
+
+    surfs = list(tsurf.load(filename, idx=idx))
+    assert [s[0] for s in surfs] == [0, 1]
+    for (i, p, t), (pi, ti) in zip(surfs, tsurf.surfaces(filename)):
+        assert np.all(np.equal(p, pi))
+        assert np.all(np.equal(t, ti))
+
+    surfs = list(tsurf.load(filename, select=[1]))
+    assert len(surfs) == 1 and surfs[0][0] == 1
+    surfs = list(tsurf.load(filename, min_elems=2))
+    assert len(surfs) == 1 and surfs[0][0] == 0
+    surfs = list(tsurf.load(filename, processes=2))
+    assert [s[0] for s in surfs] == [0, 1]
+
+def test_extents(tmp_path):
+    filename = str(tmp_path / 'test.ts')
+    with open(filename, 'w') as fh:
+        fh.write(_ts)
+
+    ext = tsurf.extents(filename)
+    assert ext.shape == (2, 8)
+    assert np.all(np.equal(ext[0], [0, 1, 0, 1, -2, -1, 3, 2]))
+    assert np.all(np.equal(ext[1], [5, 6, 5, 6, 0, 0, 3, 1]))
+
+def test_index_indented(tmp_path):
+    # Records are split into fields, so indentation is allowed
+    filename = str(tmp_path / 'test.ts')
+    lines = ['  ' + line if line.startswith(('VRTX', 'PVRTX', 'ATOM', 'TRGL'))
+             else line for line in _ts.split('\n')]
+    with open(filename, 'w') as fh:
+        fh.write('\n'.join(lines).replace('  TRGL 20', '\tTRGL 20'))
+
+    surfs = list(tsurf.surfaces(filename))
+    idx = tsurf.index(filename)
+    assert np.all(np.equal(idx[:,2:], [[4, 2], [3, 1]]))
+    assert [len(t) for p, t in surfs] == list(idx[:,3])
+    ext = tsurf.extents(filename)
+    assert np.all(np.equal(ext[:,6:], [[3, 2], [3, 1]]))
+
+    surfs = list(tsurf.load(filename, min_elems=2))
+    assert len(surfs) == 1 and surfs[0][0] == 0
+
+def test_write(tmp_path):
+    filename = str(tmp_path / 'test.ts')
+    p = [np.random.rand(4, 3), np.random.rand(3, 3)]
+    t = [np.array([[0, 1, 2], [2, 1, 3]]), np.array([[0, 1, 2]])]
+    tsurf.write(filename, p, t, name='fault')
+
+    p2, t2 = tsurf.read(filename)
+    assert len(p2) == 2
+    for pi, ti, pj, tj in zip(p, t, p2, t2):
+        # Coordinates are written without loss of precision
+        assert np.all(np.equal(pj[:,1:], pi))
+        assert np.all(np.equal(tj, ti))
+
+    tsurf.write(filename, p[0], t[0], precision=3)
+    p2, t2 = tsurf.read(filename)
+    assert np.allclose(p2[0][:,1:], p[0], atol=1e-2)
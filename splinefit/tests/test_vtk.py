@@ -1,4 +1,5 @@
 from splinefit import msh, vtk
+import pytest
 import numpy as np
 
 def load():
@@ -18,3 +19,97 @@ def test_write_surface():
     X, Y = np.meshgrid(x, y)
     Z = np.cos(0.4*np.pi*X)*np.cos(0.5*np.pi*Y)
     vtk.write_surface('fixtures/surf.vtk', X, Y, Z)
+
+def read_xml(filename):
+    """
+    Read the arrays of a VTK XML file with appended raw data.
+
+    """
+    import re
+    import zlib
+    buf = open(filename, 'rb').read()
+    start = buf.index(b'<AppendedData encoding="raw">')
+    header = buf[:start].decode()
+    data = buf[buf.index(b'_', start) + 1:]
+    types = {'Float64': 'f8', 'Int64': 'i8', 'UInt8': 'u1'}
+    out = {}
+    for match in re.finditer(r'type="(\w+)" Name="(\w+)" '
+                             r'NumberOfComponents="(\d+)" format="appended" '
+                             r'offset="(\d+)"', header):
+        dtype, name, ncomp, offset = match.groups()
+        offset = int(offset)
+        if 'compressor' in header:
+            nblocks = int(np.frombuffer(data, '<u8', 1, offset)[0])
+            sizes = np.frombuffer(data, '<u8', 3 + nblocks, offset)[3:]
+            pos = offset + 8 * (3 + nblocks)
+            raw = b''
+            for size in sizes:
+                raw += zlib.decompress(data[pos:pos+int(size)])
+                pos += int(size)
+        else:
+            nbytes = int(np.frombuffer(data, '<u8', 1, offset)[0])
+            raw = data[offset+8:offset+8+nbytes]
+        out[name] = np.frombuffer(raw, '<' + types[dtype]).reshape(
+                    -1, int(ncomp)).squeeze()
+    return out, header
+
+def test_write_vtu(tmp_path):
+    p = np.random.rand(4, 3)
+    t = np.array([[0, 1, 2], [2, 1, 3]])
+    for compress in [False, True]:
+        filename = str(tmp_path / ('test_%d.vtu' % compress))
+        vtk.write_vtu(filename, p, t, compress=compress)
+        arrays, header = read_xml(filename)
+        assert 'NumberOfPoints="4" NumberOfCells="2"' in header
+        assert np.all(np.equal(arrays['Points'], p))
+        assert np.all(np.equal(arrays['connectivity'].reshape(-1, 3), t))
+        assert np.all(np.equal(arrays['offsets'], [3, 6]))
+        assert np.all(np.equal(arrays['types'], [5, 5]))
+
+def test_write_vts(tmp_path):
+    X, Y = np.meshgrid(np.linspace(0, 1, 3), np.linspace(0, 1, 4))
+    Z = X * Y
+    filename = str(tmp_path / 'test.vts')
+    vtk.write_vts(filename, X, Y, Z, compress=True)
+    arrays, header = read_xml(filename)
+    assert 'WholeExtent="0 3 0 2 0 0"' in header
+    # The first index varies the fastest
+    assert np.all(np.equal(arrays['Points'][1], [X[1,0], Y[1,0], Z[1,0]]))
+    assert np.all(np.equal(arrays['Points'][4], [X[0,1], Y[0,1], Z[0,1]]))
+
+    vtk.write_vtm(str(tmp_path / 'test.vtm'), [filename])
+    txt = open(str(tmp_path / 'test.vtm')).read()
+    assert 'name="test" file="test.vts"' in txt
+
+def test_dataset(tmp_path):
+    p = np.random.rand(4, 3)
+    t = np.array([[0, 1, 2], [2, 1, 3]])
+    data = vtk.Dataset(p[:2], t)
+    assert data.add_points(p[2:]) == 2
+    data.add_point_data('distance', np.arange(2))
+    data.add_point_data('distance', np.arange(2, 4))
+    data.add_point_data('normal', p)
+    data.add_cell_data('area', np.array([0.5, 1.5]))
+    assert np.all(np.equal(data.points, p))
+
+    filename = str(tmp_path / 'test.vtu')
+    data.write(filename)
+    arrays, header = read_xml(filename)
+    assert '<PointData Scalars="distance" Vectors="normal">' in header
+    assert np.all(np.equal(arrays['distance'], [0, 1, 2, 3]))
+    assert np.all(np.equal(arrays['normal'], p))
+    assert np.all(np.equal(arrays['area'], [0.5, 1.5]))
+
+    filename = str(tmp_path / 'test.vtk')
+    data.write(filename)
+    lines = open(filename).read().split('\n')
+    assert lines.count('POINT_DATA 4') == 1
+    assert 'SCALARS distance float 1' in lines
+    assert 'VECTORS normal float' in lines
+    assert 'CELL_DATA 2' in lines
+    idx = lines.index('SCALARS area float 1')
+    assert lines[idx+2:idx+4] == ['0.5', '1.5']
+
+    data.add_cell_data('bad', np.arange(3))
+    with pytest.raises(ValueError):
+        data.write(filename)
@@ -57,13 +57,68 @@ def active_nodes(coords, tris):
     """
 
     nodes = np.zeros((coords.shape[0], ))
-
-    for tri in tris:
-        nodes[tri[0]] = 1
-        nodes[tri[1]] = 1
-        nodes[tri[2]] = 1
+    nodes[np.asarray(tris, dtype=np.int64).flatten()] = 1
     return nodes
 
+def compact(coords, tris, tol=None):
+    """
+    Remove nodes that are not part of the triangulation, and optionally weld
+    nodes that coincide. Triangles that degenerate because some of their nodes
+    are welded together are removed.
+
+    Nodes are welded if their coordinates round to the same multiple of `tol`.
+    Hence, nodes closer than `tol` to each other are usually, but not always,
+    welded.
+
+    Arguments:
+        coords : Array of coordinates (size: num points x dim).
+        tris : Triangulation in the form of a m x 3 array.
+        tol(optional) : Tolerance for welding nodes. Use `tol=0` to only weld
+            nodes with identical coordinates. Nodes are not welded by default.
+
+    Returns:
+        coords : Coordinates of the remaining nodes.
+        tris : Renumbered triangulation.
+        mapping : Array that maps each old node index to its new index. Nodes
+            that have been removed are assigned `-1`.
+
+    """
+    tris = np.asarray(tris, dtype=np.int64)
+    num_nodes = coords.shape[0]
+    used = active_nodes(coords, tris) == 1
+    nodes = np.flatnonzero(used)
+
+    if tol is None:
+        keep = nodes
+        new_ids = np.arange(nodes.shape[0])
+    else:
+        keys = coords[nodes,:] / tol if tol > 0 else coords[nodes,:]
+        if tol > 0:
+            keys = np.round(keys)
+        _, first, new_ids = np.unique(keys, axis=0, return_index=True,
+                                      return_inverse=True)
+        new_ids = new_ids.flatten()
+        # Keep the nodes in their original order
+        order = np.argsort(first)
+        rank = np.zeros((order.shape[0],)).astype(np.int64)
+        rank[order] = np.arange(order.shape[0])
+        new_ids = rank[new_ids]
+        keep = nodes[np.sort(first)]
+
+    mapping = np.full((num_nodes,), -1).astype(np.int64)
+    mapping[nodes] = new_ids
+    tris = mapping[tris]
+    tris = tris[(tris[:,0] != tris[:,1]) & (tris[:,1] != tris[:,2]) &
+                (tris[:,2] != tris[:,0]),:]
+    coords = coords[keep,...]
+
+    # Removing degenerate triangles can leave nodes unused
+    if np.unique(tris).shape[0] < coords.shape[0]:
+        coords, tris, remaining = compact(coords, tris)
+        mapping[mapping >= 0] = remaining[mapping[mapping >= 0]]
+
+    return coords, tris, mapping
+
 
 
 
@@ -260,22 +315,253 @@ def get_loop(edges, loop_id):
     are ordered in the direction of traversal.
     """
 
-    # Get number of elements in loop
-    num_nodes = sum(edges[:,3] == loop_id)
+    in_loop = edges[:,3] == loop_id
+    num_nodes = np.count_nonzero(in_loop)
 
     out = np.zeros((num_nodes,2)).astype(np.int64)
-
-    for i in range(edges.shape[0]):
-        edge = edges[i,:]
-        if edge[3] == loop_id:
-            traversal = edge[2] 
-            node1 = edge[0]
-            node2 = edge[1]
-            out[traversal,0] = node1
-            out[traversal,1] = node2
+    out[edges[in_loop,2],:] = edges[in_loop,0:2]
 
     return out
 
+def boundary_edges(tris):
+    """
+    Return the edges that lie on the boundary of a triangulation. An edge lies
+    on the boundary if it belongs to exactly one triangle. Each boundary edge
+    keeps the orientation it has in its triangle, so that the boundary edges of
+    a consistently oriented triangulation can be chained into loops.
+
+    Arguments:
+        tris : Triangulation in the form of a m x 3 array.
+
+    Returns:
+        out : Array of boundary edges (num boundary edges x 2).
+
+    """
+    tris = np.asarray(tris, dtype=np.int64)
+    if tris.shape[0] == 0:
+        return np.zeros((0, 2)).astype(np.int64)
+
+    half_edges = tris[:, [0, 1, 1, 2, 2, 0]].reshape(-1, 2)
+    lo = np.min(half_edges, axis=1)
+    hi = np.max(half_edges, axis=1)
+    keys = lo * (np.max(tris) + 1) + hi
+    _, inverse, count = np.unique(keys, return_inverse=True,
+                                  return_counts=True)
+    return half_edges[count[inverse] == 1,:]
+
+def order_loops(edges, tris=None):
+    """
+    Order a set of boundary edges into closed loops. This function produces the
+    same output as `boundary_loops` but is vectorized and runs in (almost)
+    linear time, independent of the number of loops.
+
+    The edges do not need to be oriented. Each loop is traversed in the
+    direction of its edge with the least index in `edges`. Hence, if the edges
+    are taken from a consistently oriented triangulation (see
+    `boundary_edges`), all loops follow the orientation of the triangles.
+
+    Arguments:
+        edges : Array of boundary edges (num edges x 2).
+        tris(optional) : Triangulation that the edges are taken from (see
+            `boundary_edges`). Required if loops meet at a node.
+
+    Returns:
+        out : Array that contains the columns:
+              node ID 1, node ID 2, traversal ID, loop ID.
+              The rows are sorted by loop ID and traversal ID. Loop IDs start
+              at `1` and are ordered by the least edge index in each loop.
+        lengths : Number of edges in each loop. `lengths[i]` is the length of
+            the loop with ID `i + 1`.
+
+    A node that belongs to more than two boundary edges (a pinch node, where
+    several loops meet) is split into one node per loop. The successor of each
+    edge that arrives at the node is found by walking around the fan of
+    triangles at the node, starting from the triangle of the edge. This
+    requires `tris`, the edges must be oriented as in their triangles, and the
+    triangles around the node must be consistently oriented.
+
+    """
+    from scipy.sparse import coo_matrix
+    from scipy.sparse.csgraph import connected_components
+
+    edges = np.asarray(edges, dtype=np.int64)
+    num_edges = edges.shape[0]
+    if num_edges == 0:
+        return np.zeros((0, 4)).astype(np.int64), np.zeros((0,)).astype(np.int64)
+
+    # Each edge gives rise to two darts (directed edges), the forward dart `i`
+    # and the reverse dart `i + num_edges`
+    tail = np.concatenate((edges[:,0], edges[:,1]))
+    head = np.concatenate((edges[:,1], edges[:,0]))
+    num_darts = 2 * num_edges
+    darts = np.arange(num_darts)
+    reverse = (darts + num_edges) % num_darts
+
+    # Group the two darts that leave each node
+    leaving = np.argsort(tail, kind='stable')
+    nodes, count = np.unique(tail[leaving], return_counts=True)
+    if np.any(count % 2 == 1):
+        raise ValueError('Each boundary node must belong to an even number of '
+                         'boundary edges.')
+    if np.any(count > 2) and tris is None:
+        raise ValueError('Boundary loops meet at a node. Pass the '
+                         'triangulation to trace them.')
+    pairs = leaving[np.repeat(count == 2, count)].reshape(-1, 2)
+    partner = np.zeros((num_darts,)).astype(np.int64)
+    partner[pairs[:,0]] = pairs[:,1]
+    partner[pairs[:,1]] = pairs[:,0]
+    if np.any(count > 2):
+        _pair_pinch_darts(edges, tris, nodes[count > 2], partner)
+
+    # After arriving at a node, leave it by the dart that does not go back
+    nxt = partner[reverse]
+
+    # Each loop is traversed by two dart cycles, one in each direction
+    graph = coo_matrix((np.ones((num_darts,)), (darts, nxt)),
+                       shape=(num_darts, num_darts))
+    num_cycles, cycle = connected_components(graph, directed=True,
+                                             connection='weak')
+    cycle_min = np.full((num_cycles,), num_darts).astype(np.int64)
+    np.minimum.at(cycle_min, cycle, darts)
+
+    # Keep the cycle that contains the forward dart of the least edge
+    twin = cycle[reverse[cycle_min]]
+    keep = cycle_min < cycle_min[twin]
+    kept = np.flatnonzero(keep[cycle])
+
+    loop_of_cycle = np.zeros((num_cycles,)).astype(np.int64)
+    loop_of_cycle[keep] = np.argsort(np.argsort(cycle_min[keep])) + 1
+    loop_id = loop_of_cycle[cycle[kept]]
+    lengths = np.bincount(loop_id, minlength=np.count_nonzero(keep) + 1)[1:]
+
+    # Rank the darts in each cycle by pointer jumping backwards to the first
+    # dart of the cycle
+    prev = np.zeros((num_darts,)).astype(np.int64)
+    prev[nxt] = darts
+    first = np.zeros((num_darts,)).astype(bool)
+    first[cycle_min] = True
+    prev[first] = darts[first]
+    rank = (~first).astype(np.int64)
+    while np.any(prev[kept] != prev[prev[kept]]):
+        rank[kept] = rank[kept] + rank[prev[kept]]
+        prev[kept] = prev[prev[kept]]
+
+    out = np.vstack((tail[kept], head[kept], rank[kept], loop_id)).T
+    out = out[np.lexsort((out[:,2], out[:,3])),:]
+    return out, lengths
+
+def _pair_pinch_darts(edges, tris, pinch, partner):
+    """
+    Pair the darts that leave pinch nodes (see `order_loops`). Each edge that
+    arrives at a pinch node is paired with the boundary edge that leaves it
+    next, in the direction of rotation given by the triangles.
+
+    """
+    num_edges = edges.shape[0]
+    tris = np.asarray(tris, dtype=np.int64)
+    half_edges = tris[:, [0, 1, 1, 2, 2, 0]].reshape(-1, 2)
+    n = max(np.max(tris), np.max(edges)) + 1
+    keys = half_edges[:,0] * n + half_edges[:,1]
+    order = np.argsort(keys, kind='stable')
+    keys = keys[order]
+
+    def find(a, b):
+        idx = np.searchsorted(keys, a * n + b)
+        if idx < keys.shape[0] and keys[idx] == a * n + b:
+            return order[idx]
+        return -1
+
+    leaving = np.flatnonzero(np.isin(edges[:,0], pinch))
+    bnd = {edges[i,0] * n + edges[i,1] : i for i in leaving}
+    paired = np.zeros((num_edges,)).astype(bool)
+
+    for j in np.flatnonzero(np.isin(edges[:,1], pinch)):
+        h = find(edges[j,0], edges[j,1])
+        i = None
+        for step in range(tris.shape[0]):
+            if h < 0:
+                break
+            # Next half-edge in the same triangle, which leaves the node
+            h = 3 * (h // 3) + (h % 3 + 1) % 3
+            i = bnd.get(half_edges[h,0] * n + half_edges[h,1])
+            if i is not None:
+                break
+            # Cross the interior edge to the next triangle of the fan
+            h = find(half_edges[h,1], half_edges[h,0])
+        if i is None or paired[i]:
+            raise ValueError('Cannot trace the boundary at node %d. The '
+                             'triangles around it must be consistently '
+                             'oriented.' % edges[j,1])
+        paired[i] = True
+        partner[j + num_edges] = i
+        partner[i] = j + num_edges
+
+    if not np.all(paired[leaving]):
+        raise ValueError('Cannot trace the boundary at nodes %s. The triangles '
+                         'around them must be consistently oriented.' %
+                         str(np.unique(edges[leaving[~paired[leaving]],0])))
+
+def loop_areas(loops, points):
+    """
+    Compute the signed area enclosed by each loop in the (x, y)-plane.
+
+    Arguments:
+        loops : Boundary loops (see `order_loops` or `boundary_loops`).
+        points : Array of coordinates (size: num points x 2 or 3).
+
+    Returns:
+        out : Signed area of each loop. `out[i] > 0` if the loop with ID `i +
+            1` is traversed counter-clockwise.
+
+    """
+    x1 = points[loops[:,0],0]
+    y1 = points[loops[:,0],1]
+    x2 = points[loops[:,1],0]
+    y2 = points[loops[:,1],1]
+    num_loops = np.max(loops[:,3]) if loops.shape[0] else 0
+    return 0.5 * np.bincount(loops[:,3], weights=x1 * y2 - x2 * y1,
+                             minlength=num_loops + 1)[1:]
+
+def loop_circumferences(loops, points):
+    """
+    Compute the length of each loop.
+
+    Arguments:
+        loops : Boundary loops (see `order_loops` or `boundary_loops`).
+        points : Array of coordinates (size: num points x dim).
+
+    Returns:
+        out : Length of each loop. `out[i]` is the length of the loop with ID
+            `i + 1`.
+
+    """
+    lengths = np.linalg.norm(points[loops[:,1],:] - points[loops[:,0],:],
+                             axis=1)
+    num_loops = np.max(loops[:,3]) if loops.shape[0] else 0
+    return np.bincount(loops[:,3], weights=lengths,
+                       minlength=num_loops + 1)[1:]
+
+def extract_boundary(tris, points=None):
+    """
+    Extract all boundary loops of a triangulation.
+
+    Arguments:
+        tris : Triangulation in the form of a m x 3 array.
+        points (optional) : Array of coordinates. Pass to determine the
+            orientation of each loop in the (x, y)-plane.
+
+    Returns:
+        loops : Ordered boundary loops (see `order_loops`).
+        lengths : Number of edges in each loop.
+        areas : Signed area of each loop (see `loop_areas`). Only returned if
+            `points` is given.
+
+    """
+    loops, lengths = order_loops(boundary_edges(tris), tris)
+    if points is None:
+        return loops, lengths
+    return loops, lengths, loop_areas(loops, points)
+
 def tri_to_edges(tri):
     """
     Return the edges in a triangle.
@@ -425,13 +711,9 @@ def fix_orientation(triangles, points):
     Enforce counter-clockwise ordering of all nodes of triangles in a mesh in
     the plane.
     """
-    for tri in triangles:
-        nodes = triangles[tri,:]
-        e1 = points[nodes[1],0:2] - points[nodes[0],0:2]
-        e2 = points[nodes[2],0:2] - points[nodes[1],0:2]
-        z = np.cross(e1, e2)
-        if z < 0:
-            triangles[tri,:] = triangles[tri, ::-1]
+    from .orientation import signed_areas
+    flip = signed_areas(triangles, points) < 0
+    triangles[flip,:] = triangles[flip,::-1]
     return triangles
 
 
@@ -546,11 +828,262 @@ def areas(tris, points):
     z = np.cross(e1, e2)
     return 0.5 * np.linalg.norm(z, axis=1)
 
+class DelaunayProjector(object):
+
+    def __init__(self, points, tol=1e-12):
+        """
+        Project query points in the (x,y)-plane onto a triangulation in (x, y,
+        z). This triangulation is determined by the Delaunay triangulation in
+        the (x, y) plane. The triangulation and the plane that each triangle
+        lies in are computed once, so that projecting several sets of query
+        points onto the same point cloud only costs point location.
+
+        Arguments:
+            points : Array of points (size: num points x 3).
+            tol(optional) : Triangles with normals that have a z-component
+                smaller than this tolerance are reported as near orthogonal to
+                the projection plane.
+
+        """
+        from scipy.spatial import Delaunay
+        self.points = points
+        self.deltri = Delaunay(points[:,0:2])
+        self.simplices = self.deltri.simplices
+        self.tol = tol
+        self.coef, self.near_orthogonal = planes(points, self.simplices,
+                                                 tol=tol)
+
+    def __call__(self, query_points, skip_nan=True):
+        """
+        Project query points onto the triangulation.
+
+        Arguments:
+            query_points : Array of query points (size: num points x 3).
+            skip_nan(optional) : Remove nan-values from output.
+
+        Returns:
+            proj : Projection of query points onto the triangulation. Any points
+                that fall outside the triangulation are left unchanged.
+
+        """
+        import warnings
+        tris = self.deltri.find_simplex(query_points[:,0:2])
+        inside = tris != -1
+
+        num_warn = np.count_nonzero(self.near_orthogonal[tris[inside]])
+        if num_warn > 0:
+            warnings.warn('%d triangle(s) near orthogonal to projection plane'
+                          % num_warn)
+
+        proj = np.array(query_points[:,0:3], dtype=np.float64)
+        proj[inside,2] = eval_planes(self.coef[tris[inside],:],
+                                     proj[inside,0], proj[inside,1])
+
+        if skip_nan:
+            proj = proj[~np.isnan(proj[:,0]),:]
+
+        return proj
+
+class MeshProjector(object):
+
+    def __init__(self, points, tris, cell_size=None):
+        """
+        Project query points in the (x,y)-plane onto an existing triangulation
+        in (x, y, z). In contrast to `DelaunayProjector`, the connectivity of
+        the triangulation is kept, so that no global re-triangulation is
+        needed and the projection respects the input mesh.
+
+        The triangles are located using a uniform grid in the (x, y)-plane.
+        Each cell of the grid lists the triangles whose bounding boxes overlap
+        the cell.
+
+        Arguments:
+            points : Array of points (size: num points x 3).
+            tris : Triangulation in the form of a m x 3 array.
+            cell_size(optional) : Size of each grid cell. Defaults to the
+                average dimension of the bounding boxes of the triangles.
+
+        """
+        self.points = points
+        self.tris = np.asarray(tris, dtype=np.int64)
+        num_tris = self.tris.shape[0]
+
+        xy = points[self.tris,0:2]
+        lo = np.min(xy, axis=1)
+        hi = np.max(xy, axis=1)
+        self.origin = np.min(lo, axis=0)
+        extent = np.max(hi, axis=0) - self.origin
+
+        if cell_size is None:
+            cell_size = np.mean(hi - lo)
+        # Limit the number of cells to a few per triangle
+        min_cell_size = np.sqrt(extent[0] * extent[1] / (4 * num_tris + 1))
+        cell_size = max(cell_size, min_cell_size, 1e-12)
+        self.cell_size = cell_size
+        self.shape = (np.floor(extent / cell_size)).astype(np.int64) + 1
+
+        i0 = self._cell(lo)
+        i1 = self._cell(hi)
+        nx = i1[:,0] - i0[:,0] + 1
+        ny = i1[:,1] - i0[:,1] + 1
+        count = nx * ny
+
+        # Enumerate all (cell, triangle) pairs
+        tri_ids = np.repeat(np.arange(num_tris), count)
+        local = np.arange(tri_ids.shape[0]) - np.repeat(np.cumsum(count) -
+                                                        count, count)
+        cx = i0[tri_ids,0] + local % nx[tri_ids]
+        cy = i0[tri_ids,1] + local // nx[tri_ids]
+        cells = cy * self.shape[0] + cx
+
+        order = np.argsort(cells, kind='stable')
+        self.cell_tris = tri_ids[order]
+        num_cells = self.shape[0] * self.shape[1]
+        self.cell_start = np.concatenate(([0], np.cumsum(
+                          np.bincount(cells, minlength=num_cells))))
+
+    def _cell(self, xy):
+        return np.floor((xy - self.origin) / self.cell_size).astype(np.int64)
+
+    def locate(self, query_points, tol=1e-10):
+        """
+        Find the triangle that contains each query point. If several triangles
+        contain a query point, the triangle with the least index is selected.
+
+        Arguments:
+            query_points : Array of query points (size: num points x 2 or 3).
+            tol(optional) : Tolerance for points that lie on an edge.
+
+        Returns:
+            tris : Index of the triangle that contains each query point. Points
+                outside the triangulation are assigned `-1`.
+            bary : Barycentric coordinates of each query point with respect to
+                its triangle (size: num points x 3).
+
+        """
+        num_query = query_points.shape[0]
+        q = query_points[:,0:2]
+        ij = self._cell(q)
+        inside_grid = np.all((ij >= 0) & (ij < self.shape), axis=1)
+        cells = ij[:,1] * self.shape[0] + ij[:,0]
+
+        start = np.where(inside_grid, self.cell_start[:-1][cells * inside_grid],
+                         0)
+        end = np.where(inside_grid, self.cell_start[1:][cells * inside_grid],
+                       0)
+        count = end - start
+
+        # Test every query point against each candidate in its cell
+        query_ids = np.repeat(np.arange(num_query), count)
+        local = np.arange(query_ids.shape[0]) - np.repeat(np.cumsum(count) -
+                                                          count, count)
+        candidates = self.cell_tris[start[query_ids] + local]
+        nodes = self.tris[candidates,:]
+        bary = barycentric(self.points[nodes[:,0],0:2],
+                           self.points[nodes[:,1],0:2],
+                           self.points[nodes[:,2],0:2],
+                           q[query_ids,:])
+        hit = np.all(bary >= -tol, axis=1)
+
+        # Candidates are sorted by query point and triangle index
+        hit_ids, first = np.unique(query_ids[hit], return_index=True)
+        out = np.full((num_query,), -1).astype(np.int64)
+        out_bary = np.zeros((num_query, 3))
+        out[hit_ids] = candidates[hit][first]
+        out_bary[hit_ids,:] = bary[hit][first]
+        return out, out_bary
+
+    def __call__(self, query_points, skip_nan=True):
+        """
+        Project query points onto the triangulation.
+
+        Arguments:
+            query_points : Array of query points (size: num points x 3).
+            skip_nan(optional) : Remove nan-values from output.
+
+        Returns:
+            proj : Projection of query points onto the triangulation. Any points
+                that fall outside the triangulation are left unchanged.
+
+        """
+        tris, bary = self.locate(query_points)
+        inside = tris != -1
+
+        proj = np.array(query_points[:,0:3], dtype=np.float64)
+        z = self.points[self.tris[tris[inside],:],2]
+        proj[inside,2] = np.sum(bary[inside,:] * z, axis=1)
+
+        if skip_nan:
+            proj = proj[~np.isnan(proj[:,0]),:]
+
+        return proj
+
+def barycentric(p0, p1, p2, q):
+    """
+    Compute the barycentric coordinates of points with respect to triangles in
+    the plane. Degenerate triangles produce negative coordinates.
+
+    Arguments:
+        p0, p1, p2 : Vertices of each triangle (size: num triangles x 2).
+        q : Query points (size: num triangles x 2).
+
+    Returns:
+        out : Barycentric coordinates (size: num triangles x 3).
+
+    """
+    v0 = p1 - p0
+    v1 = p2 - p0
+    v2 = q - p0
+    det = v0[:,0] * v1[:,1] - v1[:,0] * v0[:,1]
+    degenerate = det == 0
+    det[degenerate] = 1.0
+    l1 = (v2[:,0] * v1[:,1] - v1[:,0] * v2[:,1]) / det
+    l2 = (v0[:,0] * v2[:,1] - v2[:,0] * v0[:,1]) / det
+    out = np.vstack((1.0 - l1 - l2, l1, l2)).T
+    out[degenerate,:] = -1.0
+    return out
+
+def planes(points, tris, tol=1e-12):
+    """
+    Compute the plane `z = a*x + b*y + c` that each triangle lies in.
+
+    Arguments:
+        points : Array of points (size: num points x 3).
+        tris : Triangulation in the form of a m x 3 array.
+        tol(optional) : Tolerance for detecting triangles that are near
+            orthogonal to the (x, y)-plane.
+
+    Returns:
+        coef : Array of plane coefficients `a, b, c` (size: m x 3).
+        near_orthogonal : Boolean array that flags triangles with a normal that
+            has a z-component smaller than `tol`.
+
+    """
+    p0 = points[tris[:,0],0:3]
+    p1 = points[tris[:,1],0:3]
+    p2 = points[tris[:,2],0:3]
+    n = np.cross(p2 - p1, p0 - p1)
+    near_orthogonal = np.abs(n[:,2]) < tol
+    with np.errstate(divide='ignore', invalid='ignore'):
+        a = -n[:,0] / n[:,2]
+        b = -n[:,1] / n[:,2]
+        c = p1[:,2] - a * p1[:,0] - b * p1[:,1]
+    return np.vstack((a, b, c)).T, near_orthogonal
+
+def eval_planes(coef, x, y):
+    """
+    Evaluate `z = a*x + b*y + c` for planes computed by `planes`.
+
+    """
+    with np.errstate(invalid='ignore'):
+        return coef[:,0] * x + coef[:,1] * y + coef[:,2]
+
 def project(points, query_points, skip_nan=True):
     """
     Project query points in the (x,y)-plane onto a triangulation in (x, y, z).
     This triangulation is determined by the Delaunay triangulation in the (x, y)
-    plane.
+    plane. Use `DelaunayProjector` to project several sets of query points onto
+    the same points.
 
     Returns:
         tri : Triangulation
@@ -560,36 +1093,9 @@ def project(points, query_points, skip_nan=True):
         skip_nan : Remove nan-values from output.
 
     """
-    from scipy.spatial import Delaunay
-    import warnings
-
-    deltri = Delaunay(points[:,0:2])
-    tris = deltri.find_simplex(query_points[:,0:2])
-
-    proj = np.zeros((query_points.shape[0], 3))
-    tol = 1e-12
-    for i, tri in enumerate(tris):
-        # Skip query points outside domain
-        if tri == -1:
-            proj[i,:] = query_points[i,:]
-            continue
-
-        tripoints = points[deltri.simplices[tri,:],:]
-        n = normal(tripoints)
-        # Determine z-coordinate for query point (x,y), where z lies on the
-        # triangle `tri`
-        qp = query_points[i,:]
-        tp = tripoints[0,:]
-        proj[i,0:2] = qp[0:2]
-        if abs(n[2]) < tol:
-            warnings.warn('Triangle is near orthogonal to projection plane')
-
-        proj[i,2] = -(n[0]*(qp[0] - tp[0]) + n[1]*(qp[1] - tp[1]))/n[2] + tp[2]
-
-    if skip_nan:
-        proj = proj[~np.isnan(proj[:,0]),:]
-
-    return deltri.simplices.copy(), proj
+    projector = DelaunayProjector(points)
+    proj = projector(query_points, skip_nan=skip_nan)
+    return projector.simplices.copy(), proj
 
 def normal(points):
     """
@@ -604,3 +1110,389 @@ def normal(points):
 
 
 
+
+def decimate(coords, tris, target=None, max_error=None, max_passes=200,
+             seed=0):
+    """
+    Reduce the number of nodes in a triangulation by quadric error edge
+    collapses.
+
+    Each collapse removes a node `u` by moving it onto one of its neighbors
+    `v` (half-edge collapse). Hence, the remaining nodes keep their original
+    coordinates. The cost of a collapse is the sum of the squared distances
+    from `v` to the planes of the triangles that have been merged into `u` and
+    `v` (the quadric error metric). Boundary nodes are never removed, so that
+    all boundary loops are preserved exactly.
+
+    The collapses are performed in passes. In each pass, the cheapest half of
+    the candidate collapses are visited in random order, and all nodes that
+    come before their neighbors are collapsed at once. Collapses that would
+    rotate a triangle normal by more than 60 degrees or make the mesh
+    non-manifold are rejected.
+
+    Arguments:
+        coords : Array of coordinates (size: num points x 3).
+        tris : Triangulation in the form of a m x 3 array.
+        target(optional) : Stop once the number of nodes in the triangulation
+            is at most `target`.
+        max_error(optional) : Only perform collapses that move a node at most
+            `max_error` away from the planes it has been merged with.
+        max_passes(optional) : Maximum number of passes.
+        seed(optional) : Seed for the order in which collapses are visited.
+
+    Returns:
+        tris : Decimated triangulation. The node indices refer to `coords`.
+            Use `active_nodes` to find the nodes that remain.
+        error : Largest error introduced by any of the collapses, in the same
+            units as `coords`.
+
+    """
+    if target is None and max_error is None:
+        raise ValueError('Either `target` or `max_error` must be specified.')
+
+    points = np.asarray(coords, dtype=np.float64)[:,0:3]
+    tris = np.array(tris, dtype=np.int64)
+    num_nodes = points.shape[0]
+    if tris.shape[0] == 0:
+        return tris, 0.0
+
+    # Plane quadric of each triangle, accumulated at its nodes
+    p0 = points[tris[:,0],:]
+    normal = np.cross(points[tris[:,1],:] - p0, points[tris[:,2],:] - p0)
+    length = np.linalg.norm(normal, axis=1)
+    length[length == 0] = 1.0
+    normal = normal / length[:,None]
+    plane = np.hstack((normal, -np.sum(normal * p0, axis=1)[:,None]))
+    tri_quadrics = (plane[:,:,None] * plane[:,None,:]).reshape(-1, 16)
+    quadrics = np.zeros((num_nodes, 16))
+    for k in range(16):
+        quadrics[:,k] = np.bincount(tris.flatten(),
+                                    weights=np.repeat(tri_quadrics[:,k], 3),
+                                    minlength=num_nodes)
+    quadrics = quadrics.reshape(-1, 4, 4)
+
+    locked = np.zeros((num_nodes,)).astype(bool)
+    locked[boundary_edges(tris).flatten()] = True
+    blocked = np.zeros((0,)).astype(np.int64)
+    homogeneous = np.hstack((points, np.ones((num_nodes, 1))))
+    random = np.random.RandomState(seed)
+    # Largest rotation of a triangle normal caused by a collapse (60 degrees)
+    max_cos = 0.5
+    max_cost = 0.0
+
+    for _ in range(max_passes):
+        nodes = np.unique(tris)
+        if target is not None and nodes.shape[0] <= target:
+            break
+
+        mesh = Mesh(points, tris)
+        edges = mesh.edges
+        u = np.concatenate((edges[:,0], edges[:,1]))
+        v = np.concatenate((edges[:,1], edges[:,0]))
+        keys = u * num_nodes + v
+        candidate = ~locked[u] & ~np.isin(keys, blocked)
+        cost = np.full(u.shape, np.inf)
+        cost[candidate] = np.einsum('ij,ijk,ik->i', homogeneous[v[candidate]],
+                                    quadrics[u[candidate]] +
+                                    quadrics[v[candidate]],
+                                    homogeneous[v[candidate]])
+        if max_error is not None:
+            cost[cost > max_error ** 2] = np.inf
+
+        # Cheapest collapse of each node, the directed edges are sorted by `u`
+        order = np.lexsort((cost, u))
+        u = u[order]
+        v = v[order]
+        keys = keys[order]
+        cost = cost[order]
+        start = np.flatnonzero(np.concatenate(([True], u[1:] != u[:-1])))
+        best = start[np.isfinite(cost[start])]
+        if best.shape[0] == 0:
+            break
+        # The cheapest half of the collapses are performed in random order
+        best = best[cost[best] <= np.median(cost[best])]
+        rank = np.full((num_nodes,), np.inf)
+        rank[u[best]] = random.permutation(best.shape[0])
+
+        # Only collapse nodes that come before all of their neighbors, and at
+        # most one node onto each neighbor
+        ring = np.full((num_nodes,), np.inf)
+        ring[u[start]] = np.minimum.reduceat(rank[v], start)
+        best = best[rank[u[best]] < ring[u[best]]]
+        _, first = np.unique(v[best], return_index=True)
+        selected = best[first]
+
+        # Link condition: an interior edge must have exactly two common
+        # neighbors
+        adj = mesh.node_adjacency
+        common = np.asarray(adj[u[selected]].multiply(
+                            adj[v[selected]]).sum(axis=1)).flatten()
+        valid = common == 2
+
+        # Reject collapses that flip a triangle or make the mesh non-manifold
+        while True:
+            su = u[selected[valid]]
+            sv = v[selected[valid]]
+            mapping = np.arange(num_nodes)
+            mapping[su] = sv
+            new_tris = mapping[tris]
+            changed = new_tris != tris
+            moved = np.any(changed, axis=1)
+            kept = (new_tris[:,0] != new_tris[:,1]) & \
+                   (new_tris[:,1] != new_tris[:,2]) & \
+                   (new_tris[:,2] != new_tris[:,0])
+            check = moved & kept
+            q0 = points[new_tris[check,0],:]
+            new_normal = np.cross(points[new_tris[check,1],:] - q0,
+                                  points[new_tris[check,2],:] - q0)
+            old_normal = mesh.normals[check,:]
+            flipped = np.sum(old_normal * new_normal, axis=1) <= \
+                      max_cos * np.linalg.norm(old_normal, axis=1) * \
+                      np.linalg.norm(new_normal, axis=1)
+
+            new_mesh = Mesh(points, new_tris[kept,:])
+            count = new_mesh.edge_tri_count
+            shared = np.zeros((num_nodes,)).astype(bool)
+            shared[new_mesh.edges[count > 2,:].flatten()] = True
+            tangled = np.any(shared[new_tris[check,:]], axis=1)
+
+            bad = np.zeros((num_nodes,)).astype(bool)
+            bad[tris[check,:][changed[check,:]][flipped | tangled]] = True
+            if not np.any(bad[su]):
+                break
+            valid[valid] = ~bad[su]
+
+        blocked = np.union1d(blocked, keys[selected[~valid]])
+        scost = cost[selected[valid]]
+        if target is not None and su.shape[0] > nodes.shape[0] - target:
+            keep = np.argsort(scost, kind='stable')[:nodes.shape[0] - target]
+            su = su[keep]
+            sv = sv[keep]
+            scost = scost[keep]
+            mapping = np.arange(num_nodes)
+            mapping[su] = sv
+            new_tris = mapping[tris]
+            kept = (new_tris[:,0] != new_tris[:,1]) & \
+                   (new_tris[:,1] != new_tris[:,2]) & \
+                   (new_tris[:,2] != new_tris[:,0])
+        if su.shape[0] == 0:
+            if np.all(valid):
+                break
+            continue
+
+        tris = new_tris[kept,:]
+        quadrics[sv] += quadrics[su]
+        max_cost = max(max_cost, np.max(scost))
+
+    return tris, np.sqrt(max_cost)
+
+def _cached(kind):
+    """
+    Turn a method of `Mesh` into a read-only property that is computed once
+    and stored in the cache `kind` ('topology' or 'geometry').
+
+    """
+    def decorator(func):
+        name = func.__name__
+        def getter(self):
+            cache = self._cache[kind]
+            if name not in cache:
+                cache[name] = func(self)
+            return cache[name]
+        getter.__doc__ = func.__doc__
+        return property(getter)
+    return decorator
+
+class Mesh(object):
+
+    def __init__(self, coords, tris):
+        """
+        Triangular mesh with lazily computed, cached, derived data.
+
+        Topological data (edges, boundary loops, adjacency, active nodes, ...)
+        only depends on `tris` and geometrical data (areas, normals, ...) also
+        depends on `coords`. Assigning to `tris` clears both caches, and
+        assigning to `coords` only clears the geometrical cache (and the active
+        nodes if the number of nodes changes). The arrays held by the mesh
+        are read-only views, so they cannot be modified in place.
+
+        Arguments:
+            coords : Array of coordinates (size: num points x 3).
+            tris : Triangulation in the form of a m x 3 array.
+
+        """
+        self._cache = {'topology': {}, 'geometry': {}}
+        self.tris = tris
+        self.coords = coords
+
+    @property
+    def coords(self):
+        return self._coords
+
+    @coords.setter
+    def coords(self, coords):
+        coords = _readonly(np.asarray(coords))
+        if hasattr(self, '_coords') and \
+           coords.shape[0] != self._coords.shape[0]:
+            self._cache['topology'].pop('active_nodes', None)
+        self._coords = coords
+        self._cache['geometry'] = {}
+
+    @property
+    def tris(self):
+        return self._tris
+
+    @tris.setter
+    def tris(self, tris):
+        self._tris = _readonly(np.asarray(tris, dtype=np.int64))
+        self._cache = {'topology': {}, 'geometry': {}}
+
+    def invalidate(self):
+        """
+        Clear all cached data.
+
+        """
+        self._cache = {'topology': {}, 'geometry': {}}
+
+    def with_coords(self, coords):
+        """
+        Return a new mesh with the same triangulation but different
+        coordinates. The topological data is shared with this mesh.
+
+        """
+        mesh = Mesh(coords, self._tris)
+        topology = self._cache['topology']
+        if mesh._coords.shape[0] != self._coords.shape[0]:
+            # The size of `active_nodes` is the number of nodes
+            topology = {k : v for k, v in topology.items()
+                        if k != 'active_nodes'}
+        mesh._cache['topology'] = topology
+        return mesh
+
+    @_cached('topology')
+    def half_edge_keys(self):
+        """
+        Sorted keys of the undirected edge of each half-edge and the index of
+        the triangle that each sorted half-edge belongs to.
+        """
+        half_edges = self._tris[:, [0, 1, 1, 2, 2, 0]].reshape(-1, 2)
+        keys = self._edge_key(half_edges[:,0], half_edges[:,1])
+        order = np.argsort(keys, kind='stable')
+        return keys[order], order // 3
+
+    @_cached('topology')
+    def edges(self):
+        """
+        Array of unique edges (num edges x 2), the node with the least index
+        first.
+        """
+        keys, _ = self.half_edge_keys
+        unique = np.unique(keys)
+        n = self._num_nodes()
+        return np.vstack((unique // n, unique % n)).T
+
+    @_cached('topology')
+    def edge_tri_count(self):
+        """
+        Number of triangles that each edge in `edges` belongs to.
+        """
+        keys, _ = self.half_edge_keys
+        _, count = np.unique(keys, return_counts=True)
+        return count
+
+    @_cached('topology')
+    def boundary_edges(self):
+        """
+        Boundary edges, oriented as in their triangles (see
+        `boundary_edges`).
+        """
+        return boundary_edges(self._tris)
+
+    @_cached('topology')
+    def boundary_loops(self):
+        """
+        Ordered boundary loops and their lengths (see `order_loops`).
+        """
+        return order_loops(self.boundary_edges, self._tris)
+
+    @_cached('topology')
+    def node_adjacency(self):
+        """
+        Sparse, symmetric node-to-node adjacency matrix (CSR format). The
+        number of rows is the largest node index in the triangulation + 1.
+        """
+        from scipy.sparse import coo_matrix
+        edges = self.edges
+        n = self._num_nodes()
+        rows = np.concatenate((edges[:,0], edges[:,1]))
+        cols = np.concatenate((edges[:,1], edges[:,0]))
+        return coo_matrix((np.ones(rows.shape[0]), (rows, cols)),
+                          shape=(n, n)).tocsr()
+
+    @_cached('topology')
+    def tri_adjacency(self):
+        """
+        Pairs of triangles that share an edge (see `orientation.adjacency`).
+        """
+        from .orientation import adjacency
+        return adjacency(self._tris)
+
+    @_cached('topology')
+    def active_nodes(self):
+        """
+        Array that is `1` for each node found in the triangulation (see
+        `active_nodes`).
+        """
+        return active_nodes(self._coords, self._tris)
+
+    @_cached('geometry')
+    def areas(self):
+        """
+        Area of each triangle.
+        """
+        return areas(self._tris, self._coords)
+
+    @_cached('geometry')
+    def normals(self):
+        """
+        Unnormalized normal of each triangle, (p1 - p0) x (p2 - p0).
+        """
+        p0 = self._coords[self._tris[:,0],0:3]
+        p1 = self._coords[self._tris[:,1],0:3]
+        p2 = self._coords[self._tris[:,2],0:3]
+        return np.cross(p1 - p0, p2 - p0)
+
+    def edge_triangles(self, edges):
+        """
+        Return the index of the first triangle that each edge belongs to.
+
+        Arguments:
+            edges : Array of edges (num edges x 2). The order of the nodes in
+                each edge does not matter.
+
+        Raises:
+            ValueError : If some edge is not found in the mesh.
+
+        """
+        keys, tri_ids = self.half_edge_keys
+        edges = np.asarray(edges, dtype=np.int64).reshape(-1, 2)
+        valid = np.all((edges >= 0) & (edges < self._num_nodes()), axis=1)
+        query = self._edge_key(edges[:,0], edges[:,1])
+        idx = np.searchsorted(keys, query)
+        found = valid & (idx < keys.shape[0])
+        found[found] = keys[idx[found]] == query[found]
+        if not np.all(found):
+            raise ValueError('Edges not found in the mesh: %s' %
+                             edges[~found].tolist())
+        return tri_ids[idx]
+
+    def _num_nodes(self):
+        return int(np.max(self._tris)) + 1 if self._tris.shape[0] else 0
+
+    def _edge_key(self, a, b):
+        return np.minimum(a, b) * self._num_nodes() + np.maximum(a, b)
+
+def _readonly(array):
+    view = array.view()
+    view.flags.writeable = False
+    return view
@@ -8,43 +8,302 @@ _header = 'HEADER \{([\w\W]+?)\}'
 _vrtx = 'VRTX (\d+)\s+([-\w\.]+)\s+([-\w\.]+)\s+([-\w\.]+)'
 _tri = 'TRGL (\d+)\s+(\d+)\s+(\d+)'
 _surf = 'TFACE'
+_vrtx_keys = ('VRTX', 'PVRTX')
+_atom_keys = ('ATOM', 'PATOM')
 
 def read(filename, min_elems=0):
-    txt = open(filename).read() 
-    # Extract all triangular surfaces and process them one by one.
-    surfs = txt.split(_surf)[1:]
+    """
+    Read all triangular surfaces in a Tsurf file.
+
+    Arguments:
+        filename : Tsurf file to read.
+        min_elems(optional) : Skip surfaces with fewer triangles.
+
+    Returns:
+        p : List of vertex arrays, one per surface (see `surfaces`).
+        t : List of triangle arrays, one per surface.
 
+    """
     p = []
     t = []
 
-    for surf in surfs:
-        ti = tri(surf)
-        pi = vrtx(surf)
-        pi, ti = swap(pi, ti)
-        if ti.shape[0] < min_elems:
-            continue
+    for pi, ti in surfaces(filename, min_elems=min_elems):
         p.append(pi)
         t.append(ti)
 
-
     return p, t
 
+def surfaces(filename, min_elems=0):
+    """
+    Parse a Tsurf file one line at a time and yield its triangular surfaces
+    (`TFACE` blocks) one by one. Only one surface is held in memory at a
+    time. The numeric columns of each surface are converted in bulk.
+
+    Vertices are defined by `VRTX` or `PVRTX` records (any properties are
+    ignored), and `ATOM` or `PATOM` records, which define a new vertex at the
+    position of an existing vertex.
+
+    Arguments:
+        filename : Tsurf file to read.
+        min_elems(optional) : Skip surfaces with fewer triangles.
+
+    Yields:
+        p : Array of vertices (columns: index, x, y, z). The index is the order
+            in which the vertex appears in the surface.
+        t : Array of triangles that refer to the vertex indices.
+
+    """
+    with open(filename) as fh:
+        for out in _parse(fh, min_elems):
+            yield out
+
+def _parse(lines, min_elems=0):
+    """
+    Collect the records of each `TFACE` block in an iterable of lines and
+    yield the converted surfaces (see `surfaces`).
+
+    """
+    block = None
+    for line in lines:
+        fields = line.split()
+        if not fields:
+            continue
+        key = fields[0]
+        if key in _vrtx_keys and block is not None:
+            block['vrtx'].append(fields[1:5])
+        elif key == 'TRGL' and block is not None:
+            block['tri'].append(fields[1:4])
+        elif key in _atom_keys and block is not None:
+            block['atom'].append(fields[1:3])
+        elif key == _surf or key == 'END':
+            if block is not None:
+                out = _surface(block, min_elems)
+                if out:
+                    yield out
+            block = _block() if key == _surf else None
+    if block is not None:
+        out = _surface(block, min_elems)
+        if out:
+            yield out
+
+def index(filename, persist=False):
+    """
+    Build an index of the triangular surfaces (`TFACE` blocks) in a Tsurf
+    file without parsing them.
+
+    Arguments:
+        filename : Tsurf file to index.
+        persist(optional) : Reuse the index file `filename + '.idx'` if it is
+            up to date, or write it otherwise.
+
+    Returns:
+        out : Array of size num surfaces x 4 (columns: first byte, last byte
+            (exclusive), number of vertices, number of triangles).
+
+    """
+    import os
+    import mmap
+    import numpy as np
+
+    stat = os.stat(filename)
+    stamp = '%d %d' % (stat.st_size, stat.st_mtime_ns)
+    idx_file = filename + '.idx'
+    if persist and os.path.exists(idx_file):
+        with open(idx_file) as fh:
+            if fh.readline().strip() == '# ' + stamp:
+                return np.loadtxt(fh, dtype=np.int64, ndmin=2).reshape(-1, 4)
+
+    out = []
+    if stat.st_size > 0:
+        with open(filename, 'rb') as fh, \
+             mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            for start, end in _blocks(mm):
+                num_vrtx = _count(mm, start, end, _vrtx_keys + _atom_keys)
+                num_tris = _count(mm, start, end, ('TRGL',))
+                out.append([start, end, num_vrtx, num_tris])
+    out = np.array(out, dtype=np.int64).reshape(-1, 4)
+
+    if persist:
+        with open(idx_file, 'w') as fh:
+            fh.write('# ' + stamp + '\n')
+            np.savetxt(fh, out, fmt='%d')
+
+    return out
+
+def _blocks(mm):
+    """
+    Yield the byte range (first, last (exclusive)) of each `TFACE` block in
+    a memory-mapped Tsurf file.
+
+    """
+    import re
+    marks = [(m.start(), m.group(1)) for m in
+             re.finditer(rb'^[ \t]*(TFACE|END)\b', mm, re.M)]
+    marks.append((len(mm), b'END'))
+    for (start, key), (end, _) in zip(marks[:-1], marks[1:]):
+        if key == b'TFACE':
+            yield start, end
+
+def _count(mm, start, end, keys):
+    """
+    Count the records that start with one of the keywords `keys` in a byte
+    range of a memory-mapped Tsurf file. Records are split into fields in the
+    same way as in `_parse`, so indented records are counted too.
+
+    """
+    import re
+    keys = b'|'.join(re.escape(k.encode()) for k in keys)
+    pattern = re.compile(rb'^[ \t]*(?:' + keys + rb')(?!\S)', re.M)
+    return len(pattern.findall(mm, start, end))
+
+def extents(filename):
+    """
+    Compute the extent of each triangular surface in a Tsurf file without
+    building its mesh. Only the coordinates of the `VRTX` and `PVRTX`
+    records are converted, and triangles are only counted.
+
+    Arguments:
+        filename : Tsurf file to scan.
+
+    Returns:
+        out : Array of size num surfaces x 8 (columns: xmin, xmax, ymin, ymax,
+            zmin, zmax, number of `VRTX` and `PVRTX` records, number of
+            triangles). The extent of a surface without vertices is `nan`.
+
+    """
+    import os
+    import re
+    import mmap
+    import numpy as np
+
+    vrtx = re.compile(rb'^[ \t]*P?VRTX[ \t]+\S+' + rb'[ \t]+(\S+)' * 3, re.M)
+    out = []
+    if os.stat(filename).st_size > 0:
+        with open(filename, 'rb') as fh, \
+             mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            for start, end in _blocks(mm):
+                xyz = np.array(vrtx.findall(mm, start, end)).astype(np.float64)
+                num_tris = _count(mm, start, end, ('TRGL',))
+                if xyz.shape[0] == 0:
+                    ext = [np.nan] * 6
+                else:
+                    ext = np.vstack((np.min(xyz, axis=0),
+                                     np.max(xyz, axis=0))).T.ravel()
+                out.append(list(ext) + [xyz.shape[0], num_tris])
+    return np.array(out, dtype=np.float64).reshape(-1, 8)
+
+def load(filename, select=None, min_elems=0, idx=None, processes=1):
+    """
+    Load selected triangular surfaces from a Tsurf file using its index
+    (see `index`). Surfaces with too few triangles are skipped without
+    parsing them.
+
+    Arguments:
+        filename : Tsurf file to read.
+        select(optional) : Indices of the surfaces to load. Defaults to all
+            surfaces.
+        min_elems(optional) : Skip surfaces with fewer triangles.
+        idx(optional) : Index of the file. Built if not given.
+        processes(optional) : Number of worker processes used to parse the
+            surfaces. Pass `None` to use all available CPUs.
+
+    Yields:
+        i : Index of the surface in the file.
+        p, t : Vertices and triangles of the surface (see `surfaces`).
+
+    """
+    import numpy as np
+
+    if idx is None:
+        idx = index(filename)
+    if select is None:
+        select = np.arange(idx.shape[0])
+    select = [i for i in np.asarray(select, dtype=np.int64).ravel()
+              if idx[i,3] >= min_elems]
+    jobs = [(filename, idx[i,0], idx[i,1]) for i in select]
+
+    if processes == 1 or len(jobs) < 2:
+        results = map(_load_block, jobs)
+        for i, out in zip(select, results):
+            yield (int(i),) + out
+        return
+
+    from concurrent.futures import ProcessPoolExecutor
+    with ProcessPoolExecutor(max_workers=processes) as pool:
+        for i, out in zip(select, pool.map(_load_block, jobs)):
+            yield (int(i),) + out
+
+def _load_block(job):
+    """
+    Parse a single surface given by its byte range in a Tsurf file.
+
+    """
+    filename, start, end = job
+    with open(filename, 'rb') as fh:
+        fh.seek(start)
+        txt = fh.read(end - start).decode()
+    return next(_parse(txt.splitlines()))
+
+def _block():
+    return {'vrtx': [], 'tri': [], 'atom': []}
+
+def _surface(block, min_elems):
+    """
+    Convert the records collected for a surface to arrays.
+
+    """
+    import numpy as np
+    if not block['vrtx']:
+        raise Exception('No vertices found.')
+    if not block['tri']:
+        raise Exception('No triangles found.')
+
+    ti = np.array(block['tri'], dtype=np.int64)
+    if ti.shape[0] < min_elems:
+        return None
+
+    pi = np.array(block['vrtx'], dtype=np.float64)
+    if block['atom']:
+        atoms = np.array(block['atom'], dtype=np.int64)
+        ids = pi[:,0].astype(np.int64)
+        order = np.argsort(ids, kind='stable')
+        idx = order[np.searchsorted(ids[order], atoms[:,1])]
+        if np.any(ids[idx] != atoms[:,1]):
+            raise Exception('ATOM refers to an unknown vertex.')
+        pi = np.vstack((pi, np.hstack((atoms[:,0:1], pi[idx,1:]))))
+
+    return swap(pi, ti)
+
 def swap(p, t):
     """
     Replace node ID by the order in which it occurs in the node array "pt".
+    If an ID occurs more than once, the last occurrence is used.
+
+    Arguments:
+        p : Array of vertices (columns: ID, x, y, z).
+        t : Array of triangles that refer to the vertex IDs.
+
+    Returns:
+        new_p : Copy of `p` with the IDs replaced by `0, 1, ...`.
+        new_tri : Copy of `t` that refers to the new vertex indices.
 
     """
     import numpy as np
-    new_tri = np.copy(t)
     new_p = np.copy(p)
-
-    for i in range(p.shape[0]):
-        new_p[i,0] = i
-        old_i = p[i,0]
-        for k in range(3):
-            ids = t[:,k] == old_i
-            new_tri[ids,k] = i
-
+    new_p[:,0] = np.arange(p.shape[0])
+
+    ids = p[:,0].astype(np.int64)
+    order = np.argsort(ids, kind='stable')
+    sorted_ids = ids[order]
+    t = np.asarray(t)
+    query = t.astype(np.int64).ravel()
+    pos = np.searchsorted(sorted_ids, query, side='right') - 1
+    known = (pos >= 0) & (sorted_ids[np.maximum(pos, 0)] == query)
+    if not np.all(known):
+        raise Exception('Triangle refers to unknown vertex ID(s): %s' %
+                        str(np.unique(query[~known])[:10]))
+
+    new_tri = order[pos].reshape(t.shape).astype(t.dtype)
     return new_p, new_tri
 
 def version(txt):
@@ -104,13 +363,40 @@ def msh(tri):
     import numpy as np
 
     n = tri.shape[0]
-    out = np.zeros((n, 8))
-
-    for i in range(n):
-        out[i,0:8] = [i+1] + [2, 2, 0, 4] + list(tri[i,:])
-
-    return out
-
-
+    info = np.tile([2, 2, 0, 4], (n, 1))
+    return np.hstack((np.arange(1, n + 1)[:,None], info, tri)).astype(np.float64)
 
+def write(filename, p, t, name='untitled', precision=None):
+    """
+    Write triangular surfaces to a Tsurf file. Each surface is written as a
+    `TFACE` block with vertex IDs that start at `1`.
+
+    Arguments:
+        filename : Tsurf file to write.
+        p : Array of vertices (columns: x, y, z, or index, x, y, z as returned
+            by `read`), or a list of arrays, one per surface.
+        t : Array of triangles that refer to the rows of `p` (zero-based), or
+            a list of arrays, one per surface.
+        name(optional) : Name of the surface in the header.
+        precision(optional) : Number of significant digits of the
+            coordinates. Defaults to full precision.
 
+    """
+    import numpy as np
+    from .utils import write_table, float_format
+
+    if not isinstance(p, list):
+        p = [p]
+        t = [t]
+
+    fmt = ['VRTX %d'] + [float_format(precision)] * 3
+    with open(filename, 'w') as fh:
+        fh.write('GOCAD TSurf 1\nHEADER {\nname:%s\n}\n' % name)
+        for pi, ti in zip(p, t):
+            xyz = pi[:,-3:]
+            ids = np.arange(1, xyz.shape[0] + 1)
+            fh.write('TFACE\n')
+            write_table(fh, np.hstack((ids[:,None], xyz)), fmt)
+            write_table(fh, np.asarray(ti, dtype=np.int64) + 1,
+                        ['TRGL %d', '%d', '%d'])
+        fh.write('END\n')
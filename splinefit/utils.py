@@ -11,3 +11,44 @@ class Struct(dict):
         dict.__init__(self, kw)
         self.__dict__ = self
 
+
+def write_table(fh, data, fmt='%g', chunk_size=65536):
+    """
+    Write the rows of a numeric array to a text file. The rows are formatted
+    in chunks, and each chunk is written using a single call.
+
+    Example:
+
+        write_table(fh, nodes, ['%d', '%.17g', '%.17g', '%.17g'])
+
+    Arguments:
+        fh : File handle opened in text mode.
+        data : Array of size num rows x num columns, or num rows.
+        fmt(optional) : Format of a single field (applied to all columns), or
+            a list of formats, one per column. The fields are separated by a
+            space.
+        chunk_size(optional) : Number of rows to format at a time.
+
+    """
+    import numpy as np
+    data = np.asarray(data)
+    if data.ndim == 1:
+        data = data[:,None]
+    if isinstance(fmt, str):
+        fmt = [fmt] * data.shape[1]
+    row = ' '.join(fmt) + '\n'
+
+    for start in range(0, data.shape[0], chunk_size):
+        chunk = data[start:start+chunk_size]
+        fh.write((row * chunk.shape[0]) % tuple(chunk.ravel().tolist()))
+
+def float_format(precision=None):
+    """
+    Return the format of a floating-point field with `precision` significant
+    digits. If `precision` is `None`, the shortest representation that reads
+    back to the same number is used.
+
+    """
+    if precision is None:
+        return '%r'
+    return '%%.%dg' % precision
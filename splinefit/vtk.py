@@ -8,38 +8,8 @@ def write_triangular_mesh(filename, p, t):
         p : Array of points,  size : (num points, 3) (columns: x, y, z)
         t : Array of element connectivity, size : (num elements, 3)
     """
-
-    npts = p.shape[0]
-    dim = p.shape[1]
-    ntris = t.shape[0]
-    assert dim == 3
-
-    f = open(filename, 'w')
-
-    header = write_header() + "DATASET UNSTRUCTURED_GRID\n"
-    points = "POINTS %d float\n" % npts
-    cells = "CELLS %d %d\n" % (ntris, 4*ntris)
-    cell_types = "CELL_TYPES %d\n" % (ntris)
-    cell_type = 5
-    num_nodes = 3
-
-
-    f.write(header)
-    f.write(points)
-    # x, y, z coordinates
-    for i in range(npts):
-        f.write('%g %g %g\n' % (p[i,0], p[i,1], p[i,2]))
-
-    f.write(cells)
-    # Cells contain the number of nodes, followed by the nodes
-    for i in range(ntris):
-        f.write('%d %d %d %d\n' % (num_nodes, t[i,0], t[i,1], t[i,2]))
-
-    f.write(cell_types)
-    for i in range(ntris):
-        f.write('%d\n'% cell_type)
-
-    f.close()
+    assert p.shape[1] == 3
+    Dataset(p, t).write(filename)
 
 def write_header():
     header = "# vtk DataFile Version 3.0\n"\
@@ -57,42 +27,372 @@ def write_surface(filename, X, Y, Z):
         Y : meshgrid of points in the y-direction 
         Z : meshgrid of points in the z-direction 
     """
-    assert X.shape[0] == Y.shape[0]
-    assert X.shape[0] == Z.shape[0]
-    assert X.shape[1] == Y.shape[1]
-    assert X.shape[1] == Z.shape[1]
-
-
-    f = open(filename, 'w')
-
-    header = write_header() + "DATASET STRUCTURED_GRID\n"
-    dim = "DIMENSIONS %d %d %d\n" %(X.shape[0], X.shape[1], 1)
-    points = "POINTS %d float\n" % (X.shape[0]*X.shape[1])
-
-    f.write(header)
-    f.write(dim)
-    f.write(points)
-    # x, y, z coordinates
-    for j in range(X.shape[1]):
-        for i in range(X.shape[0]):
-            f.write('%g %g %g\n' % (X[i,j], Y[i,j], Z[i,j]))
-    f.close()
+    Dataset.structured(X, Y, Z).write(filename)
 
 def append_scalar(filename, scalar, label='scalar'):
     """
-    Append a scalar field to a surface.
+    Append a scalar field to a surface. Each call appends a new `POINT_DATA`
+    section, so only use this function for a single field. Use `Dataset` to
+    write several fields.
 
     Input arguments:
         filename : Name of file to write to.
         scalar : Value of scalar field at each grid point. 
     """
 
+    from .utils import write_table
+
     f = open(filename, 'a')
     numpts = len(scalar[:])
     f.write("POINT_DATA %ld \n" % numpts)
-    f.write("FIELD scalar 1\n")
+    f.write("FIELD FieldData 1\n")
     f.write("%s 1 %ld float\n" % (label, numpts))
-    # x, y, z coordinates
-    for si in scalar[:]:
-            f.write('%g \n' % si)
+    write_table(f, np.asarray(scalar[:]), '%g ')
     f.close()
+
+class Dataset(object):
+    """
+    VTK dataset that collects points, triangles, and any number of scalar or
+    vector arrays defined at the points or cells. All data is written in a
+    single pass by `write`. The data can be added in chunks.
+
+    Example:
+
+        data = Dataset(p, t)
+        data.add_point_data('distance', d)
+        data.add_cell_data('normal', n)
+        data.write('mesh.vtu')
+
+    """
+    def __init__(self, points=None, cells=None, shape=None):
+        """
+        Input arguments:
+            points : Array of points, size : (num points, 3)
+            cells : Array of triangles, size : (num cells, 3). Ignored for
+                structured grids.
+            shape : Dimensions of a structured grid, `(nx, ny)`. The first
+                grid index varies the fastest in `points`.
+        """
+        self.shape = shape
+        self._points = []
+        self._cells = []
+        self.point_data = {}
+        self.cell_data = {}
+        if points is not None:
+            self.add_points(points)
+        if cells is not None:
+            self.add_cells(cells)
+
+    @staticmethod
+    def structured(X, Y, Z):
+        """
+        Create a structured grid from meshgrids of points.
+
+        """
+        assert X.shape == Y.shape
+        assert X.shape == Z.shape
+        points = np.stack((X.T, Y.T, Z.T), axis=-1).reshape(-1, 3)
+        return Dataset(points, shape=X.shape)
+
+    @property
+    def points(self):
+        self._points = [_concatenate(self._points, (0, 3), np.float64)]
+        return self._points[0]
+
+    @property
+    def cells(self):
+        self._cells = [_concatenate(self._cells, (0, 3), np.int64)]
+        return self._cells[0]
+
+    def add_points(self, points):
+        """
+        Add a chunk of points. Returns the index of the first point in the
+        chunk.
+
+        """
+        offset = sum(pi.shape[0] for pi in self._points)
+        self._points.append(np.asarray(points, dtype=np.float64))
+        return offset
+
+    def add_cells(self, cells):
+        """
+        Add a chunk of triangles.
+
+        """
+        self._cells.append(np.asarray(cells, dtype=np.int64))
+
+    def add_point_data(self, name, values):
+        """
+        Add a chunk of a scalar (size: num points) or vector (size: num points
+        x 3) field defined at the points.
+
+        """
+        self.point_data.setdefault(name, []).append(np.asarray(values))
+
+    def add_cell_data(self, name, values):
+        """
+        Add a chunk of a scalar (size: num cells) or vector (size: num cells
+        x 3) field defined at the cells.
+
+        """
+        self.cell_data.setdefault(name, []).append(np.asarray(values))
+
+    def fields(self, kind='point'):
+        """
+        Return the point or cell fields as a dictionary of arrays.
+
+        """
+        chunks = self.point_data if kind == 'point' else self.cell_data
+        num = self.points.shape[0] if kind == 'point' else self.num_cells()
+        out = {}
+        for name, values in chunks.items():
+            values = np.concatenate(values)
+            if values.shape[0] != num:
+                raise ValueError('Field "%s" has %d values, expected %d' %
+                                 (name, values.shape[0], num))
+            if values.ndim > 1 and values.shape[1] not in (1, 3):
+                raise ValueError('Field "%s" must be a scalar or vector field'
+                                 % name)
+            out[name] = values.reshape(num) if values.ndim > 1 and \
+                        values.shape[1] == 1 else values
+            chunks[name] = [out[name]]
+        return out
+
+    def num_cells(self):
+        if self.shape is not None:
+            return (self.shape[0] - 1) * (self.shape[1] - 1)
+        return self.cells.shape[0]
+
+    def write(self, filename, compress=False, precision=6):
+        """
+        Write the dataset. The file format is determined by the extension:
+        `.vtk` (legacy ASCII), `.vtu` (XML unstructured grid) or `.vts` (XML
+        structured grid).
+
+        Input arguments:
+            filename : Name of file to write to.
+            compress : Compress the data of XML files using zlib.
+            precision : Number of significant digits of legacy files.
+        """
+        if filename.endswith('.vtu') or filename.endswith('.vts'):
+            self._write_xml(filename, compress)
+        else:
+            self._write_legacy(filename, precision)
+
+    def _write_legacy(self, filename, precision=6):
+        from .utils import write_table, float_format
+        p = self.points
+        fmt = float_format(precision)
+        fields = {'point': self.fields('point'), 'cell': self.fields('cell')}
+        out = open(filename, 'w')
+        out.write(write_header())
+        if self.shape is not None:
+            out.write("DATASET STRUCTURED_GRID\n")
+            out.write("DIMENSIONS %d %d %d\n" % (self.shape[0],
+                                                 self.shape[1], 1))
+        else:
+            out.write("DATASET UNSTRUCTURED_GRID\n")
+        out.write("POINTS %d float\n" % p.shape[0])
+        write_table(out, p, fmt)
+
+        if self.shape is None:
+            t = self.cells
+            ntris = t.shape[0]
+            # Cells contain the number of nodes, followed by the nodes
+            out.write("CELLS %d %d\n" % (ntris, 4*ntris))
+            write_table(out, np.hstack((np.full((ntris, 1), 3), t)), '%d')
+            out.write("CELL_TYPES %d\n" % ntris)
+            write_table(out, np.full((ntris,), 5), '%d')
+
+        for kind, label in [('point', 'POINT_DATA'), ('cell', 'CELL_DATA')]:
+            if not fields[kind]:
+                continue
+            num = p.shape[0] if kind == 'point' else self.num_cells()
+            out.write("%s %d\n" % (label, num))
+            for name, values in fields[kind].items():
+                if values.ndim == 1:
+                    out.write("SCALARS %s float 1\nLOOKUP_TABLE default\n" %
+                              name)
+                else:
+                    out.write("VECTORS %s float\n" % name)
+                write_table(out, values, fmt)
+        out.close()
+
+    def _write_xml(self, filename, compress):
+        p = self.points
+        arrays = []
+        attributes = []
+        for kind, section in [('point', 'PointData'), ('cell', 'CellData')]:
+            fields = self.fields(kind)
+            scalars = [n for n, v in fields.items() if v.ndim == 1]
+            vectors = [n for n, v in fields.items() if v.ndim > 1]
+            attr = ''
+            if scalars:
+                attr += ' Scalars="%s"' % scalars[0]
+            if vectors:
+                attr += ' Vectors="%s"' % vectors[0]
+            attributes.append((section, attr))
+            arrays += [(section, name, _xml_array(values))
+                       for name, values in fields.items()]
+        arrays.append(('Points', 'Points', p))
+
+        if self.shape is not None:
+            extent = '0 %d 0 %d 0 0' % (self.shape[0] - 1, self.shape[1] - 1)
+            _write_xml(filename, 'StructuredGrid',
+                       'WholeExtent="%s"' % extent, 'Extent="%s"' % extent,
+                       arrays, compress, dict(attributes))
+            return
+
+        t = self.cells
+        ntris = t.shape[0]
+        arrays += [('Cells', 'connectivity', t.ravel()),
+                   ('Cells', 'offsets', 3 * np.arange(1, ntris + 1)),
+                   ('Cells', 'types', np.full((ntris,), 5, dtype=np.uint8))]
+        piece = 'NumberOfPoints="%d" NumberOfCells="%d"' % (p.shape[0], ntris)
+        _write_xml(filename, 'UnstructuredGrid', '', piece, arrays, compress,
+                   dict(attributes))
+
+def _concatenate(chunks, empty_shape, dtype):
+    if not chunks:
+        return np.zeros(empty_shape, dtype=dtype)
+    if len(chunks) == 1:
+        return chunks[0]
+    return np.concatenate(chunks)
+
+def _xml_array(values):
+    """
+    Convert a field to a data type supported by the XML writer.
+
+    """
+    if values.dtype.kind == 'f':
+        return values.astype(np.float64, copy=False)
+    if values.dtype.kind == 'b':
+        return values.astype(np.uint8)
+    return values.astype(np.int64, copy=False)
+
+_xml_types = {'float64': 'Float64', 'float32': 'Float32', 'int64': 'Int64',
+              'int32': 'Int32', 'uint8': 'UInt8'}
+_block_size = 1 << 20
+
+def write_vtu(filename, p, t, compress=False):
+    """
+    Write a triangular mesh using the VTK XML file format for unstructured
+    grids (.vtu). The data is stored as appended raw binary data.
+
+    Input arguments:
+        filename : Name of file to write to.
+        p : Array of points,  size : (num points, 3) (columns: x, y, z)
+        t : Array of element connectivity, size : (num elements, 3)
+        compress : Compress the data using zlib.
+    """
+    assert p.shape[1] == 3
+    assert t.shape[1] == 3
+    Dataset(p, t)._write_xml(filename, compress)
+
+def write_vts(filename, X, Y, Z, compress=False):
+    """
+    Write a Surface in 3D using the VTK XML file format for structured grids
+    (.vts). The data is stored as appended raw binary data.
+
+    Input arguments:
+        filename : Name of file to write to.
+        X : meshgrid of points in the x-direction 
+        Y : meshgrid of points in the y-direction 
+        Z : meshgrid of points in the z-direction 
+        compress : Compress the data using zlib.
+    """
+    Dataset.structured(X, Y, Z)._write_xml(filename, compress)
+
+def write_vtm(filename, files, names=None):
+    """
+    Write a VTK multiblock file (.vtm) that groups VTK XML files, e.g., all
+    of the fitted parts of a fault.
+
+    Input arguments:
+        filename : Name of file to write to.
+        files : List of VTK XML files to include. Their paths are stored
+            relative to the multiblock file.
+        names : Name of each block. Defaults to the file names.
+    """
+    import os
+    if names is None:
+        names = [os.path.splitext(os.path.basename(fi))[0] for fi in files]
+    root = os.path.dirname(os.path.abspath(filename))
+
+    out = ['<?xml version="1.0"?>',
+           '<VTKFile type="vtkMultiBlockDataSet" version="1.0" '
+           'byte_order="LittleEndian">',
+           '  <vtkMultiBlockDataSet>']
+    for i, (fi, name) in enumerate(zip(files, names)):
+        path = os.path.relpath(os.path.abspath(fi), root)
+        out.append('    <DataSet index="%d" name="%s" file="%s"/>' %
+                   (i, name, path))
+    out += ['  </vtkMultiBlockDataSet>', '</VTKFile>', '']
+    with open(filename, 'w') as fh:
+        fh.write('\n'.join(out))
+
+def _write_xml(filename, dataset, attributes, piece, arrays, compress,
+               section_attributes={}):
+    """
+    Write a VTK XML file with a single piece. Each array is given as a tuple
+    `(section, name, data)`, where section is one of `'PointData'`,
+    `'CellData'`, `'Points'` or `'Cells'`. The attributes of each section,
+    e.g., the active scalars, can be given in `section_attributes`.
+
+    """
+    blocks = [_encode(data, compress) for _, _, data in arrays]
+
+    offset = 0
+    sections = {}
+    for (section, name, data), block in zip(arrays, blocks):
+        num_components = 1 if data.ndim == 1 else data.shape[1]
+        sections.setdefault(section, []).append(
+            '        <DataArray type="%s" Name="%s" NumberOfComponents="%d" '
+            'format="appended" offset="%d"/>' %
+            (_xml_types[data.dtype.name], name, num_components, offset))
+        offset += sum(len(bi) if isinstance(bi, bytes) else bi.nbytes
+                      for bi in block)
+
+    compressor = ' compressor="vtkZLibDataCompressor"' if compress else ''
+    out = ['<?xml version="1.0"?>',
+           '<VTKFile type="%s" version="1.0" byte_order="LittleEndian" '
+           'header_type="UInt64"%s>' % (dataset, compressor),
+           '  <%s>' % ' '.join([dataset, attributes]).strip(),
+           '    <Piece %s>' % piece]
+    for section in ['PointData', 'CellData', 'Points', 'Cells']:
+        if section in sections:
+            attr = section_attributes.get(section, '')
+            out += ['      <%s%s>' % (section, attr)] + sections[section] + \
+                   ['      </%s>' % section]
+    out += ['    </Piece>', '  </%s>' % dataset,
+            '  <AppendedData encoding="raw">', '   _']
+
+    with open(filename, 'wb') as fh:
+        fh.write('\n'.join(out).encode())
+        for block in blocks:
+            for bi in block:
+                if isinstance(bi, bytes):
+                    fh.write(bi)
+                else:
+                    bi.tofile(fh)
+        fh.write(b'\n  </AppendedData>\n</VTKFile>\n')
+
+def _encode(data, compress):
+    """
+    Encode an array as appended raw data: a header that contains the number of
+    bytes, followed by the data. If compression is enabled, the data is
+    compressed in blocks using zlib, and the header lists the size of each
+    block.
+
+    """
+    data = np.ascontiguousarray(data, dtype=data.dtype.newbyteorder('<'))
+    if not compress:
+        return [np.array([data.nbytes], dtype='<u8').tobytes(), data.ravel()]
+
+    import zlib
+    raw = data.tobytes()
+    chunks = [zlib.compress(raw[i:i + _block_size])
+              for i in range(0, len(raw), _block_size)]
+    last = len(raw) % _block_size if chunks else 0
+    header = [len(chunks), _block_size, last] + [len(ci) for ci in chunks]
+    return [np.array(header, dtype='<u8').tobytes()] + chunks